@@ -1,3 +1,27 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Dataset, DatasetBlob, ReportJob
+
+
+@admin.register(Dataset)
+class DatasetAdmin(admin.ModelAdmin):
+    list_display = ["id", "name", "user", "created_at"]
+    list_select_related = ["user"]
+    raw_id_fields = ["user", "blob"]
+
+
+@admin.register(DatasetBlob)
+class DatasetBlobAdmin(admin.ModelAdmin):
+    list_display = ["id", "sha256", "ref_count", "created_at"]
+    # The summary and aggregates can be large; the changelist never shows them.
+    exclude = ["summary_json", "aggregates_json"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer("summary_json", "aggregates_json")
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ["id", "dataset_id", "user", "status", "created_at"]
+    list_select_related = ["user"]
+    raw_id_fields = ["user", "dataset"]
@@ -0,0 +1,285 @@
+"""
+Streaming CSV analysis engine.
+
+Uploads are read in bounded chunks and every chunk is folded into running,
+mergeable aggregates, so peak memory depends on the chunk size and not on
+the size of the file. The final result has the ``summary_json`` shape used
+by the API and the PDF report.
+"""
+from collections import Counter
+
+import numpy as np
+
+from .parsers import ALL_COLUMNS, ANALYSIS_COLUMNS, read_csv_chunks
+from .sketches import ColumnSketches
+from .validators import NUMERIC_COLUMNS
+
+# Bump when the layout of SummaryAccumulator.to_state() changes.
+AGGREGATES_VERSION = 1
+
+
+def summarize_block(block):
+    """
+    Compute count, mean, M2, min and max for every row of a 2-D block.
+
+    ``block`` is a C-contiguous float64 array with one row per numeric
+    parameter, so every reduction walks contiguous memory and covers all
+    parameters in one vectorized call, instead of one pandas call per
+    column and statistic. NaN detection rides on the sum: a column without
+    missing values never pays for a mask.
+    """
+    n_cols, n_rows = block.shape
+    if not n_rows:
+        return (np.zeros(n_cols, dtype=np.int64), np.zeros(n_cols), np.zeros(n_cols),
+                np.full(n_cols, np.inf), np.full(n_cols, -np.inf))
+
+    sums = block.sum(axis=1)
+    if not np.isnan(sums).any():
+        count = np.full(n_cols, n_rows, dtype=np.int64)
+        mean = sums / n_rows
+        dev = block - mean[:, None]
+        m2 = np.einsum("ij,ij->i", dev, dev)
+        return count, mean, m2, block.min(axis=1), block.max(axis=1)
+
+    mask = ~np.isnan(block)
+    count = mask.sum(axis=1)
+    mean = np.where(mask, block, 0.0).sum(axis=1) / np.maximum(count, 1)
+    dev = np.where(mask, block - mean[:, None], 0.0)
+    m2 = np.einsum("ij,ij->i", dev, dev)
+    lo = np.where(mask, block, np.inf).min(axis=1)
+    hi = np.where(mask, block, -np.inf).max(axis=1)
+    return count, mean, m2, lo, hi
+
+
+def numeric_block(df, columns=NUMERIC_COLUMNS):
+    """The (column x row) C-contiguous float64 block ``summarize_block`` expects."""
+    return np.ascontiguousarray(df[list(columns)].to_numpy(dtype=np.float64).T)
+
+
+def _json_float(value):
+    """NaN (e.g. the std of a single row) isn't valid JSON; store it as null."""
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+class RunningStats:
+    """
+    Mergeable count / mean / M2 / min / max for all numeric columns.
+
+    Partial results are combined with the parallel update of Chan et al.,
+    which keeps the variance numerically stable across many chunks.
+    """
+
+    def __init__(self, columns=NUMERIC_COLUMNS):
+        n = len(columns)
+        self.columns = list(columns)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+
+    def update(self, df):
+        self.update_block(numeric_block(df, self.columns))
+
+    def update_block(self, block):
+        self._combine(*summarize_block(block))
+
+    def merge(self, other):
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, n, mean, m2, lo, hi):
+        total = self.count + n
+        safe_total = np.maximum(total, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / safe_total
+        self.m2 = self.m2 + m2 + delta * delta * self.count * n / safe_total
+        self.count = total
+        self.min = np.minimum(self.min, lo)
+        self.max = np.maximum(self.max, hi)
+
+    def to_state(self):
+        """JSON-serializable state that ``from_state`` restores for merging."""
+        return {
+            "columns": self.columns,
+            "count": self.count.tolist(),
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            # +/-inf (no values yet) isn't valid JSON.
+            "min": [_json_float(v) if np.isfinite(v) else None for v in self.min],
+            "max": [_json_float(v) if np.isfinite(v) else None for v in self.max],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        stats = cls(state["columns"])
+        stats.count = np.asarray(state["count"], dtype=np.int64)
+        stats.mean = np.asarray(state["mean"], dtype=np.float64)
+        stats.m2 = np.asarray(state["m2"], dtype=np.float64)
+        stats.min = np.array([np.inf if v is None else v for v in state["min"]], dtype=np.float64)
+        stats.max = np.array([-np.inf if v is None else v for v in state["max"]], dtype=np.float64)
+        return stats
+
+    def to_dict(self):
+        """Build the ``statistics`` dict in one step."""
+        has_data = self.count > 0
+        # Sample standard deviation (ddof=1), matching pandas.
+        std = np.sqrt(self.m2 / np.maximum(self.count - 1, 1))
+        std = np.where(self.count > 1, std, np.nan)
+        avg = np.where(has_data, self.mean, np.nan)
+        lo = np.where(has_data, self.min, np.nan)
+        hi = np.where(has_data, self.max, np.nan)
+        return {
+            col.lower(): {
+                "avg": _json_float(avg[i]),
+                "min": _json_float(lo[i]),
+                "max": _json_float(hi[i]),
+                "std": _json_float(std[i]),
+            }
+            for i, col in enumerate(self.columns)
+        }
+
+
+def summarize_groups(df):
+    """
+    Per-Type count / mean / M2 / min / max arrays from one groupby pass.
+
+    Returns ``(sizes, groups)`` where ``sizes`` maps each Type to its row
+    count and ``groups`` maps it to the ``summarize_block`` tuple of arrays.
+    """
+    grouped = df.groupby("Type", observed=True, sort=False)
+    sizes = grouped.size()
+    agg = grouped[NUMERIC_COLUMNS].agg(["count", "mean", "var", "min", "max"])
+
+    def stat(name):
+        return agg.xs(name, axis=1, level=1)[NUMERIC_COLUMNS].to_numpy(dtype=np.float64)
+
+    count = stat("count").astype(np.int64)
+    mean = np.nan_to_num(stat("mean"))
+    # pandas' grouped variance is computed with Welford's method (ddof=1).
+    m2 = np.nan_to_num(stat("var") * (count - 1))
+    lo = np.nan_to_num(stat("min"), nan=np.inf)
+    hi = np.nan_to_num(stat("max"), nan=-np.inf)
+
+    groups = {
+        str(key): (count[i], mean[i], m2[i], lo[i], hi[i])
+        for i, key in enumerate(agg.index)
+    }
+    return sizes, groups
+
+
+class SummaryAccumulator:
+    """Folds DataFrame chunks into the ``summary_json`` structure."""
+
+    def __init__(self):
+        self.total_count = 0
+        self.stats = RunningStats()
+        self.types = Counter()
+        self.type_stats = {}
+        self.sketches = ColumnSketches(NUMERIC_COLUMNS)
+
+    def update(self, df):
+        self.total_count += len(df)
+        block = numeric_block(df)
+        self.stats.update_block(block)
+        self.sketches.update_block(block)
+
+        sizes, groups = summarize_groups(df)
+        self.types.update({str(k): int(v) for k, v in sizes.items()})
+        for key, arrays in groups.items():
+            if key not in self.type_stats:
+                self.type_stats[key] = RunningStats()
+            self.type_stats[key]._combine(*arrays)
+
+    def merge(self, other):
+        self.total_count += other.total_count
+        self.stats.merge(other.stats)
+        self.types.update(other.types)
+        self.sketches.merge(other.sketches)
+        for key, stats in other.type_stats.items():
+            self.type_stats.setdefault(key, RunningStats()).merge(stats)
+
+    def to_state(self):
+        """
+        JSON-serializable aggregates (moments, type counts and sketches).
+
+        Stored alongside the summary so datasets can be merged and compared
+        later without reading their CSV files again.
+        """
+        return {
+            "version": AGGREGATES_VERSION,
+            "total_count": self.total_count,
+            "stats": self.stats.to_state(),
+            "types": dict(self.types),
+            "type_stats": {k: v.to_state() for k, v in self.type_stats.items()},
+            "sketches": self.sketches.to_state(),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        acc = cls()
+        acc.total_count = state["total_count"]
+        acc.stats = RunningStats.from_state(state["stats"])
+        acc.types = Counter(state["types"])
+        acc.type_stats = {
+            k: RunningStats.from_state(v) for k, v in state["type_stats"].items()
+        }
+        acc.sketches = ColumnSketches.from_state(state["sketches"])
+        return acc
+
+    def result(self):
+        type_distribution = dict(self.types.most_common())
+        statistics = self.stats.to_dict()
+        for col, percentiles in self.sketches.percentiles().items():
+            statistics[col].update(percentiles)
+        return {
+            "total_count": self.total_count,
+            "statistics": statistics,
+            "histograms": self.sketches.histogram_dict(),
+            "type_distribution": type_distribution,
+            "type_statistics": {
+                key: {"count": count, **self.type_stats[key].to_dict()}
+                for key, count in type_distribution.items()
+            },
+        }
+
+
+def accumulate_frames(frames):
+    """Fold an iterable of DataFrame chunks into a ``SummaryAccumulator``."""
+    acc = SummaryAccumulator()
+    for df in frames:
+        acc.update(df)
+    return acc
+
+
+def summarize_frames(frames):
+    """Fold an iterable of DataFrame chunks into a summary."""
+    return accumulate_frames(frames).result()
+
+
+def summarize_csv(file_obj, chunk_rows=None, chunk_bytes=None, sink=None):
+    """Analyze a CSV upload chunk by chunk and return its summary (see ``accumulate_csv``)."""
+    return accumulate_csv(file_obj, chunk_rows, chunk_bytes, sink).result()
+
+
+def accumulate_csv(file_obj, chunk_rows=None, chunk_bytes=None, sink=None):
+    """
+    Analyze a CSV upload chunk by chunk and return the accumulator, whose
+    ``result()`` is the summary and ``to_state()`` the stored aggregates.
+
+    If ``sink`` is given, every chunk (including ``Equipment Name``) is also
+    passed to it, so the upload can be converted in the same pass.
+    """
+    columns = ALL_COLUMNS if sink is not None else ANALYSIS_COLUMNS
+    frames = read_csv_chunks(
+        file_obj, chunk_rows=chunk_rows, chunk_bytes=chunk_bytes, columns=columns,
+    )
+    if sink is not None:
+        frames = _tee(frames, sink)
+    return accumulate_frames(frames)
+
+
+def _tee(frames, sink):
+    for df in frames:
+        sink(df)
+        yield df
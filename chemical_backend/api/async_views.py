@@ -0,0 +1,169 @@
+"""
+Async versions of the I/O-bound endpoints, served under ASGI.
+
+``backend/asgi.py`` turns on ``API_ASYNC_VIEWS``, and ``api/urls.py`` then
+routes history, summary, report downloads and login here instead of to the
+sync views. Database reads use the async ORM and the response cache its
+async methods, so a request waiting on the database or on a slow client
+does not hold a thread. Work that keeps a CPU busy (rendering a PDF on a
+report cache miss, hashing a password) runs on a pool of
+``ASYNC_CPU_WORKERS`` threads, so a burst of it queues instead of starting
+a thread per request.
+
+Needs the optional ``adrf`` package; without it the sync views are kept.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from adrf.views import APIView
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import close_old_connections
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import permissions
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+
+from . import report_cache, response_cache
+from .downloads import async_stream, file_response
+from .models import Dataset, DatasetSummary, ReportJob
+from .renderers import DATA_RENDERERS
+from .services import HISTORY_LIMIT, open_report, resolve_chart_backend
+from .views import _job_payload, history_item
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "ASYNC_CPU_WORKERS", 4),
+            thread_name_prefix="api-cpu",
+        )
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run ``func`` on the bounded worker pool and return its result."""
+    def call():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Pool threads outlive requests; let expired connections go.
+            close_old_connections()
+
+    run = sync_to_async(call, thread_sensitive=False, executor=_get_executor())
+    return await run()
+
+
+class AsyncLoginView(APIView):
+    permission_classes = []  # allow anyone to call
+
+    async def post(self, request):
+        username = request.data.get("username")
+        password = request.data.get("password")
+
+        # Password hashing is slow by design: keep it off the event loop.
+        user = await run_blocking(authenticate, username=username, password=password)
+        if not user:
+            return Response({"error": "Invalid credentials"}, status=400)
+
+        token, _ = await Token.objects.aget_or_create(user=user)
+        return Response({"token": token.key})
+
+
+class AsyncDatasetHistoryView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request):
+        user = request.user
+
+        async def build():
+            datasets = (
+                Dataset.objects
+                .filter(user=user)
+                .order_by("-created_at", "-id")
+                .values("id", "name", "created_at")[:HISTORY_LIMIT]
+            )
+            return [history_item(d) async for d in datasets], user.id
+
+        key = await response_cache.ahistory_key(user.id)
+        entry = await response_cache.aget_or_build(key, build)
+        return response_cache.respond(request, entry)
+
+
+class AsyncDatasetSummaryView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = DATA_RENDERERS
+
+    async def get(self, request, pk):
+        async def build():
+            return await (
+                DatasetSummary.objects
+                .filter(dataset_id=pk)
+                .values_list("summary_json", "dataset__user_id")
+                .afirst()
+            )
+
+        entry = await response_cache.aget_or_build(
+            response_cache.summary_key(pk), build
+        )
+        if entry is None or entry["owner_id"] != request.user.id:
+            return Response({"error": "Dataset not found"}, status=404)
+
+        return response_cache.respond(request, entry)
+
+
+class AsyncDatasetReportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, pk):
+        try:
+            # The user is loaded too, so rendering needs no further queries.
+            dataset = await (
+                Dataset.objects
+                .select_related("summary", "user")
+                .aget(id=pk, user=request.user)
+            )
+        except Dataset.DoesNotExist:
+            return Response({"error": "Dataset not found"}, status=404)
+
+        try:
+            charts = resolve_chart_backend(request.query_params.get("charts"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        key = report_cache.report_key(dataset.id, dataset.summary.summary_json, charts)
+        etag = quote_etag(key)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        # Only a cache miss renders, so only a miss waits for the pool.
+        report = await sync_to_async(report_cache.open_file)(key)
+        if report is None:
+            report = await run_blocking(open_report, dataset, charts=charts)
+        return async_stream(file_response(
+            request, report, "dataset_report.pdf", "application/pdf", etag=etag,
+        ))
+
+
+class AsyncReportJobDownloadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, job_id):
+        try:
+            job = await ReportJob.objects.aget(id=job_id, user=request.user)
+        except ReportJob.DoesNotExist:
+            return Response({"error": "Report job not found"}, status=404)
+
+        if job.status != ReportJob.DONE:
+            return Response(_job_payload(job), status=409)
+
+        report = await sync_to_async(job.file.open, thread_sensitive=False)("rb")
+        return async_stream(file_response(
+            request, report, "dataset_report.pdf", "application/pdf",
+        ))
@@ -0,0 +1,250 @@
+"""
+Bulk upload of many CSV files, or of one ZIP archive of CSV files.
+
+Members are hashed and analyzed in parallel on a thread pool (the CSV
+parsers and the summary kernel release the GIL for most of their work),
+then every resulting ``Dataset`` row is committed in a single transaction.
+"""
+import os
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from . import response_cache
+from .models import Dataset, DatasetBlob, DatasetSummary
+from .services import (
+    acquire_blob,
+    analyze_upload,
+    discard_staged_blob,
+    hash_upload,
+    stage_blob,
+    trim_history,
+)
+
+SPOOL_BYTES = 8 * 1024 * 1024
+COPY_BYTES = 64 * 1024
+
+
+class BatchMember:
+    """One file of a batch and the outcome of processing it."""
+
+    def __init__(self, name, file_obj=None, error=None):
+        self.name = name
+        self.file = file_obj
+        self.error = error
+        self.digest = None
+        self.staged = None
+        self.dataset = None
+        self.summary = None
+
+    def result(self, kept_ids):
+        if self.error:
+            return {"name": self.name, "error": self.error}
+        return {
+            "name": self.name,
+            "id": self.dataset.id,
+            # False when the history limit evicted it again within the batch.
+            "stored": self.dataset.id in kept_ids,
+            "summary": self.summary,
+        }
+
+
+def _max_files():
+    return getattr(settings, "BATCH_UPLOAD_MAX_FILES", 100)
+
+
+def _max_member_bytes():
+    return getattr(settings, "BATCH_UPLOAD_MAX_MEMBER_BYTES", 200 * 1024 * 1024)
+
+
+def _max_total_bytes():
+    return getattr(settings, "BATCH_UPLOAD_MAX_TOTAL_BYTES", 1024 * 1024 * 1024)
+
+
+class MemberTooLarge(Exception):
+    pass
+
+
+def _extract(zf, info, spool, budget):
+    """
+    Copy one archive member into ``spool`` and return its size.
+
+    Stops with ``MemberTooLarge`` once more than ``budget`` bytes came out,
+    whatever size the member's header declares.
+    """
+    size = 0
+    with zf.open(info) as src:
+        for chunk in iter(lambda: src.read(COPY_BYTES), b""):
+            size += len(chunk)
+            if size > budget:
+                raise MemberTooLarge
+            spool.write(chunk)
+    spool.seek(0)
+    return size
+
+
+def members_from_archive(archive):
+    """
+    Extract the CSV members of a ZIP upload into spooled temporary files.
+
+    Members bigger than ``BATCH_UPLOAD_MAX_MEMBER_BYTES`` once uncompressed,
+    encrypted or corrupt come back with an error; an archive holding more
+    than ``BATCH_UPLOAD_MAX_TOTAL_BYTES`` is rejected with ``ValueError``.
+    Sizes are counted as the bytes come out, so a member whose header
+    understates its size is caught too.
+    """
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise ValueError("Invalid ZIP archive")
+
+    max_member, max_total = _max_member_bytes(), _max_total_bytes()
+    too_large = f"File exceeds {max_member} bytes uncompressed"
+    total_error = f"Archive exceeds {max_total} bytes uncompressed"
+
+    members = []
+    total = 0
+    with zf:
+        infos = [
+            info for info in zf.infolist()
+            if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+        ]
+        if len(infos) > _max_files():
+            raise ValueError(f"At most {_max_files()} files per batch")
+
+        try:
+            for info in infos:
+                name = os.path.basename(info.filename)
+                if not name.lower().endswith(".csv"):
+                    members.append(BatchMember(name, error="Only CSV files allowed"))
+                    continue
+                if info.flag_bits & 0x1:
+                    members.append(BatchMember(name, error="Encrypted files are not supported"))
+                    continue
+                if info.file_size > max_member:
+                    members.append(BatchMember(name, error=too_large))
+                    continue
+                if total + info.file_size > max_total:
+                    raise ValueError(total_error)
+
+                budget = min(max_member, max_total - total)
+                spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+                try:
+                    total += _extract(zf, info, spool, budget)
+                except MemberTooLarge:
+                    spool.close()
+                    if budget < max_member:
+                        raise ValueError(total_error)
+                    members.append(BatchMember(name, error=too_large))
+                    continue
+                except (RuntimeError, NotImplementedError, EOFError,
+                        zipfile.BadZipFile, zlib.error) as e:
+                    spool.close()
+                    members.append(BatchMember(name, error=f"Unreadable file: {e}"))
+                    continue
+                members.append(BatchMember(name, File(spool, name=name)))
+        except ValueError:
+            for member in members:
+                if member.file:
+                    member.file.close()
+            raise
+    return members
+
+
+def members_from_files(files):
+    if len(files) > _max_files():
+        raise ValueError(f"At most {_max_files()} files per batch")
+
+    members = []
+    for file_obj in files:
+        if file_obj.name.lower().endswith(".csv"):
+            members.append(BatchMember(file_obj.name, file_obj))
+        else:
+            members.append(BatchMember(file_obj.name, error="Only CSV files allowed"))
+    return members
+
+
+def _hash(member):
+    member.digest = hash_upload(member.file)
+
+
+def _analyze(member):
+    try:
+        analysis = analyze_upload(member.file)
+        member.file.seek(0)
+        member.staged = stage_blob(member.file, member.digest, analysis)
+    except Exception as e:
+        member.error = str(e)
+
+
+def process_batch(user, members):
+    """
+    Analyze batch members in parallel and store them as datasets.
+
+    Content already stored as a ``DatasetBlob`` is not analyzed again, and
+    identical members within the batch are analyzed once.
+    """
+    pending = [m for m in members if not m.error]
+    workers = getattr(settings, "BATCH_UPLOAD_WORKERS", 4)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_hash, pending))
+
+        known = set(
+            DatasetBlob.objects
+            .filter(sha256__in={m.digest for m in pending})
+            .values_list("sha256", flat=True)
+        )
+        first_by_digest = {}
+        for member in pending:
+            if member.digest not in known:
+                first_by_digest.setdefault(member.digest, member)
+        list(pool.map(_analyze, first_by_digest.values()))
+
+    for member in pending:
+        source = first_by_digest.get(member.digest)
+        if source is not None and source is not member:
+            member.error, member.staged = source.error, source.staged
+
+    staged = [m.staged for m in first_by_digest.values() if m.staged]
+    try:
+        with transaction.atomic():
+            for member in members:
+                if member.error:
+                    continue
+                blob = acquire_blob(member.digest, member.staged)
+                if blob is None:
+                    member.error = "Stored copy was removed while uploading; please retry"
+                    continue
+                member.dataset = Dataset.objects.create(
+                    user=user,
+                    name=member.name,
+                    file=blob.file.name,
+                    blob=blob,
+                )
+                member.summary = blob.summary_json
+            DatasetSummary.objects.bulk_create([
+                DatasetSummary(dataset=m.dataset, summary_json=m.summary)
+                for m in members if m.dataset
+            ])
+            trim_history(user)
+            transaction.on_commit(lambda: response_cache.invalidate_history(user.id))
+            kept_ids = set(
+                Dataset.objects.filter(user=user).values_list("id", flat=True)
+            )
+    except Exception:
+        for blob in staged:
+            discard_staged_blob(blob)
+        raise
+
+    # Staged copies of content that a concurrent upload stored first.
+    for blob in staged:
+        if blob.pk is None:
+            discard_staged_blob(blob)
+
+    return [member.result(kept_ids) for member in members]
@@ -0,0 +1,258 @@
+"""
+Resumable chunked uploads.
+
+A client starts an upload with the file's name and size, PUTs the file in
+numbered chunks of ``chunk_size`` bytes, then finalizes it. Chunks must
+arrive in order, and each one is analyzed as it lands:
+- the previous chunk's incomplete last line is prepended to it;
+- its complete lines are parsed with the CSV header;
+- they are folded into the session's stored ``SummaryAccumulator`` state.
+The summary is therefore complete once the last chunk is received.
+Finalizing only hashes the assembled file, stores or reuses its blob and
+records the dataset.
+
+A retried chunk that was already received is acknowledged without being
+applied twice. A chunk index past the next expected one gets a 409 with
+the index to resume from. Chunk boundaries are found by newlines, so
+quoted fields must not contain line breaks.
+"""
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .models import UploadSession
+from .services import require_rows, store_upload
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _root():
+    path = _setting("CHUNKED_UPLOAD_DIR", None)
+    if path is None:
+        path = os.path.join(settings.MEDIA_ROOT, "uploads")
+    return path
+
+
+def session_dir(session):
+    return os.path.join(_root(), str(session.id))
+
+
+def status(session):
+    """The resume state reported to clients."""
+    return {
+        "upload_id": str(session.id),
+        "name": session.name,
+        "size": session.size,
+        "chunk_size": session.chunk_size,
+        "received_bytes": session.received_bytes,
+        "next_chunk": session.next_chunk,
+        "complete": session.received_bytes == session.size,
+    }
+
+
+def start_upload(user, name, size, chunk_size=None):
+    """Validate an upload request and open a session for it."""
+    if not name or not name.lower().endswith(".csv"):
+        raise ValueError("Only CSV files allowed")
+    try:
+        size = int(size)
+        chunk_size = int(chunk_size or _setting("CHUNKED_UPLOAD_CHUNK_BYTES", 4 * 1024 * 1024))
+    except (TypeError, ValueError):
+        raise ValueError("size and chunk_size must be integers")
+    if size <= 0:
+        raise ValueError("CSV file is empty")
+    max_bytes = _setting("CHUNKED_UPLOAD_MAX_BYTES", 2 * 1024 ** 3)
+    if size > max_bytes:
+        raise ValueError(f"Uploads are limited to {max_bytes} bytes")
+    min_chunk = _setting("CHUNKED_UPLOAD_MIN_CHUNK_BYTES", 64 * 1024)
+    max_chunk = _setting("CHUNKED_UPLOAD_MAX_CHUNK_BYTES", 16 * 1024 * 1024)
+    if not min_chunk <= chunk_size <= max_chunk:
+        raise ValueError(f"chunk_size must be between {min_chunk} and {max_chunk}")
+
+    expire_uploads()
+    session = UploadSession.objects.create(
+        user=user, name=os.path.basename(name), size=size, chunk_size=chunk_size,
+    )
+    os.makedirs(session_dir(session), exist_ok=True)
+    return session
+
+
+def expected_length(session):
+    """Byte length of the next chunk."""
+    return min(session.chunk_size, session.size - session.received_bytes)
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _accumulator(session):
+    from .analysis import SummaryAccumulator
+
+    if not session.aggregates_json:
+        return SummaryAccumulator()
+    return SummaryAccumulator.from_state(session.aggregates_json)
+
+
+def _split(session, data, last):
+    """
+    Return ``(header, complete_lines, carry)`` for the next chunk's bytes.
+
+    ``header`` is empty while the header line is still incomplete.
+    """
+    data = bytes(session.carry) + data
+    header = bytes(session.header)
+    if not header:
+        end = data.find(b"\n") + 1
+        if not end:
+            return (data, b"", b"") if last else (b"", b"", data)
+        header, data = data[:end], data[end:]
+    if last:
+        return header, data, b""
+    cut = data.rfind(b"\n") + 1
+    return header, data[:cut], data[cut:]
+
+
+def receive_chunk(session, data):
+    """
+    Store and analyze chunk ``session.next_chunk``, whose ``data`` must be
+    ``expected_length(session)`` bytes, and return the updated session.
+    Raises ``ValueError`` if its rows are not valid CSV for this dataset.
+
+    If a concurrent request applies the same chunk first, this one's work
+    is dropped and the stored session is returned unchanged.
+    """
+    from . import columnar
+    from .parsers import ALL_COLUMNS, ANALYSIS_COLUMNS, read_csv_chunks, resolve_columns
+
+    index = session.next_chunk
+    received = session.received_bytes + len(data)
+    last = received == session.size
+    header, lines, carry = _split(session, data, last)
+    if header and not session.header:
+        resolve_columns(BytesIO(header))
+
+    directory = session_dir(session)
+    _write_atomic(os.path.join(directory, f"chunk-{index:06d}"), data)
+
+    acc = _accumulator(session)
+    if lines.strip():
+        use_columnar = columnar.enabled()
+        frames = read_csv_chunks(
+            BytesIO(header + lines),
+            columns=ALL_COLUMNS if use_columnar else ANALYSIS_COLUMNS,
+        )
+        sink = columnar.ParquetSink(directory) if use_columnar else None
+        try:
+            for df in frames:
+                acc.update(df)
+                if sink:
+                    sink(df)
+        except Exception:
+            if sink:
+                sink.discard()
+            raise
+        part = sink.close() if sink else None
+        if part:
+            os.replace(part, os.path.join(directory, f"part-{index:06d}.parquet"))
+
+    state = acc.to_state()
+    applied = UploadSession.objects.filter(pk=session.pk, next_chunk=index).update(
+        next_chunk=index + 1,
+        received_bytes=received,
+        header=header,
+        carry=carry,
+        aggregates_json=state,
+        updated_at=timezone.now(),
+    )
+    if not applied:
+        return UploadSession.objects.get(pk=session.pk)
+    session.next_chunk, session.received_bytes = index + 1, received
+    session.header, session.carry = header, carry
+    session.aggregates_json = state
+    return session
+
+
+def _assemble(session):
+    """Concatenate the chunk files into one CSV; return its path and SHA-256."""
+    directory = session_dir(session)
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".csv")
+    digest = hashlib.sha256()
+    with os.fdopen(fd, "wb") as out:
+        for index in range(session.next_chunk):
+            with open(os.path.join(directory, f"chunk-{index:06d}"), "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+                    out.write(block)
+    return path, digest.hexdigest()
+
+
+def finalize_upload(session):
+    """
+    Turn a fully received upload into a dataset and return it.
+
+    Returns None if a concurrent request already finalized the session.
+    """
+    from . import columnar
+
+    if session.received_bytes != session.size:
+        raise ValueError(
+            f"Upload incomplete: {session.received_bytes} of {session.size} bytes received"
+        )
+    if not session.header:
+        raise ValueError("CSV file is empty")
+
+    acc = require_rows(_accumulator(session))
+    parts = sorted(glob.glob(os.path.join(session_dir(session), "part-*.parquet")))
+    parquet_path = columnar.concat_parquet(parts) if parts else None
+
+    csv_path, digest = _assemble(session)
+
+    def claim():
+        # Deleting the session claims it; a concurrent finalize gets 0 rows.
+        return UploadSession.objects.filter(pk=session.pk).delete()[0] > 0
+
+    try:
+        with open(csv_path, "rb") as f:
+            dataset = store_upload(
+                session.user, session.name, File(f, name=session.name),
+                digest=digest, analysis=(acc.result(), acc.to_state(), parquet_path),
+                claim=claim,
+            )
+    finally:
+        os.remove(csv_path)
+
+    if dataset is not None:
+        _remove_dir(session)
+    return dataset
+
+
+def discard_upload(session):
+    UploadSession.objects.filter(pk=session.pk).delete()
+    _remove_dir(session)
+
+
+def expire_uploads():
+    """Discard sessions idle for longer than ``CHUNKED_UPLOAD_EXPIRY_HOURS``."""
+    cutoff = timezone.now() - timedelta(
+        hours=_setting("CHUNKED_UPLOAD_EXPIRY_HOURS", 24)
+    )
+    for session in UploadSession.objects.filter(updated_at__lt=cutoff).only("id"):
+        discard_upload(session)
+
+
+def _remove_dir(session):
+    shutil.rmtree(session_dir(session), ignore_errors=True)
@@ -0,0 +1,136 @@
+"""
+Columnar (Parquet) copies of uploaded datasets.
+
+Uploads are converted once, while they are analyzed, into a
+zstd-compressed Parquet file. Row groups are kept small
+(``COLUMNAR_ROW_GROUP_ROWS``) so a row query decodes little beyond the
+rows it returns and min/max statistics prune more of the file.
+Later re-analysis and row queries memory-map that file and read only the
+columns they need, instead of tokenizing the CSV again. Requires pyarrow;
+without it (or with ``COLUMNAR_STORAGE = False``) datasets keep only
+their CSV.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+
+from .parsers import ALL_COLUMNS, read_csv_chunks
+from .validators import NUMERIC_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+
+def enabled():
+    return pa is not None and getattr(settings, "COLUMNAR_STORAGE", True)
+
+
+def schema():
+    return pa.schema(
+        [("Equipment Name", pa.string()), ("Type", pa.string())]
+        + [(col, pa.float64()) for col in NUMERIC_COLUMNS]
+    )
+
+
+class ParquetSink:
+    """
+    Collects DataFrame chunks into a temporary Parquet file (created in
+    ``directory``, or the system temp directory).
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(suffix=".parquet", dir=directory)
+        os.close(fd)
+        self._writer = None
+
+    def __call__(self, df):
+        table = pa.Table.from_pandas(df[ALL_COLUMNS], preserve_index=False)
+        self.write_table(table.cast(schema()))
+
+    def write_table(self, table):
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(
+                self.path,
+                schema(),
+                compression=getattr(settings, "COLUMNAR_COMPRESSION", "zstd"),
+            )
+        self._writer.write_table(
+            table,
+            row_group_size=getattr(settings, "COLUMNAR_ROW_GROUP_ROWS", 16_384),
+        )
+
+    def close(self):
+        """Finish the file and return its path (None if nothing was written)."""
+        if self._writer is None:
+            self.discard()
+            return None
+        self._writer.close()
+        return self.path
+
+    def discard(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def convert_csv(file_obj):
+    """Convert a CSV file to a temporary Parquet file and return its path."""
+    sink = ParquetSink()
+    try:
+        for df in read_csv_chunks(file_obj, columns=ALL_COLUMNS):
+            sink(df)
+    except Exception:
+        sink.discard()
+        raise
+    return sink.close()
+
+
+def concat_parquet(paths):
+    """
+    Concatenate Parquet files written by ``ParquetSink`` into a new
+    temporary file and return its path (None if there was nothing to copy).
+    Row groups are copied as decoded Arrow tables; no CSV is parsed.
+    """
+    sink = ParquetSink()
+    try:
+        for path in paths:
+            parquet = open_parquet(path)
+            for i in range(parquet.num_row_groups):
+                sink.write_table(parquet.read_row_group(i))
+    except Exception:
+        sink.discard()
+        raise
+    return sink.close()
+
+
+def open_parquet(path, read_dictionary=None):
+    """Memory-map a stored Parquet file."""
+    return pq.ParquetFile(path, memory_map=True, read_dictionary=read_dictionary)
+
+
+def read_table(path, columns=None, filters=None):
+    """Read ``columns`` of a stored Parquet file as a memory-mapped Arrow table."""
+    return pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+
+
+def iter_frames(blob, columns=None):
+    """
+    Yield DataFrame chunks of a stored dataset.
+
+    Reads the Parquet copy one row group at a time when there is one, and
+    falls back to parsing the CSV otherwise.
+    """
+    if blob.columnar and enabled():
+        parquet = open_parquet(blob.columnar.path)
+        for i in range(parquet.num_row_groups):
+            yield parquet.read_row_group(i, columns=columns).to_pandas()
+        return
+
+    with blob.file.open("rb") as f:
+        frames = read_csv_chunks(f, columns=columns or ALL_COLUMNS)
+        yield from frames
@@ -0,0 +1,85 @@
+"""
+Cross-dataset comparison from stored aggregates.
+
+Each dataset's blob keeps the mergeable state produced when it was analyzed
+(count / mean / M2 / min / max per parameter, type counts, quantile
+sketches and histograms). A comparison only restores and merges those
+small states, so its cost depends on how many datasets are compared and
+not on how many rows they hold; no CSV or Parquet file is read.
+"""
+from .analysis import SummaryAccumulator
+from .services import HISTORY_LIMIT, load_aggregates
+
+MIN_DATASETS = 2
+DELTA_FIELDS = ("avg", "min", "max", "std", "p50", "p90", "p99")
+
+
+def parse_ids(raw):
+    """Parse the comma-separated ``ids`` query parameter, keeping its order."""
+    try:
+        ids = [int(part) for part in (raw or "").split(",") if part.strip()]
+    except ValueError:
+        raise ValueError("ids must be a comma-separated list of dataset ids")
+
+    ids = list(dict.fromkeys(ids))
+    if not MIN_DATASETS <= len(ids) <= HISTORY_LIMIT:
+        raise ValueError(
+            f"Select between {MIN_DATASETS} and {HISTORY_LIMIT} datasets to compare"
+        )
+    return ids
+
+
+def _delta(value, baseline):
+    if value is None or baseline is None:
+        return None
+    return value - baseline
+
+
+def _stat_deltas(statistics, baseline):
+    return {
+        param: {
+            field: _delta(values.get(field), baseline[param].get(field))
+            for field in DELTA_FIELDS
+        }
+        for param, values in statistics.items()
+    }
+
+
+def compare_datasets(datasets):
+    """
+    Compare ``datasets``; the first one is the baseline for the deltas.
+
+    Returns the side-by-side summary of every dataset, each later dataset's
+    differences from the baseline, and the summary of all of them merged.
+    """
+    combined = SummaryAccumulator()
+    entries = []
+    for dataset in datasets:
+        acc = load_aggregates(dataset)
+        summary = acc.result()
+        entries.append({
+            "id": dataset.id,
+            "name": dataset.name,
+            "created_at": dataset.created_at.strftime("%Y-%m-%d %H:%M"),
+            "total_count": summary["total_count"],
+            "statistics": summary["statistics"],
+            "type_distribution": summary["type_distribution"],
+        })
+        combined.merge(acc)
+
+    baseline = entries[0]
+    deltas = [
+        {
+            "id": entry["id"],
+            "total_count": entry["total_count"] - baseline["total_count"],
+            "statistics": _stat_deltas(entry["statistics"], baseline["statistics"]),
+        }
+        for entry in entries[1:]
+    ]
+
+    return {
+        "baseline_id": baseline["id"],
+        "datasets": entries,
+        "deltas": deltas,
+        "combined": combined.result(),
+    }
@@ -0,0 +1,24 @@
+"""
+SQLite connection tuning, enabled by the SQLITE_PERFORMANCE_PROFILE setting.
+
+Every new SQLite connection gets the pragmas in SQLITE_PRAGMAS: WAL
+journaling lets readers run alongside the single writer, so history and
+summary requests no longer wait on (or fail behind) an upload's write
+transaction; synchronous=NORMAL is durable with WAL except for the last
+commits on power loss; a larger page cache and memory-mapped reads cut
+syscalls; busy_timeout makes a writer wait for the lock instead of failing
+with "database is locked".
+"""
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    if not getattr(settings, "SQLITE_PERFORMANCE_PROFILE", False):
+        return
+
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
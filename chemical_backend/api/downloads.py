@@ -0,0 +1,118 @@
+"""
+File downloads streamed from disk, with HTTP range support.
+
+Files are sent through ``FileResponse``, which reads them in blocks, so a
+large report is never loaded into memory and ``Content-Length`` is always
+set. A single byte range (``bytes=a-b``, ``bytes=a-`` or ``bytes=-n``)
+gets a 206 with just that slice, letting clients resume interrupted
+downloads. ``If-Range`` falls back to the whole file when the validator no
+longer matches. Requests for several ranges get the whole file, which
+RFC 9110 allows.
+
+Under ASGI, ``async_stream`` switches such a response to reading its blocks
+in a worker thread; Django would otherwise read a synchronous file into
+memory in full before sending it.
+"""
+import re
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, HttpResponse
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Larger than FileResponse's 4 KiB blocks: each async read is a thread hop.
+ASYNC_BLOCK_SIZE = 64 * 1024
+
+
+class FileSlice:
+    """Read-only view of ``length`` bytes of an open file, from ``start``."""
+
+    def __init__(self, file_obj, start, length):
+        file_obj.seek(start)
+        self.file = file_obj
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the ``(start, end)`` byte positions (inclusive) requested by a
+    Range header, None to send the whole file, or ``False`` when the range
+    cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start > end:
+            return False
+    else:
+        # Suffix range: the last ``last`` bytes.
+        if not int(last):
+            return False
+        start, end = max(0, size - int(last)), size - 1
+    return start, end
+
+
+def file_response(request, file_obj, filename, content_type, etag=None):
+    """Stream ``file_obj`` as an attachment, honoring Range/If-Range."""
+    file_obj.seek(0, 2)
+    size = file_obj.tell()
+    file_obj.seek(0)
+
+    byte_range = None
+    header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    # Only a strong ETag match may resume; dates are not tracked here.
+    if header and (if_range is None or (etag and if_range == etag)):
+        byte_range = parse_range(header, size)
+
+    if byte_range is False:
+        file_obj.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is None:
+        response = FileResponse(
+            file_obj, as_attachment=True, filename=filename,
+            content_type=content_type,
+        )
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            FileSlice(file_obj, start, end - start + 1), status=206,
+            as_attachment=True, filename=filename, content_type=content_type,
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    if etag:
+        response["ETag"] = etag
+    return response
+
+
+def async_stream(response):
+    """Make a ``file_response`` stream its file through async reads."""
+    file_obj = getattr(response, "file_to_stream", None)
+    if file_obj is None:
+        return response
+    read = sync_to_async(file_obj.read, thread_sensitive=False)
+
+    async def blocks():
+        while data := await read(ASYNC_BLOCK_SIZE):
+            yield data
+
+    # The file stays registered for closing with the response.
+    response.streaming_content = blocks()
+    return response
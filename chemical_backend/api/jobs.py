@@ -0,0 +1,120 @@
+"""
+Background execution of PDF report jobs.
+
+Jobs are stored as ``ReportJob`` rows, so no external broker is needed.
+With ``REPORT_JOB_BACKEND = "process"`` they are handed to a local process
+pool as soon as the enqueueing transaction commits; with ``"worker"`` they
+stay pending until ``manage.py run_report_worker`` picks them up.
+
+A job still running ``REPORT_JOB_TIMEOUT`` seconds after it was claimed
+lost its process and is requeued (or failed, after
+``REPORT_JOB_MAX_ATTEMPTS``): by the worker on every poll, and when its
+status is polled.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import pool
+from .models import ReportJob
+from .services import render_report
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, "REPORT_JOB_WORKERS", 2),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=pool.init_worker,
+        )
+    return _executor
+
+
+def _schedule(job_ids):
+    """Hand jobs to the process pool once the current transaction commits."""
+    if job_ids and getattr(settings, "REPORT_JOB_BACKEND", "process") == "process":
+        transaction.on_commit(
+            lambda: [_get_executor().submit(pool.run_job, job_id) for job_id in job_ids]
+        )
+
+
+def enqueue_report(dataset, user, charts=""):
+    """Create a pending report job and schedule it on the configured backend."""
+    job = ReportJob.objects.create(user=user, dataset=dataset, charts=charts)
+    _schedule([job.id])
+    return job
+
+
+def claim_job(job_id):
+    """Atomically move a job from pending to running. Returns False if taken."""
+    return ReportJob.objects.filter(
+        id=job_id, status=ReportJob.PENDING
+    ).update(
+        status=ReportJob.RUNNING,
+        started_at=timezone.now(),
+        attempts=F("attempts") + 1,
+    ) == 1
+
+
+def recover_stale_jobs(job_ids=None):
+    """
+    Requeue jobs left running for longer than ``REPORT_JOB_TIMEOUT``
+    seconds, whose pool process or worker most likely died, and fail the
+    ones that already had ``REPORT_JOB_MAX_ATTEMPTS`` attempts. Only
+    ``job_ids`` are checked if given. Returns the ids requeued.
+    """
+    cutoff = timezone.now() - timedelta(
+        seconds=getattr(settings, "REPORT_JOB_TIMEOUT", 10 * 60)
+    )
+    max_attempts = getattr(settings, "REPORT_JOB_MAX_ATTEMPTS", 2)
+    stale = ReportJob.objects.filter(status=ReportJob.RUNNING, started_at__lt=cutoff)
+    if job_ids is not None:
+        stale = stale.filter(id__in=job_ids)
+
+    stale.filter(attempts__gte=max_attempts).update(
+        status=ReportJob.FAILED,
+        error="Report generation timed out",
+        finished_at=timezone.now(),
+    )
+    requeue = stale.filter(attempts__lt=max_attempts)
+    job_ids = list(requeue.values_list("id", flat=True))
+    requeue.filter(id__in=job_ids).update(status=ReportJob.PENDING, started_at=None)
+    _schedule(job_ids)
+    return job_ids
+
+
+def run_report_job(job_id):
+    """Render the report for a job and store the PDF on it."""
+    if not claim_job(job_id):
+        return
+
+    job = ReportJob.objects.select_related("dataset__user", "dataset__summary").get(id=job_id)
+    try:
+        pdf_data = render_report(job.dataset, charts=job.charts)
+        job.file.save(f"report_{job.id}.pdf", ContentFile(pdf_data), save=False)
+        job.status = ReportJob.DONE
+    except Exception as e:
+        job.status = ReportJob.FAILED
+        job.error = str(e)
+
+    # Only the run that still owns the job records its outcome; one that
+    # overran the timeout may have been requeued and taken over meanwhile.
+    recorded = ReportJob.objects.filter(
+        id=job.id, status=ReportJob.RUNNING, attempts=job.attempts,
+    ).update(
+        file=job.file.name or "",
+        status=job.status,
+        error=job.error,
+        finished_at=timezone.now(),
+    )
+    if not recorded and job.file:
+        job.file.delete(save=False)
@@ -0,0 +1,27 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from api import columnar
+from api.models import DatasetBlob
+
+
+class Command(BaseCommand):
+    help = "Create Parquet copies for stored datasets that don't have one yet."
+
+    def handle(self, *args, **options):
+        if not columnar.enabled():
+            raise CommandError("Columnar storage is disabled or pyarrow is not installed.")
+
+        for blob in DatasetBlob.objects.filter(columnar=""):
+            with blob.file.open("rb") as f:
+                path = columnar.convert_csv(f)
+            if path is None:
+                continue
+            try:
+                with open(path, "rb") as f:
+                    blob.columnar.save(f"{blob.sha256}.parquet", File(f))
+            finally:
+                os.remove(path)
+            self.stdout.write(f"Converted blob {blob.sha256[:12]}")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api import response_cache
+from api.models import DatasetBlob, DatasetSummary
+from api.services import analyze_blob
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute stored dataset summaries and aggregates from their "
+        "columnar copies (or CSV files), e.g. after the summary format changes."
+    )
+
+    def handle(self, *args, **options):
+        for blob in DatasetBlob.objects.all():
+            summary, aggregates = analyze_blob(blob)
+            blob.summary_json = summary
+            blob.aggregates_json = aggregates
+            blob.save(update_fields=["summary_json", "aggregates_json"])
+            DatasetSummary.objects.filter(dataset__blob=blob).update(summary_json=summary)
+            response_cache.invalidate_summaries(
+                *blob.datasets.values_list("id", flat=True)
+            )
+            self.stdout.write(f"Resummarized blob {blob.sha256[:12]}")
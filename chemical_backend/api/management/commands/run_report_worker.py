@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import recover_stale_jobs, run_report_job
+from api.models import ReportJob
+
+
+class Command(BaseCommand):
+    help = "Process pending PDF report jobs from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the pending jobs and exit instead of polling.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep between polls when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for job_id in recover_stale_jobs():
+                self.stdout.write(f"Requeued stale report job {job_id}")
+
+            pending = list(
+                ReportJob.objects
+                .filter(status=ReportJob.PENDING)
+                .order_by("created_at")
+                .values_list("id", flat=True)
+            )
+            for job_id in pending:
+                run_report_job(job_id)
+                self.stdout.write(f"Processed report job {job_id}")
+
+            if options["once"]:
+                break
+            if not pending:
+                time.sleep(options["interval"])
@@ -0,0 +1,67 @@
+"""
+Selective response compression.
+
+Django's ``GZipMiddleware`` compresses everything above 200 bytes, including
+PDFs and Parquet-backed downloads that are already compressed. This subclass
+only touches responses whose content type is listed in
+``RESPONSE_COMPRESSION_TYPES`` and whose body is at least
+``RESPONSE_COMPRESSION_MIN_BYTES``. Clients that accept ``br`` get Brotli
+when the ``brotli`` package is installed; everyone else gets gzip.
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+re_accepts_br = _lazy_re_compile(r"\bbr\b")
+
+DEFAULT_COMPRESSION_TYPES = (
+    "application/json",
+    "application/msgpack",
+    "text/",
+)
+
+
+class SelectiveCompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if not self._should_compress(response):
+            return response
+
+        ae = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if brotli is None or response.streaming or not re_accepts_br.search(ae):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(
+            response.content,
+            quality=getattr(settings, "RESPONSE_BROTLI_QUALITY", 5),
+        )
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        # Same rule as GZipMiddleware: a strong ETag becomes weak.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+    def _should_compress(self, response):
+        if response.has_header("Content-Encoding"):
+            return False
+        content_type = response.get("Content-Type", "").split(";")[0].strip()
+        types = getattr(
+            settings, "RESPONSE_COMPRESSION_TYPES", DEFAULT_COMPRESSION_TYPES
+        )
+        if not any(content_type.startswith(t) for t in types):
+            return False
+        if response.streaming:
+            return True
+        min_bytes = getattr(settings, "RESPONSE_COMPRESSION_MIN_BYTES", 1024)
+        return len(response.content) >= min_bytes
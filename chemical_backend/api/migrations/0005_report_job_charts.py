@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_report_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='charts',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+    ]
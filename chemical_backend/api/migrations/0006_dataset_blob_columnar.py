@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_report_job_charts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetblob',
+            name='columnar',
+            field=models.FileField(blank=True, upload_to='columnar/'),
+        ),
+    ]
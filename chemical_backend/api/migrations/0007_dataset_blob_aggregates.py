@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_dataset_blob_columnar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetblob',
+            name='aggregates_json',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
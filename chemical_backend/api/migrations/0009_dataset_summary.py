@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def move_summaries(apps, schema_editor):
+    Dataset = apps.get_model("api", "Dataset")
+    DatasetSummary = apps.get_model("api", "DatasetSummary")
+
+    batch = []
+    for dataset_id, summary in Dataset.objects.values_list("id", "summary_json").iterator():
+        batch.append(DatasetSummary(dataset_id=dataset_id, summary_json=summary or {}))
+        if len(batch) >= BATCH_SIZE:
+            DatasetSummary.objects.bulk_create(batch)
+            batch = []
+    DatasetSummary.objects.bulk_create(batch)
+
+
+def restore_summaries(apps, schema_editor):
+    Dataset = apps.get_model("api", "Dataset")
+    DatasetSummary = apps.get_model("api", "DatasetSummary")
+
+    for dataset_id, summary in DatasetSummary.objects.values_list("dataset_id", "summary_json").iterator():
+        Dataset.objects.filter(id=dataset_id).update(summary_json=summary)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_dataset_user_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetSummary',
+            fields=[
+                ('dataset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='api.dataset')),
+                ('summary_json', models.JSONField()),
+            ],
+        ),
+        # Nullable while the data moves, so the migration can be reversed.
+        migrations.AlterField(
+            model_name='dataset',
+            name='summary_json',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(move_summaries, restore_summaries),
+        migrations.RemoveField(
+            model_name='dataset',
+            name='summary_json',
+        ),
+    ]
@@ -1,12 +1,135 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
+
+class DatasetBlob(models.Model):
+    """
+    A stored CSV file, deduplicated by the SHA-256 of its contents.
+
+    Datasets that upload identical bytes share one blob. Its
+    ``summary_json`` is the analysis of those bytes, copied into the
+    ``DatasetSummary`` of every dataset created from it so a duplicate
+    upload is not analyzed again; nothing else reads it. ``ref_count``
+    tracks how many datasets point at the blob; the file is only deleted
+    once it drops to zero.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to="datasets/")
+    # Parquet copy of the CSV used for re-analysis and row queries.
+    columnar = models.FileField(upload_to="columnar/", blank=True)
+    summary_json = models.JSONField()
+    # Mergeable analysis state (SummaryAccumulator.to_state()), used to
+    # compare datasets without re-reading them. Empty for blobs stored
+    # before it existed until they are resummarized or first compared.
+    aggregates_json = models.JSONField(default=dict, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+
 class Dataset(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     file = models.FileField(upload_to="datasets/")
+    blob = models.ForeignKey(
+        DatasetBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="datasets",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # History listing and retention: a user's datasets by upload time.
+            models.Index(fields=["user", "created_at"], name="dataset_user_created_idx"),
+        ]
+
+    def __str__(self):
+        # user_id, not user.username: listing datasets shouldn't query users.
+        return f"{self.name} (user {self.user_id})"
+
+
+class DatasetSummary(models.Model):
+    """
+    The analysis summary of a dataset, kept off the ``Dataset`` row.
+
+    Summaries grow with per-type statistics, percentiles and histograms;
+    storing them here means listing, admin and retention queries never load
+    them. This is where every dataset's summary is read from: the upload,
+    summary and report paths. ``resummarize`` rewrites it along with the
+    blob's copy.
+    """
+    dataset = models.OneToOneField(
+        Dataset,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="summary",
+    )
     summary_json = models.JSONField()
+
+    def __str__(self):
+        return f"Summary of dataset {self.dataset_id}"
+
+
+class UploadSession(models.Model):
+    """
+    A CSV being uploaded in numbered chunks (see ``api/chunked.py``).
+
+    Chunks are analyzed as they arrive, so the running analysis state, the
+    CSV header and the incomplete last line of the previous chunk are kept
+    here between requests. Chunk files live in the session's directory
+    until the upload is finalized or discarded.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    next_chunk = models.PositiveIntegerField(default=0)
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    header = models.BinaryField(default=b"", blank=True)
+    carry = models.BinaryField(default=b"", blank=True)
+    # SummaryAccumulator.to_state() of the rows analyzed so far.
+    aggregates_json = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload of {self.name} ({self.received_bytes}/{self.size} bytes)"
+
+
+class ReportJob(models.Model):
+    """A PDF report queued for background generation."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name="report_jobs")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    charts = models.CharField(max_length=16, blank=True)
+    file = models.FileField(upload_to="reports/", blank=True)
+    error = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set when a run claims the job; a job still running long after it was
+    # claimed lost its process and is requeued (see jobs.recover_stale_jobs).
+    started_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
-        return f"{self.name} ({self.user.username})"
+        return f"Report {self.id} for dataset {self.dataset_id} ({self.status})"
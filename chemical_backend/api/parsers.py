@@ -0,0 +1,204 @@
+"""
+Typed, column-pruned CSV parsing.
+
+Only the columns the analysis needs are read, with fixed dtypes, so pandas
+never infers types or materializes the free-text ``Equipment Name`` column.
+When pyarrow is installed its multithreaded streaming reader is used;
+otherwise pandas' C engine reads the same columns in row chunks.
+"""
+import csv
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .validators import NUMERIC_COLUMNS, REQUIRED_COLUMNS, validate_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+DEFAULT_CHUNK_ROWS = 100_000
+SAMPLE_BYTES = 64 * 1024
+
+ANALYSIS_COLUMNS = ["Type"] + NUMERIC_COLUMNS
+ALL_COLUMNS = ["Equipment Name"] + ANALYSIS_COLUMNS
+
+
+def _float_dtype():
+    return np.dtype(getattr(settings, "ANALYSIS_FLOAT_DTYPE", "float64"))
+
+
+def _read_header(file_obj):
+    """Return the header names of a CSV without moving the file position."""
+    start = file_obj.tell()
+    line = file_obj.readline()
+    file_obj.seek(start)
+
+    if isinstance(line, bytes):
+        line = line.decode("utf-8-sig")
+    header = next(csv.reader([line]), None)
+    if not header:
+        raise ValueError("CSV file is empty")
+    return header
+
+
+def resolve_columns(file_obj):
+    """
+    Map canonical column names onto the names used in the file's header.
+
+    Matching ignores case and surrounding whitespace. Raises ``ValueError``
+    if any of ``REQUIRED_COLUMNS`` is missing.
+    """
+    canonical = {c.lower(): c for c in REQUIRED_COLUMNS}
+    mapping = {}
+    for raw in _read_header(file_obj):
+        name = canonical.get(raw.strip().lower())
+        if name and name not in mapping:
+            mapping[name] = raw
+
+    validate_columns(pd.DataFrame(columns=list(mapping)))
+    return mapping
+
+
+def _rows_for_bytes(file_obj, chunk_bytes):
+    """Estimate how many rows fit in ``chunk_bytes`` from a sample of the file."""
+    start = file_obj.tell()
+    sample = file_obj.read(SAMPLE_BYTES)
+    file_obj.seek(start)
+
+    lines = sample.count(b"\n" if isinstance(sample, bytes) else "\n")
+    if not lines:
+        return DEFAULT_CHUNK_ROWS
+    return max(1, chunk_bytes * lines // len(sample))
+
+
+def _bytes_for_rows(file_obj, chunk_rows):
+    """Inverse of ``_rows_for_bytes``: approximate byte size of ``chunk_rows`` rows."""
+    start = file_obj.tell()
+    sample = file_obj.read(SAMPLE_BYTES)
+    file_obj.seek(start)
+
+    lines = sample.count(b"\n") or 1
+    return max(SAMPLE_BYTES, chunk_rows * len(sample) // lines)
+
+
+def _use_arrow(file_obj):
+    engine = getattr(settings, "ANALYSIS_CSV_ENGINE", "auto")
+    if engine == "pandas" or pa is None:
+        return False
+    # The Arrow reader needs a binary stream.
+    start = file_obj.tell()
+    binary = isinstance(file_obj.read(0), bytes)
+    file_obj.seek(start)
+    return binary
+
+
+def _numeric_error(exc):
+    return ValueError(
+        f"Columns {', '.join(NUMERIC_COLUMNS)} must be numeric ({exc})"
+    )
+
+
+def _malformed_error(exc):
+    return ValueError(f"Malformed CSV ({exc})")
+
+
+def _arrow_error(exc):
+    """Tell a value that isn't a number from a row that doesn't parse."""
+    message = str(exc)
+    if "conversion error to double" in message or "conversion error to float" in message:
+        return _numeric_error(exc)
+    return _malformed_error(exc)
+
+
+def _require_finite(frames):
+    """Reject infinite values, which have no place in the summary's JSON."""
+    for df in frames:
+        numeric = df[[col for col in NUMERIC_COLUMNS if col in df.columns]]
+        if np.isinf(numeric.to_numpy()).any():
+            raise ValueError(
+                f"Columns {', '.join(NUMERIC_COLUMNS)} must be finite numbers"
+            )
+        yield df
+
+
+def _arrow_chunks(file_obj, mapping, block_size, columns):
+    float_type = pa.from_numpy_dtype(_float_dtype())
+    column_types = {mapping[col]: float_type for col in NUMERIC_COLUMNS}
+    column_types[mapping["Type"]] = pa.dictionary(pa.int32(), pa.string())
+    column_types[mapping["Equipment Name"]] = pa.string()
+    rename = {raw: name for name, raw in mapping.items()}
+
+    try:
+        reader = pa_csv.open_csv(
+            file_obj,
+            read_options=pa_csv.ReadOptions(block_size=block_size, use_threads=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=[mapping[col] for col in columns],
+                column_types=column_types,
+            ),
+        )
+        for batch in reader:
+            yield batch.to_pandas().rename(columns=rename)
+    except pa.ArrowInvalid as exc:
+        raise _arrow_error(exc) from exc
+
+
+def _pandas_chunks(file_obj, mapping, chunk_rows, columns):
+    float_dtype = _float_dtype()
+    dtype = {mapping[col]: float_dtype for col in NUMERIC_COLUMNS}
+    dtype[mapping["Type"]] = "category"
+    dtype[mapping["Equipment Name"]] = str
+    rename = {raw: name for name, raw in mapping.items()}
+
+    reader = pd.read_csv(
+        file_obj,
+        usecols=[mapping[col] for col in columns],
+        dtype=dtype,
+        chunksize=chunk_rows,
+        engine="c",
+    )
+    with reader:
+        try:
+            for df in reader:
+                yield df.rename(columns=rename)
+        except pd.errors.ParserError as exc:
+            raise _malformed_error(exc) from exc
+        except ValueError as exc:
+            raise _numeric_error(exc) from exc
+
+
+def read_csv_chunks(file_obj, chunk_rows=None, chunk_bytes=None,
+                    columns=ANALYSIS_COLUMNS):
+    """
+    Yield typed DataFrame chunks holding only ``columns``.
+
+    By default only ``Type`` and the numeric columns are read; pass
+    ``ALL_COLUMNS`` to keep ``Equipment Name`` too. ``chunk_rows`` bounds
+    each chunk by row count; ``chunk_bytes`` bounds it by an approximate
+    byte size instead. Both default to the ``ANALYSIS_CHUNK_ROWS`` /
+    ``ANALYSIS_CHUNK_BYTES`` settings. Numeric columns use
+    ``ANALYSIS_FLOAT_DTYPE`` and ``Type`` is categorical. Non-numeric and
+    infinite values raise ``ValueError``.
+    """
+    if chunk_rows is None and chunk_bytes is None:
+        chunk_rows = getattr(settings, "ANALYSIS_CHUNK_ROWS", None)
+        chunk_bytes = getattr(settings, "ANALYSIS_CHUNK_BYTES", None)
+
+    mapping = resolve_columns(file_obj)
+
+    if _use_arrow(file_obj):
+        if not chunk_bytes:
+            chunk_bytes = _bytes_for_rows(file_obj, chunk_rows or DEFAULT_CHUNK_ROWS)
+        yield from _require_finite(_arrow_chunks(file_obj, mapping, chunk_bytes, columns))
+        return
+
+    if chunk_rows is None:
+        if chunk_bytes:
+            chunk_rows = _rows_for_bytes(file_obj, chunk_bytes)
+        else:
+            chunk_rows = DEFAULT_CHUNK_ROWS
+    yield from _require_finite(_pandas_chunks(file_obj, mapping, chunk_rows, columns))
@@ -10,61 +10,206 @@ from reportlab.platypus import (
     Image,
 )
 from reportlab.lib.units import inch
-import matplotlib.pyplot as plt
-import tempfile
-import os
-import matplotlib
-matplotlib.use("Agg")  
+from reportlab.graphics.shapes import Drawing, Line, Rect, String
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from io import BytesIO
+import threading
 
+# Bump whenever the report layout changes so cached PDFs are regenerated.
+REPORT_TEMPLATE_VERSION = 3
+
+# "matplotlib" embeds rasterized PNG charts; "vector" draws them with
+# reportlab.graphics and never imports Matplotlib.
+CHART_BACKENDS = ("matplotlib", "vector")
+
+PARAMETER_LABELS = ["Flowrate", "Pressure", "Temperature"]
+BAR_COLORS = ["#22c55e", "#f97316", "#a855f7"]
+PIE_COLORS = [
+    "#2563eb", "#f97316", "#22c55e", "#a855f7",
+    "#ef4444", "#14b8a6", "#eab308", "#64748b",
+]
+
+# Pre-built figures, one set per thread, reused across reports.
+_templates = threading.local()
+
+
+def _figure_template(name):
+    """Return a reusable (fig, ax) pair for a chart, cleared for redrawing."""
+    cache = getattr(_templates, "figures", None)
+    if cache is None:
+        cache = _templates.figures = {}
+
+    if name not in cache:
+        # Imported lazily so the vector backend never loads Matplotlib.
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        cache[name] = (fig, fig.add_subplot())
+
+    fig, ax = cache[name]
+    ax.clear()
+    return fig, ax
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def _average_values(statistics):
+    # A column without any values has a null average; draw it as 0.
+    return [
+        statistics[key]["avg"] or 0.0
+        for key in ("flowrate", "pressure", "temperature")
+    ]
+
+
+def _render_png(fig):
+    buf = BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    buf.seek(0)
+    return buf
 
 
 def _generate_type_distribution_chart(type_distribution):
-    """Generate pie chart image and return file path"""
+    """Generate pie chart image and return it as an in-memory PNG"""
     labels = list(type_distribution.keys())
     values = list(type_distribution.values())
 
-    fig, ax = plt.subplots()
+    fig, ax = _figure_template("type_distribution")
     ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=140)
     ax.set_title("Equipment Type Distribution")
 
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    plt.savefig(temp_file.name, bbox_inches="tight")
-    plt.close(fig)
-
-    return temp_file.name
+    return _render_png(fig)
 
 
 def _generate_average_chart(statistics):
-    """Generate bar chart image and return file path"""
-    labels = ["Flowrate", "Pressure", "Temperature"]
-    values = [
-        statistics["flowrate"]["avg"],
-        statistics["pressure"]["avg"],
-        statistics["temperature"]["avg"],
-    ]
+    """Generate bar chart image and return it as an in-memory PNG"""
+    labels = PARAMETER_LABELS
+    values = _average_values(statistics)
 
-    fig, ax = plt.subplots()
-    ax.bar(labels, values, color=["#22c55e", "#f97316", "#a855f7"])
+    fig, ax = _figure_template("average")
+    ax.bar(labels, values, color=BAR_COLORS)
     ax.set_title("Average Equipment Parameters")
 
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    plt.savefig(temp_file.name, bbox_inches="tight")
-    plt.close(fig)
+    return _render_png(fig)
+
+
+def _generate_histogram_chart(label, histogram, color):
+    """Generate a histogram image for one parameter as an in-memory PNG"""
+    fig, ax = _figure_template(f"histogram_{label}")
+    fig.set_size_inches(6.4, 4.0)  # same aspect ratio as the 4x2.5in slot
+    ax.stairs(histogram["counts"], histogram["edges"], fill=True, color=color)
+    ax.set_title(f"{label} Distribution")
+    ax.set_ylabel("Count")
+
+    return _render_png(fig)
+
+
+def _chart_title(drawing, text):
+    drawing.add(String(
+        drawing.width / 2, drawing.height - 14, text,
+        fontName="Helvetica-Bold", fontSize=12, textAnchor="middle",
+    ))
+
+
+def _vector_type_distribution_chart(type_distribution):
+    """Draw the pie chart with reportlab.graphics and return a Drawing"""
+    labels = list(type_distribution.keys())
+    values = list(type_distribution.values())
+    total = sum(values) or 1
+
+    drawing = Drawing(4*inch, 4*inch)
+    _chart_title(drawing, "Equipment Type Distribution")
+
+    pie = Pie()
+    pie.x, pie.y = 0.9*inch, 0.6*inch
+    pie.width = pie.height = 2.2*inch
+    pie.startAngle = 140
+    pie.direction = "anticlockwise"
+    pie.data = values
+    pie.labels = [f"{k} ({v / total:.1%})" for k, v in zip(labels, values)]
+    pie.simpleLabels = 0
+    pie.slices.fontName = "Helvetica"
+    pie.slices.fontSize = 8
+    pie.slices.strokeColor = colors.white
+    for i in range(len(values)):
+        pie.slices[i].fillColor = colors.HexColor(PIE_COLORS[i % len(PIE_COLORS)])
+
+    drawing.add(pie)
+    return drawing
+
+
+def _vector_average_chart(statistics):
+    """Draw the bar chart with reportlab.graphics and return a Drawing"""
+    values = _average_values(statistics)
+
+    drawing = Drawing(4*inch, 3*inch)
+    _chart_title(drawing, "Average Equipment Parameters")
+
+    chart = VerticalBarChart()
+    chart.x, chart.y = 0.5*inch, 0.4*inch
+    chart.width, chart.height = 3.2*inch, 2.1*inch
+    chart.data = [values]
+    chart.categoryAxis.categoryNames = PARAMETER_LABELS
+    chart.categoryAxis.labels.fontName = "Helvetica"
+    chart.valueAxis.labels.fontName = "Helvetica"
+    chart.valueAxis.valueMin = min(0, min(values))
+    chart.bars.strokeColor = None
+    for i, color in enumerate(BAR_COLORS):
+        chart.bars[(0, i)].fillColor = colors.HexColor(color)
+
+    drawing.add(chart)
+    return drawing
 
-    return temp_file.name
 
+def _vector_histogram_chart(label, histogram, color):
+    """Draw a histogram for one parameter with reportlab.graphics"""
+    edges, counts = histogram["edges"], histogram["counts"]
 
-def build_pdf_report(file_path, summary, user):
+    drawing = Drawing(4*inch, 2.5*inch)
+    _chart_title(drawing, f"{label} Distribution")
+
+    x0, y0 = 0.5*inch, 0.4*inch
+    width, height = 3.2*inch, 1.6*inch
+    lo, hi = edges[0], edges[-1]
+    peak = max(counts)
+    bin_width = width / len(counts)
+    fill = colors.HexColor(color)
+
+    for i, count in enumerate(counts):
+        if count:
+            drawing.add(Rect(
+                x0 + i * bin_width, y0, bin_width, height * count / peak,
+                fillColor=fill, strokeColor=None,
+            ))
+    drawing.add(Line(x0, y0, x0 + width, y0, strokeColor=colors.grey))
+    drawing.add(Line(x0, y0, x0, y0 + height, strokeColor=colors.grey))
+
+    for x, text, anchor in ((x0, f"{lo:g}", "start"), (x0 + width, f"{hi:g}", "end")):
+        drawing.add(String(x, y0 - 12, text, fontName="Helvetica",
+                           fontSize=8, textAnchor=anchor))
+    drawing.add(String(x0 - 4, y0 + height - 4, str(peak), fontName="Helvetica",
+                       fontSize=8, textAnchor="end"))
+    return drawing
+
+
+def build_pdf_report(output, summary, user, charts="matplotlib"):
     """
-    Build a complete PDF report with:
+    Build a complete PDF report into ``output`` (a path or a writable
+    binary file object such as BytesIO) with:
     - Project info
     - User info
     - Dataset summary
     - Tables
-    - Charts
+    - Charts (drawn by the ``charts`` backend, see CHART_BACKENDS)
     """
+    if charts not in CHART_BACKENDS:
+        raise ValueError(f"Unknown chart backend: {charts}")
 
-    doc = SimpleDocTemplate(file_path, pagesize=A4)
+    doc = SimpleDocTemplate(output, pagesize=A4)
     styles = getSampleStyleSheet()
     elements = []
 
@@ -130,10 +275,15 @@ def build_pdf_report(file_path, summary, user):
     elements.append(Spacer(1, 20))
 
     # ===================== TYPE CHART =====================
-    type_chart_path = _generate_type_distribution_chart(
-        summary["type_distribution"]
-    )
-    elements.append(Image(type_chart_path, width=4*inch, height=4*inch))
+    if charts == "vector":
+        elements.append(_vector_type_distribution_chart(
+            summary["type_distribution"]
+        ))
+    else:
+        type_chart = _generate_type_distribution_chart(
+            summary["type_distribution"]
+        )
+        elements.append(Image(type_chart, width=4*inch, height=4*inch))
     elements.append(Spacer(1, 20))
 
     # ===================== STATISTICS =====================
@@ -145,7 +295,7 @@ def build_pdf_report(file_path, summary, user):
 
     stats = summary["statistics"]
 
-    stats_table = Table([
+    stats_data = [
         ["Parameter", "Average", "Minimum", "Maximum"],
         ["Flowrate", stats["flowrate"]["avg"],
          stats["flowrate"]["min"], stats["flowrate"]["max"]],
@@ -153,7 +303,15 @@ def build_pdf_report(file_path, summary, user):
          stats["pressure"]["min"], stats["pressure"]["max"]],
         ["Temperature", stats["temperature"]["avg"],
          stats["temperature"]["min"], stats["temperature"]["max"]],
-    ])
+    ]
+    # Percentiles are only present in summaries computed with sketches.
+    if "p50" in stats["flowrate"]:
+        stats_data[0] += ["P50", "P90", "P99"]
+        for row, label in zip(stats_data[1:], PARAMETER_LABELS):
+            s = stats[label.lower()]
+            row += [_fmt(s["p50"]), _fmt(s["p90"]), _fmt(s["p99"])]
+
+    stats_table = Table(stats_data)
     stats_table.setStyle(TableStyle([
         ("GRID", (0, 0), (-1, -1), 1, colors.grey),
         ("BACKGROUND", (0, 0), (-1, 0), colors.whitesmoke),
@@ -162,10 +320,57 @@ def build_pdf_report(file_path, summary, user):
     elements.append(Spacer(1, 20))
 
     # ===================== AVERAGE CHART =====================
-    avg_chart_path = _generate_average_chart(stats)
-    elements.append(Image(avg_chart_path, width=4*inch, height=3*inch))
+    if charts == "vector":
+        elements.append(_vector_average_chart(stats))
+    else:
+        avg_chart = _generate_average_chart(stats)
+        elements.append(Image(avg_chart, width=4*inch, height=3*inch))
     elements.append(Spacer(1, 30))
 
+    # ===================== HISTOGRAMS =====================
+    histograms = summary.get("histograms") or {}
+    for label, color in zip(PARAMETER_LABELS, BAR_COLORS):
+        histogram = histograms.get(label.lower())
+        if not histogram or not histogram["counts"]:
+            continue
+        if charts == "vector":
+            elements.append(_vector_histogram_chart(label, histogram, color))
+        else:
+            hist_chart = _generate_histogram_chart(label, histogram, color)
+            elements.append(Image(hist_chart, width=4*inch, height=2.5*inch))
+        elements.append(Spacer(1, 12))
+    if histograms:
+        elements.append(Spacer(1, 18))
+
+    # ===================== PER-TYPE STATISTICS =====================
+    # Summaries stored before per-type statistics existed don't have them.
+    type_stats = summary.get("type_statistics")
+    if type_stats:
+        elements.append(Paragraph(
+            "<b>Per-Type Statistics</b>",
+            styles["Heading2"]
+        ))
+        elements.append(Spacer(1, 8))
+
+        type_data = [["Type", "Count", "Parameter", "Average", "Minimum",
+                      "Maximum", "Std Dev"]]
+        for eq_type, group in type_stats.items():
+            for label in PARAMETER_LABELS:
+                s = group[label.lower()]
+                type_data.append([
+                    eq_type, group["count"], label,
+                    _fmt(s["avg"]), _fmt(s["min"]), _fmt(s["max"]),
+                    _fmt(s["std"]),
+                ])
+
+        type_table = Table(type_data, repeatRows=1)
+        type_table.setStyle(TableStyle([
+            ("GRID", (0, 0), (-1, -1), 1, colors.grey),
+            ("BACKGROUND", (0, 0), (-1, 0), colors.whitesmoke),
+        ]))
+        elements.append(type_table)
+        elements.append(Spacer(1, 30))
+
     # ===================== FOOTER =====================
     elements.append(Paragraph(
         "This report was automatically generated using the "
@@ -176,6 +381,151 @@ def build_pdf_report(file_path, summary, user):
     # ===================== BUILD PDF =====================
     doc.build(elements)
 
-    # Cleanup temp files
-    os.remove(type_chart_path)
-    os.remove(avg_chart_path)
+
+def _generate_comparison_chart(datasets):
+    """Generate a grouped bar chart of averages, one bar per dataset"""
+    fig, ax = _figure_template("comparison")
+    width = 0.8 / len(datasets)
+    for i, d in enumerate(datasets):
+        values = [d["statistics"][label.lower()]["avg"] or 0 for label in PARAMETER_LABELS]
+        positions = [p + (i - (len(datasets) - 1) / 2) * width
+                     for p in range(len(PARAMETER_LABELS))]
+        ax.bar(positions, values, width, label=d["name"],
+               color=PIE_COLORS[i % len(PIE_COLORS)])
+    ax.set_xticks(range(len(PARAMETER_LABELS)), PARAMETER_LABELS)
+    ax.set_title("Average Parameters by Dataset")
+    ax.legend(fontsize=8)
+
+    return _render_png(fig)
+
+
+def _vector_comparison_chart(datasets):
+    """Draw the grouped average bar chart with reportlab.graphics"""
+    from reportlab.graphics.charts.legends import Legend
+
+    data = [
+        [d["statistics"][label.lower()]["avg"] or 0 for label in PARAMETER_LABELS]
+        for d in datasets
+    ]
+    fills = [colors.HexColor(PIE_COLORS[i % len(PIE_COLORS)]) for i in range(len(data))]
+
+    drawing = Drawing(5*inch, 3*inch)
+    _chart_title(drawing, "Average Parameters by Dataset")
+
+    chart = VerticalBarChart()
+    chart.x, chart.y = 0.5*inch, 0.4*inch
+    chart.width, chart.height = 3.2*inch, 2.1*inch
+    chart.data = data
+    chart.categoryAxis.categoryNames = PARAMETER_LABELS
+    chart.categoryAxis.labels.fontName = "Helvetica"
+    chart.valueAxis.labels.fontName = "Helvetica"
+    chart.valueAxis.valueMin = min(0, min(min(row) for row in data))
+    chart.bars.strokeColor = None
+    for i, fill in enumerate(fills):
+        chart.bars[i].fillColor = fill
+    drawing.add(chart)
+
+    legend = Legend()
+    legend.x, legend.y = 3.9*inch, 2.4*inch
+    legend.fontName = "Helvetica"
+    legend.fontSize = 7
+    legend.colorNamePairs = [(fill, d["name"]) for fill, d in zip(fills, datasets)]
+    drawing.add(legend)
+    return drawing
+
+
+def build_comparison_report(output, comparison, user, charts="matplotlib"):
+    """
+    Build a PDF comparing several datasets into ``output``, from the result
+    of ``api.compare.compare_datasets``: the datasets, a per-parameter table
+    with differences from the baseline, a chart of averages and the
+    statistics of all datasets combined.
+    """
+    if charts not in CHART_BACKENDS:
+        raise ValueError(f"Unknown chart backend: {charts}")
+
+    doc = SimpleDocTemplate(output, pagesize=A4)
+    styles = getSampleStyleSheet()
+    elements = []
+    datasets = comparison["datasets"]
+    deltas = {d["id"]: d for d in comparison["deltas"]}
+    grid = TableStyle([
+        ("GRID", (0, 0), (-1, -1), 1, colors.grey),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.whitesmoke),
+    ])
+
+    # ===================== TITLE =====================
+    elements.append(Paragraph(
+        "<b>Chemical Equipment Dataset Comparison</b>",
+        styles["Title"]
+    ))
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(
+        f"Generated for {user.username}. Differences are relative to the "
+        f"baseline dataset, {datasets[0]['name']}.",
+        styles["Normal"]
+    ))
+    elements.append(Spacer(1, 20))
+
+    # ===================== DATASETS =====================
+    elements.append(Paragraph("<b>Datasets</b>", styles["Heading2"]))
+    elements.append(Spacer(1, 8))
+
+    dataset_data = [["Dataset", "Uploaded", "Records", "Change"]]
+    for d in datasets:
+        change = deltas[d["id"]]["total_count"] if d["id"] in deltas else "baseline"
+        dataset_data.append([d["name"], d["created_at"], d["total_count"], change])
+    dataset_table = Table(dataset_data)
+    dataset_table.setStyle(grid)
+    elements.append(dataset_table)
+    elements.append(Spacer(1, 20))
+
+    # ===================== PER-PARAMETER TABLES =====================
+    for label in PARAMETER_LABELS:
+        key = label.lower()
+        elements.append(Paragraph(f"<b>{label}</b>", styles["Heading2"]))
+        elements.append(Spacer(1, 8))
+
+        param_data = [["Dataset", "Average", "Minimum", "Maximum", "Std Dev",
+                       "P50", "P99", "Avg Change"]]
+        for d in datasets:
+            s = d["statistics"][key]
+            change = deltas[d["id"]]["statistics"][key]["avg"] if d["id"] in deltas else None
+            param_data.append([
+                d["name"], _fmt(s["avg"]), _fmt(s["min"]), _fmt(s["max"]),
+                _fmt(s["std"]), _fmt(s.get("p50")), _fmt(s.get("p99")),
+                "-" if change is None else f"{change:+.2f}",
+            ])
+        param_table = Table(param_data, repeatRows=1)
+        param_table.setStyle(grid)
+        elements.append(param_table)
+        elements.append(Spacer(1, 16))
+
+    # ===================== AVERAGE CHART =====================
+    if charts == "vector":
+        elements.append(_vector_comparison_chart(datasets))
+    else:
+        chart = _generate_comparison_chart(datasets)
+        elements.append(Image(chart, width=4*inch, height=3*inch))
+    elements.append(Spacer(1, 20))
+
+    # ===================== COMBINED =====================
+    combined = comparison["combined"]
+    elements.append(Paragraph("<b>All Datasets Combined</b>", styles["Heading2"]))
+    elements.append(Spacer(1, 8))
+
+    combined_data = [["Parameter", "Average", "Minimum", "Maximum", "Std Dev",
+                      "P50", "P90", "P99"]]
+    for label in PARAMETER_LABELS:
+        s = combined["statistics"][label.lower()]
+        combined_data.append([
+            label, _fmt(s["avg"]), _fmt(s["min"]), _fmt(s["max"]),
+            _fmt(s["std"]), _fmt(s["p50"]), _fmt(s["p90"]), _fmt(s["p99"]),
+        ])
+    combined_data.append(["Records", combined["total_count"]])
+    combined_table = Table(combined_data)
+    combined_table.setStyle(grid)
+    elements.append(combined_table)
+
+    # ===================== BUILD PDF =====================
+    doc.build(elements)
@@ -0,0 +1,16 @@
+"""
+Entry points for the report process pool.
+
+Pool processes are spawned and unpickle these functions before Django is
+configured, so this module must not import models at import time.
+"""
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def run_job(job_id):
+    from .jobs import run_report_job
+    run_report_job(job_id)
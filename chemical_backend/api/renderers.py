@@ -0,0 +1,34 @@
+"""
+Compact response encodings negotiated through the ``Accept`` header.
+
+Views that return large payloads (summaries, row pages) list
+``DATA_RENDERERS``: JSON stays the default, and clients that send
+``Accept: application/msgpack`` get MessagePack instead, which is smaller
+and much cheaper to decode. MessagePack needs the optional ``msgpack``
+package; without it only the JSON renderers are offered.
+"""
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Dates and decimals are sent as strings, matching the JSON output.
+        return msgpack.packb(data, use_bin_type=True, default=str)
+
+
+DATA_RENDERERS = list(api_settings.DEFAULT_RENDERER_CLASSES)
+if msgpack is not None:
+    DATA_RENDERERS.append(MessagePackRenderer)
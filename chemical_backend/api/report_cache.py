@@ -0,0 +1,109 @@
+"""
+On-disk cache of rendered PDF reports.
+
+A dataset's summary never changes after upload, so a rendered report can be
+reused until the dataset is deleted. Entries are keyed by dataset id, a hash
+of the summary, the chart backend and ``REPORT_TEMPLATE_VERSION``; the key doubles as the
+report's ETag. The cache is bounded by ``REPORT_CACHE_MAX_BYTES`` and evicts
+the least recently used files first (file mtime is bumped on every hit).
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from django.conf import settings
+
+
+def _cache_dir():
+    path = getattr(settings, "REPORT_CACHE_DIR", None)
+    if path is None:
+        path = os.path.join(settings.BASE_DIR, "report_cache")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def report_key(dataset_id, summary, charts):
+    """Return the cache key (and ETag) for a dataset's report."""
+    from .pdf_utils import REPORT_TEMPLATE_VERSION
+
+    digest = hashlib.sha256(
+        json.dumps(summary, sort_keys=True).encode()
+    ).hexdigest()[:16]
+    return f"{dataset_id}-{digest}-{charts}-v{REPORT_TEMPLATE_VERSION}"
+
+
+def _path(key):
+    return os.path.join(_cache_dir(), f"{key}.pdf")
+
+
+def get(key):
+    """Return the cached PDF bytes for ``key``, or None on a miss."""
+    path = _path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    os.utime(path)
+    return data
+
+
+def open_file(key):
+    """
+    Return the cached PDF for ``key`` opened for binary reading, or None on
+    a miss. The open file stays readable even if the entry is evicted.
+    """
+    path = _path(key)
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    os.utime(path)
+    return f
+
+
+def put(key, data):
+    """Store a rendered PDF and evict old entries beyond the size budget."""
+    directory = _cache_dir()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, _path(key))
+    _evict(directory, keep=key)
+
+
+def _evict(directory, keep=None):
+    max_bytes = getattr(settings, "REPORT_CACHE_MAX_BYTES", 100 * 1024 * 1024)
+
+    entries = []
+    total = 0
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".pdf"):
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+        total += stat.st_size
+
+    for _, size, path, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == f"{keep}.pdf":
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def invalidate(*dataset_ids):
+    """Remove every cached report of the given datasets."""
+    directory = _cache_dir()
+    prefixes = tuple(f"{dataset_id}-" for dataset_id in dataset_ids)
+    for entry in os.scandir(directory):
+        if entry.name.startswith(prefixes) and entry.name.endswith(".pdf"):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,117 @@
+"""
+Server-side cache and HTTP validators for the summary and history responses.
+
+Entries live in Django's ``default`` cache (file-based, so every worker
+process shares them) and hold the payload together with a strong ETag and a
+Last-Modified time computed once when the entry is built. A hit costs no
+database query, and a request whose If-None-Match / If-Modified-Since
+matches gets a 304 without the payload being serialized at all.
+
+Summaries are keyed by dataset and dropped when the dataset is evicted or
+resummarized. A user's history key includes a generation stamp that is
+replaced on every upload or eviction, so a request that read the database
+before the change can only write to the old, no longer consulted key.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def _timeout():
+    return getattr(settings, "RESPONSE_CACHE_TIMEOUT", 60 * 60)
+
+
+def summary_key(dataset_id):
+    return f"api:summary:{dataset_id}"
+
+
+def _history_generation_key(user_id):
+    return f"api:history-gen:{user_id}"
+
+
+def history_key(user_id):
+    generation = cache.get(_history_generation_key(user_id), 0)
+    return f"api:history:{user_id}:{generation}"
+
+
+async def ahistory_key(user_id):
+    generation = await cache.aget(_history_generation_key(user_id), 0)
+    return f"api:history:{user_id}:{generation}"
+
+
+def make_entry(data, owner_id):
+    """Wrap ``data`` with its validators; ``owner_id`` guards access on hits."""
+    body = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return {
+        "data": data,
+        "owner_id": owner_id,
+        "etag": quote_etag(hashlib.sha256(body.encode()).hexdigest()[:32]),
+        "last_modified": int(time.time()),
+    }
+
+
+def get_or_build(key, build):
+    """
+    Return the entry cached under ``key``, or build and cache it.
+
+    ``build`` returns ``(data, owner_id)``, or None when there is nothing to
+    cache (e.g. the dataset does not exist); None is then returned.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        built = build()
+        if built is None:
+            return None
+        entry = make_entry(*built)
+        cache.set(key, entry, _timeout())
+    return entry
+
+
+async def aget_or_build(key, build):
+    """Async ``get_or_build``; ``build`` is a coroutine function."""
+    entry = await cache.aget(key)
+    if entry is None:
+        built = await build()
+        if built is None:
+            return None
+        entry = make_entry(*built)
+        await cache.aset(key, entry, _timeout())
+    return entry
+
+
+def _representation_etag(request, entry):
+    # JSON and MessagePack bodies differ, so each gets its own validator.
+    renderer = getattr(request, "accepted_renderer", None)
+    fmt = getattr(renderer, "format", "json")
+    if fmt == "json":
+        return entry["etag"]
+    return f'{entry["etag"][:-1]}-{fmt}"'
+
+
+def respond(request, entry):
+    """A 304 if the request's validators match ``entry``, else a full Response."""
+    etag = _representation_etag(request, entry)
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=entry["last_modified"],
+    )
+    response = not_modified or Response(entry["data"])
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    # Clients may store the response but must revalidate before reusing it.
+    response["Cache-Control"] = "private, no-cache"
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+def invalidate_history(user_id):
+    cache.set(_history_generation_key(user_id), time.time_ns(), None)
+
+
+def invalidate_summaries(*dataset_ids):
+    cache.delete_many([summary_key(dataset_id) for dataset_id in dataset_ids])
@@ -0,0 +1,222 @@
+"""
+Paginated, filterable row queries over stored datasets.
+
+Rows are scanned from the dataset's Parquet copy one row group at a time:
+only the filtered columns are read to evaluate the filters, the projected
+columns are materialized just for the rows on the page, and row groups
+whose min/max statistics cannot satisfy the numeric range filters are
+skipped without being read. Datasets without a Parquet copy are scanned from the CSV in
+chunks. Pages are addressed by an opaque cursor holding the position of
+the next row to examine, so a page never rescans earlier rows.
+"""
+import base64
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+from . import columnar
+from .parsers import ALL_COLUMNS, read_csv_chunks
+from .validators import NUMERIC_COLUMNS
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+_COLUMN_NAMES = {c.lower(): c for c in ALL_COLUMNS}
+
+
+class RowQuery:
+    """Parsed query parameters of a row request."""
+
+    def __init__(self, columns, types, ranges, limit, start):
+        self.columns = columns
+        self.types = types
+        self.ranges = ranges
+        self.limit = limit
+        self.start = start
+
+    @classmethod
+    def from_params(cls, params):
+        """Build a query from request parameters. Raises ``ValueError``."""
+        columns = ALL_COLUMNS
+        if params.get("columns"):
+            columns = []
+            for name in params["columns"].split(","):
+                col = _COLUMN_NAMES.get(name.strip().lower())
+                if col is None:
+                    raise ValueError(f"Unknown column: {name.strip()}")
+                if col not in columns:
+                    columns.append(col)
+
+        types = None
+        if params.get("type"):
+            types = {t.strip() for t in params["type"].split(",") if t.strip()}
+
+        ranges = {}
+        for col in NUMERIC_COLUMNS:
+            lo = _float_param(params, f"{col.lower()}_min")
+            hi = _float_param(params, f"{col.lower()}_max")
+            if lo is not None or hi is not None:
+                ranges[col] = (lo, hi)
+
+        limit = DEFAULT_LIMIT
+        if params.get("limit"):
+            try:
+                limit = int(params["limit"])
+            except ValueError:
+                raise ValueError("limit must be an integer")
+            if not 1 <= limit <= MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+
+        start = decode_cursor(params["cursor"]) if params.get("cursor") else 0
+        return cls(columns, types, ranges, limit, start)
+
+    @property
+    def filter_columns(self):
+        return (["Type"] if self.types else []) + list(self.ranges)
+
+
+def _float_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps({"pos": position}).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))["pos"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, int) or position < 0:
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def _row_group_may_match(metadata, ranges):
+    """Use Parquet min/max statistics to rule out a row group."""
+    if not ranges:
+        return True
+    for i in range(metadata.num_columns):
+        column = metadata.column(i)
+        name = column.path_in_schema
+        if name not in ranges or not column.is_stats_set:
+            continue
+        stats = column.statistics
+        if not stats.has_min_max:
+            continue
+        lo, hi = ranges[name]
+        if lo is not None and stats.max < lo:
+            return False
+        if hi is not None and stats.min > hi:
+            return False
+    return True
+
+
+def _records(df):
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")
+
+
+def _clean(records):
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, float) and math.isnan(value):
+                record[key] = None
+    return records
+
+
+def _columnar_segments(path, query):
+    """
+    Yield ``(offset, filter_frame, fetch)`` per Parquet row group.
+
+    Only the filter columns are converted to pandas; ``fetch`` reads the
+    projected columns and materializes just the selected rows.
+    """
+    parquet = columnar.open_parquet(path, read_dictionary=["Type"])
+    filter_columns = query.filter_columns
+    offset = 0
+    for i in range(parquet.num_row_groups):
+        metadata = parquet.metadata.row_group(i)
+        n = metadata.num_rows
+        if offset + n > query.start and _row_group_may_match(metadata, query.ranges):
+            if filter_columns:
+                frame = parquet.read_row_group(i, columns=filter_columns).to_pandas()
+            else:
+                frame = pd.DataFrame(index=pd.RangeIndex(n))
+
+            def fetch(indices, i=i):
+                table = parquet.read_row_group(i, columns=query.columns)
+                return _clean(table.take(indices).to_pylist())
+
+            yield offset, frame, fetch
+        offset += n
+
+
+def _csv_segments(csv_file, query):
+    offset = 0
+    with csv_file.open("rb") as f:
+        for df in read_csv_chunks(f, columns=ALL_COLUMNS):
+            n = len(df)
+            if offset + n > query.start:
+                def fetch(indices, df=df):
+                    return _records(df.iloc[indices][query.columns])
+
+                yield offset, df, fetch
+            offset += n
+
+
+def _matches(df, query):
+    mask = None
+
+    def both(a, b):
+        return b if a is None else a & b
+
+    if query.types:
+        mask = both(mask, df["Type"].astype(str).isin(query.types))
+    for col, (lo, hi) in query.ranges.items():
+        if lo is not None:
+            mask = both(mask, df[col] >= lo)
+        if hi is not None:
+            mask = both(mask, df[col] <= hi)
+    return mask
+
+
+def query_rows(csv_file, columnar_file, query):
+    """
+    Return ``(rows, next_cursor)`` for one page of a dataset.
+
+    ``columnar_file`` is the dataset's Parquet copy (may be empty), and
+    ``csv_file`` the original upload used as a fallback.
+    """
+    if columnar_file and columnar.enabled():
+        segments = _columnar_segments(columnar_file.path, query)
+    else:
+        segments = _csv_segments(csv_file, query)
+
+    rows = []
+    for offset, df, fetch in segments:
+        local_start = max(query.start - offset, 0)
+
+        mask = _matches(df, query)
+        if mask is not None:
+            hits = mask.to_numpy().nonzero()[0]
+        else:
+            hits = np.arange(len(df))
+        hits = hits[hits >= local_start][:query.limit - len(rows)]
+
+        if len(hits):
+            rows.extend(fetch(hits))
+
+        if len(rows) >= query.limit:
+            return rows, encode_cursor(offset + int(hits[-1]) + 1)
+
+    return rows, None
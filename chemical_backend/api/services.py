@@ -1,39 +1,389 @@
-import pandas as pd
-from .validators import validate_columns, validate_numeric
-
-def analyze_csv(file_obj):
-    df = pd.read_csv(file_obj)
-
-    validate_columns(df)
-    validate_numeric(df)
-
-    total_count = len(df)
-
-    stats = {
-        "flowrate": {
-            "avg": float(df["Flowrate"].mean()),
-            "min": float(df["Flowrate"].min()),
-            "max": float(df["Flowrate"].max()),
-            "std": float(df["Flowrate"].std()),
-        },
-        "pressure": {
-            "avg": float(df["Pressure"].mean()),
-            "min": float(df["Pressure"].min()),
-            "max": float(df["Pressure"].max()),
-            "std": float(df["Pressure"].std()),
-        },
-        "temperature": {
-            "avg": float(df["Temperature"].mean()),
-            "min": float(df["Temperature"].min()),
-            "max": float(df["Temperature"].max()),
-            "std": float(df["Temperature"].std()),
-        },
-    }
-
-    type_distribution = df["Type"].value_counts().to_dict()
-
-    return {
-        "total_count": total_count,
-        "statistics": stats,
-        "type_distribution": type_distribution,
-    }
+import hashlib
+import os
+from collections import Counter
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, When
+
+from . import report_cache, response_cache
+from .models import Dataset, DatasetBlob, DatasetSummary, ReportJob
+
+HISTORY_LIMIT = 5
+
+# pandas/numpy/pyarrow (analysis) and reportlab/matplotlib (pdf_utils) are
+# imported inside the functions that need them, so workers and management
+# commands that never analyze a CSV or build a report don't pay for them.
+
+def analyze_upload(file_obj):
+    """
+    Analyze an upload and, when columnar storage is enabled, convert it to
+    Parquet in the same pass.
+
+    Returns ``(summary, aggregates, parquet_path or None)``, where
+    ``aggregates`` is the mergeable state stored in ``aggregates_json``.
+    """
+    from . import columnar
+    from .analysis import accumulate_csv
+
+    if not columnar.enabled():
+        acc = require_rows(accumulate_csv(file_obj))
+        return acc.result(), acc.to_state(), None
+
+    sink = columnar.ParquetSink()
+    try:
+        acc = require_rows(accumulate_csv(file_obj, sink=sink))
+    except Exception:
+        sink.discard()
+        raise
+    return acc.result(), acc.to_state(), sink.close()
+
+
+def require_rows(acc):
+    """Reject a CSV with a header but no data rows; it has nothing to report."""
+    if not acc.total_count:
+        raise ValueError("CSV file has no data rows")
+    return acc
+
+
+def analyze_blob(blob):
+    """
+    Re-analyze a stored dataset from its columnar copy (or CSV).
+    Returns ``(summary, aggregates)``.
+    """
+    from . import columnar
+    from .analysis import accumulate_frames
+    from .parsers import ANALYSIS_COLUMNS
+
+    acc = accumulate_frames(columnar.iter_frames(blob, columns=ANALYSIS_COLUMNS))
+    return acc.result(), acc.to_state()
+
+
+def load_aggregates(dataset):
+    """
+    Return a ``SummaryAccumulator`` for a dataset, restored from its blob's
+    stored aggregates.
+
+    Blobs stored before aggregates existed are analyzed once here and the
+    result is saved, so later comparisons never read the file again.
+    """
+    from .analysis import AGGREGATES_VERSION, SummaryAccumulator
+
+    blob = dataset.blob
+    if blob is None:
+        raise ValueError(f"Dataset {dataset.id} has no stored data to compare")
+
+    state = blob.aggregates_json
+    if not state or state.get("version") != AGGREGATES_VERSION:
+        _, state = analyze_blob(blob)
+        blob.aggregates_json = state
+        blob.save(update_fields=["aggregates_json"])
+    return SummaryAccumulator.from_state(state)
+
+
+def _remove_temp(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def hash_upload(file_obj):
+    """Return the SHA-256 hex digest of an upload, streaming it in chunks."""
+    digest = hashlib.sha256()
+    if hasattr(file_obj, "chunks"):
+        for chunk in file_obj.chunks():
+            digest.update(chunk)
+    else:
+        for chunk in iter(lambda: file_obj.read(64 * 1024), b""):
+            digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def stage_blob(file_obj, digest, analysis):
+    """
+    Write a new upload's CSV and Parquet copy to storage and return its
+    unsaved ``DatasetBlob``, for ``acquire_blob`` to insert.
+
+    ``analysis`` is the result of ``analyze_upload``. Files are written
+    before any transaction starts, so no lock is held while they are.
+    """
+    summary, aggregates, parquet_path = analysis
+    blob = DatasetBlob(sha256=digest, summary_json=summary, aggregates_json=aggregates)
+    try:
+        blob.file.save(file_obj.name, file_obj, save=False)
+        if parquet_path:
+            with open(parquet_path, "rb") as f:
+                blob.columnar.save(f"{digest}.parquet", File(f), save=False)
+    except Exception:
+        discard_staged_blob(blob)
+        raise
+    finally:
+        _remove_temp(parquet_path)
+    return blob
+
+
+def discard_staged_blob(blob):
+    """Delete the files of a staged blob that was never inserted."""
+    _delete_files([name for name in (blob.file.name, blob.columnar.name) if name])
+
+
+def _locked_blob(digest):
+    return (
+        DatasetBlob.objects
+        .select_for_update()
+        .filter(sha256=digest)
+        .defer("aggregates_json")
+        .first()
+    )
+
+
+def acquire_blob(digest, staged=None):
+    """
+    Take a reference on the blob stored for ``digest`` and return it.
+
+    Must run inside the transaction that records the dataset using it, so a
+    failure there also drops the reference. The row is locked first, so a
+    concurrent ``release_blobs`` cannot delete it in between. If nothing is
+    stored yet, the ``staged`` blob (see ``stage_blob``) is inserted with
+    one reference; without one, None is returned.
+    """
+    blob = _locked_blob(digest)
+    if blob is None and staged is not None:
+        staged.ref_count = 1
+        try:
+            with transaction.atomic():
+                staged.save(force_insert=True)
+            return staged
+        except IntegrityError:
+            # A concurrent upload of the same bytes stored it first; any
+            # other constraint failure is a real error.
+            blob = _locked_blob(digest)
+            if blob is None:
+                raise
+
+    if blob is not None:
+        DatasetBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1)
+    return blob
+
+
+def store_upload(user, name, file_obj, digest=None, analysis=None, claim=None):
+    """
+    Store an upload, deduplicated by content hash, as ``user``'s newest
+    dataset named ``name``, and return the dataset.
+
+    Bytes stored before are reused without analyzing them again; new ones
+    are analyzed (unless ``analysis`` from ``analyze_upload`` is given) and
+    staged first. The blob reference and the dataset rows are then created
+    in one transaction. ``claim``, if given, runs first in that transaction;
+    when it returns False nothing is stored and None is returned.
+    """
+    if digest is None:
+        digest = hash_upload(file_obj)
+    staged = dataset = None
+    try:
+        if not DatasetBlob.objects.filter(sha256=digest).exists():
+            staged = _stage(file_obj, digest, analysis)
+            analysis = None
+
+        while dataset is None:
+            created = None
+            with transaction.atomic():
+                if claim is not None and not claim():
+                    return None
+                blob = acquire_blob(digest, staged)
+                if blob is None:
+                    # Released since the check above: roll back (the claim
+                    # too) and store this copy instead.
+                    transaction.set_rollback(True)
+                else:
+                    created = create_dataset(user, name, blob)
+            # Only set once committed, so a failed commit discards the files.
+            dataset = created
+            if dataset is None:
+                if staged is not None:
+                    discard_staged_blob(staged)
+                    staged = None
+                staged = _stage(file_obj, digest, analysis)
+                analysis = None
+        return dataset
+    finally:
+        if analysis:
+            _remove_temp(analysis[-1])
+        if staged is not None and (dataset is None or dataset.blob is not staged):
+            discard_staged_blob(staged)
+
+
+def _stage(file_obj, digest, analysis=None):
+    """``stage_blob``, analyzing the upload from its start unless ``analysis`` is given."""
+    if analysis is None:
+        file_obj.seek(0)
+        analysis = analyze_upload(file_obj)
+    file_obj.seek(0)
+    return stage_blob(file_obj, digest, analysis)
+
+
+def release_blob(blob_id):
+    """Drop one reference to a blob, deleting it once nothing refers to it."""
+    release_blobs({blob_id: 1})
+
+
+def release_blobs(counts):
+    """
+    Drop ``counts[blob_id]`` references from each blob in one UPDATE and
+    delete the ones left unreferenced. Their files are removed once the
+    surrounding transaction commits.
+    """
+    if not counts:
+        return
+    DatasetBlob.objects.filter(pk__in=counts).update(ref_count=Case(
+        *(When(pk=pk, then=F("ref_count") - n) for pk, n in counts.items())
+    ))
+
+    orphans = list(
+        DatasetBlob.objects
+        .filter(pk__in=counts, ref_count=0)
+        .values_list("pk", "file", "columnar")
+    )
+    if orphans:
+        DatasetBlob.objects.filter(pk__in=[pk for pk, _, _ in orphans]).delete()
+        names = [name for _, *files in orphans for name in files if name]
+        transaction.on_commit(lambda: _delete_files(names))
+
+
+def _delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+def create_dataset(user, name, blob):
+    """
+    Record ``blob`` as the user's newest dataset, named ``name``, and evict
+    datasets beyond the history limit, in one transaction.
+    """
+    with transaction.atomic():
+        dataset = Dataset.objects.create(
+            user=user,
+            name=name,
+            file=blob.file.name,
+            blob=blob,
+        )
+        DatasetSummary.objects.create(dataset=dataset, summary_json=blob.summary_json)
+        trim_history(user)
+        transaction.on_commit(lambda: response_cache.invalidate_history(user.id))
+    return dataset
+
+
+def trim_history(user, limit=HISTORY_LIMIT):
+    """
+    Evict a user's datasets beyond the ``limit`` most recent ones.
+
+    The stale rows are found with one query on the (user, created_at)
+    index and removed with bulk statements in a single transaction.
+    """
+    with transaction.atomic():
+        stale = list(
+            Dataset.objects
+            .filter(user=user)
+            .order_by("-created_at", "-id")
+            .values_list("id", "blob_id")[limit:]
+        )
+        if stale:
+            evict_datasets(stale)
+            transaction.on_commit(lambda: response_cache.invalidate_history(user.id))
+
+
+def evict_datasets(rows):
+    """
+    Delete datasets, given as ``(id, blob_id)`` pairs, with their report
+    jobs, cached reports and blob references.
+
+    Meant to run inside a transaction: rows go in bulk statements, while
+    report files and cache entries are removed only after it commits.
+    """
+    ids = [pk for pk, _ in rows]
+    job_files = list(
+        ReportJob.objects
+        .filter(dataset_id__in=ids)
+        .exclude(file="")
+        .values_list("file", flat=True)
+    )
+    # only(): the delete collector need not load the summary payloads.
+    Dataset.objects.filter(id__in=ids).only("id").delete()
+    release_blobs(Counter(blob_id for _, blob_id in rows if blob_id))
+
+    def cleanup():
+        _delete_files(job_files)
+        report_cache.invalidate(*ids)
+        response_cache.invalidate_summaries(*ids)
+
+    transaction.on_commit(cleanup)
+
+
+def resolve_chart_backend(charts=None):
+    """Return the chart backend to use, defaulting to REPORT_CHART_BACKEND."""
+    from .pdf_utils import CHART_BACKENDS
+
+    charts = charts or getattr(settings, "REPORT_CHART_BACKEND", "matplotlib")
+    if charts not in CHART_BACKENDS:
+        raise ValueError(
+            f"charts must be one of: {', '.join(CHART_BACKENDS)}"
+        )
+    return charts
+
+
+def render_report(dataset, charts=None):
+    """Return the PDF report for a dataset, served from the report cache if possible."""
+    charts = resolve_chart_backend(charts)
+    key = report_cache.report_key(dataset.id, dataset.summary.summary_json, charts)
+    pdf_data = report_cache.get(key)
+    if pdf_data is None:
+        pdf_data = _build_report(dataset, charts)
+        report_cache.put(key, pdf_data)
+    return pdf_data
+
+
+def open_report(dataset, charts=None):
+    """
+    Return a dataset's PDF report as an open binary file, building and
+    caching it first on a miss, so it can be streamed from disk.
+    """
+    charts = resolve_chart_backend(charts)
+    key = report_cache.report_key(dataset.id, dataset.summary.summary_json, charts)
+    report = report_cache.open_file(key)
+    if report is None:
+        pdf_data = _build_report(dataset, charts)
+        report_cache.put(key, pdf_data)
+        # Evicted by a concurrent writer already: serve the bytes at hand.
+        report = report_cache.open_file(key) or BytesIO(pdf_data)
+    return report
+
+
+def _build_report(dataset, charts):
+    """Build the PDF report for a dataset in memory and return its bytes."""
+    from .pdf_utils import build_pdf_report
+
+    buf = BytesIO()
+    build_pdf_report(
+        output=buf,
+        summary=dataset.summary.summary_json,
+        user=dataset.user,
+        charts=charts,
+    )
+    return buf.getvalue()
+
+
+def render_comparison_report(comparison, user, charts=None):
+    """Build the PDF for a ``compare_datasets`` result and return its bytes."""
+    from .pdf_utils import build_comparison_report
+
+    buf = BytesIO()
+    build_comparison_report(
+        output=buf,
+        comparison=comparison,
+        user=user,
+        charts=resolve_chart_backend(charts),
+    )
+    return buf.getvalue()
@@ -1,3 +1,1348 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from . import pdf_utils, report_cache, services
+from .analysis import (
+    RunningStats,
+    SummaryAccumulator,
+    accumulate_csv,
+    summarize_block,
+    summarize_groups,
+)
+from .compare import _stat_deltas, parse_ids
+from .jobs import recover_stale_jobs, run_report_job
+from .models import Dataset, DatasetBlob, DatasetSummary, ReportJob
+from .pdf_utils import build_pdf_report
+from .parsers import ALL_COLUMNS, ANALYSIS_COLUMNS, read_csv_chunks
+from .renderers import msgpack
+from .rows import RowQuery, decode_cursor, encode_cursor
+from .services import HISTORY_LIMIT, analyze_blob, trim_history
+from .sketches import BinnedHistogram, ColumnSketches, KLLSketch
+from .validators import NUMERIC_COLUMNS
+from .views import DatasetHistoryView, DatasetReportView, DatasetSummaryView
+
+try:
+    from . import async_views
+except ImportError:  # adrf is optional
+    async_views = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional
+    pq = None
+
+HEADER = b"Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+CSV = (
+    HEADER
+    + b"Pump-1,Pump,120,5.2,110\n"
+    + b"Valve-1,Valve,60,4.1,105\n"
+)
+
+
+def make_csv(rows, seed=0, missing=0.0):
+    """A CSV of ``rows`` random rows; ``missing`` is the share of empty cells."""
+    rng = random.Random(seed)
+    lines = [HEADER]
+    for i in range(rows):
+        values = [
+            "" if rng.random() < missing else f"{rng.uniform(lo, hi):.3f}"
+            for lo, hi in ((50, 200), (1, 10), (80, 150))
+        ]
+        kind = rng.choice(["Pump", "Valve", "Compressor", "Reactor"])
+        lines.append(f"E-{i},{kind},{','.join(values)}\n".encode())
+    return b"".join(lines)
+
+
+class ApiTestCase(TestCase):
+    """Isolated media, report cache and response cache, and a logged-in client."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        media_override = override_settings(
+            MEDIA_ROOT=self.media,
+            REPORT_CACHE_DIR=f"{self.media}/report_cache",
+            COLUMNAR_STORAGE=False,
+            CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            }},
+        )
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        cache.clear()
+
+        self.user = User.objects.create_user("alice", password="secret")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_datasets(self, count, blob=None):
+        blob = blob or DatasetBlob.objects.create(
+            sha256="0" * 64, file="datasets/shared.csv", summary_json={},
+        )
+        for i in range(count):
+            dataset = Dataset.objects.create(
+                user=self.user, name=f"d{i}.csv", file=blob.file.name, blob=blob,
+            )
+            DatasetSummary.objects.create(dataset=dataset, summary_json={})
+        DatasetBlob.objects.filter(pk=blob.pk).update(ref_count=count)
+        return blob
+
+    def upload(self, name="r.csv", data=CSV):
+        return self.client.post(
+            "/api/upload/",
+            {"file": SimpleUploadedFile(name, data)},
+            format="multipart",
+        )
+
+
+class SqliteProfileTests(SimpleTestCase):
+    def open_database(self):
+        """A new connection to a file database, configured like the default one."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        default = connections["default"]
+        wrapper = type(default)(
+            {**default.settings_dict, "NAME": os.path.join(directory, "db.sqlite3")},
+            alias="profile_test",
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragmas(self, wrapper):
+        with wrapper.cursor() as cursor:
+            return {
+                name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store")
+            }
+
+    @override_settings(SQLITE_PERFORMANCE_PROFILE=True)
+    def test_new_connections_get_the_profile(self):
+        self.assertEqual(self.pragmas(self.open_database()), {
+            "journal_mode": "wal",
+            "synchronous": 1,  # NORMAL
+            "busy_timeout": settings.SQLITE_PRAGMAS["busy_timeout"],
+            "temp_store": 2,  # MEMORY
+        })
+
+    @override_settings(SQLITE_PERFORMANCE_PROFILE=False)
+    def test_profile_can_be_turned_off(self):
+        self.assertEqual(self.pragmas(self.open_database())["journal_mode"], "delete")
+
+
+class HistoryQueryTests(ApiTestCase):
+    def test_history_is_one_query(self):
+        self.make_datasets(HISTORY_LIMIT)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/history/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), HISTORY_LIMIT)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("summary_json", ctx.captured_queries[0]["sql"])
+
+    def test_trim_history_without_stale_rows_is_one_select(self):
+        self.make_datasets(HISTORY_LIMIT)
+
+        # SAVEPOINT + SELECT + RELEASE SAVEPOINT
+        with self.assertNumQueries(3):
+            trim_history(self.user)
+
+    def test_trim_history_deletes_in_bulk(self):
+        blob = self.make_datasets(HISTORY_LIMIT + 3)
+        newest = list(
+            Dataset.objects.order_by("-created_at", "-id")
+            .values_list("id", flat=True)[:HISTORY_LIMIT]
+        )
+
+        # The query count does not depend on how many rows are evicted:
+        # savepoint, select stale, report job files, dataset delete (select
+        # ids + delete report jobs + delete summaries + delete datasets),
+        # blob ref update, orphan check, release savepoint.
+        with self.assertNumQueries(10):
+            trim_history(self.user)
+
+        self.assertCountEqual(
+            Dataset.objects.values_list("id", flat=True), newest,
+        )
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, HISTORY_LIMIT)
+
+    def test_upload_keeps_last_five(self):
+        self.make_datasets(HISTORY_LIMIT)
+        oldest = Dataset.objects.order_by("created_at", "id").first()
+
+        response = self.upload("new.csv")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Dataset.objects.count(), HISTORY_LIMIT)
+        self.assertFalse(Dataset.objects.filter(pk=oldest.pk).exists())
+        self.assertTrue(Dataset.objects.filter(pk=response.json()["id"]).exists())
+
+
+class DeduplicationTests(ApiTestCase):
+    def stored_files(self):
+        directory = os.path.join(self.media, "datasets")
+        return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload("a.csv").json()
+        second = self.upload("b.csv").json()
+
+        blob = DatasetBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(second["summary"], first["summary"])
+        self.assertEqual(
+            set(Dataset.objects.values_list("file", flat=True)), {blob.file.name},
+        )
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_evicting_the_last_reference_deletes_the_blob(self):
+        self.upload("a.csv")
+        self.upload("b.csv")
+        shared = DatasetBlob.objects.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for seed in range(HISTORY_LIMIT - 1):
+                self.upload(f"other-{seed}.csv", make_csv(3, seed=seed))
+        shared.refresh_from_db()
+        self.assertEqual(shared.ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload("last.csv", make_csv(3, seed=99))
+        self.assertFalse(DatasetBlob.objects.filter(pk=shared.pk).exists())
+        self.assertNotIn(os.path.basename(shared.file.name), self.stored_files())
+        self.assertEqual(len(self.stored_files()), HISTORY_LIMIT)
+
+    def test_failed_dataset_insert_takes_no_reference(self):
+        self.upload("a.csv")
+        failing = mock.patch.object(
+            DatasetSummary.objects, "create", side_effect=RuntimeError("disk full"),
+        )
+
+        with failing:
+            self.assertEqual(self.upload("again.csv").status_code, 400)
+            self.assertEqual(self.upload("new.csv", make_csv(3)).status_code, 400)
+
+        self.assertEqual(DatasetBlob.objects.get().ref_count, 1)
+        self.assertEqual(Dataset.objects.count(), 1)
+        # The new content's staged file was removed with the failed insert.
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_integrity_error_without_a_stored_blob_is_reported(self):
+        failing = mock.patch.object(
+            DatasetBlob, "save", side_effect=IntegrityError("CHECK constraint failed"),
+        )
+        with failing:
+            response = self.upload("a.csv")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("CHECK constraint failed", response.json()["error"])
+        self.assertFalse(DatasetBlob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_blob_released_before_acquiring_is_staged_again(self):
+        real_acquire = services.acquire_blob
+        calls = []
+
+        def released_once(digest, staged=None):
+            calls.append(staged)
+            if len(calls) == 1:
+                return None
+            return real_acquire(digest, staged)
+
+        with mock.patch("api.services.acquire_blob", side_effect=released_once):
+            response = self.upload("a.csv", make_csv(20))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["summary"]["total_count"], 20)
+        self.assertEqual(len(calls), 2)
+        self.assertIsNot(calls[0], calls[1])
+        # The first staged copy was discarded; only the stored one is left.
+        self.assertEqual(self.stored_files(), [os.path.basename(DatasetBlob.objects.get().file.name)])
+
+
+@override_settings(REPORT_JOB_BACKEND="worker", REPORT_JOB_TIMEOUT=60)
+class ReportJobTests(ApiTestCase):
+    def create_job(self):
+        dataset_id = self.upload().json()["id"]
+        response = self.client.post(f"/api/report/{dataset_id}/jobs/?charts=vector")
+        self.assertEqual(response.status_code, 202)
+        return ReportJob.objects.get(id=response.json()["job_id"])
+
+    def lose_job(self, job, attempts=1):
+        """Leave ``job`` running as if its process had died long ago."""
+        ReportJob.objects.filter(id=job.id).update(
+            status=ReportJob.RUNNING, attempts=attempts,
+            started_at=timezone.now() - timedelta(minutes=5),
+        )
+
+    def test_worker_runs_a_pending_job(self):
+        job = self.create_job()
+        run_report_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.DONE)
+        self.assertEqual(job.attempts, 1)
+        download = self.client.get(f"/api/report/jobs/{job.id}/download/")
+        self.assertTrue(b"".join(download.streaming_content).startswith(b"%PDF"))
+
+    def test_stale_running_job_is_requeued_then_failed(self):
+        job = self.create_job()
+        self.lose_job(job)
+        # A job that is running but not yet overdue is left alone.
+        ReportJob.objects.create(
+            user=self.user, dataset=job.dataset,
+            status=ReportJob.RUNNING, attempts=1, started_at=timezone.now(),
+        )
+
+        self.assertEqual(recover_stale_jobs(), [job.id])
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.PENDING)
+        self.assertEqual(ReportJob.objects.filter(status=ReportJob.RUNNING).count(), 1)
+
+        self.lose_job(job, attempts=2)
+        status = self.client.get(f"/api/report/jobs/{job.id}/").json()
+        self.assertEqual(status["status"], ReportJob.FAILED)
+        self.assertIn("timed out", status["error"])
+
+    def test_overdue_run_does_not_overwrite_the_retry(self):
+        job = self.create_job()
+
+        def overrun(dataset, charts=None):
+            # Meanwhile the job timed out and a retry claimed it.
+            ReportJob.objects.filter(id=job.id).update(attempts=F("attempts") + 1)
+            return b"%PDF-late"
+
+        with mock.patch("api.jobs.render_report", side_effect=overrun):
+            run_report_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.file.name), (ReportJob.RUNNING, 2, ""))
+        self.assertFalse(os.listdir(os.path.join(self.media, "reports")))
+
+
+@unittest.skipIf(pq is None, "pyarrow is not installed")
+class ColumnarStorageTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        columnar = override_settings(COLUMNAR_STORAGE=True, COLUMNAR_ROW_GROUP_ROWS=64)
+        columnar.enable()
+        self.addCleanup(columnar.disable)
+        self.data = make_csv(300, missing=0.05)
+
+    def assertMatchesCsv(self, blob):
+        stored = pq.read_table(blob.columnar.path).to_pandas()
+        expected = pd.read_csv(io.BytesIO(self.data))
+        pd.testing.assert_frame_equal(stored, expected, check_dtype=False)
+        self.assertGreater(pq.ParquetFile(blob.columnar.path).num_row_groups, 1)
+
+    def test_upload_keeps_a_parquet_copy(self):
+        self.upload(data=self.data)
+        blob = DatasetBlob.objects.get()
+        self.assertMatchesCsv(blob)
+
+        # Re-analysis reads the Parquet copy and never parses the CSV.
+        with mock.patch("api.columnar.read_csv_chunks", side_effect=AssertionError):
+            summary, _ = analyze_blob(blob)
+        expected = blob.summary_json
+        self.assertEqual(summary["type_distribution"], expected["type_distribution"])
+        self.assertEqual(summary["histograms"], expected["histograms"])
+        for column, stats in expected["statistics"].items():
+            for field, value in stats.items():
+                self.assertAlmostEqual(summary["statistics"][column][field], value, places=9)
+
+    def test_build_columnar_converts_older_uploads(self):
+        with override_settings(COLUMNAR_STORAGE=False):
+            self.upload(data=self.data)
+        self.assertFalse(DatasetBlob.objects.get().columnar)
+
+        call_command("build_columnar", stdout=io.StringIO())
+        self.assertMatchesCsv(DatasetBlob.objects.get())
+
+    def test_evicted_blob_removes_its_parquet_copy(self):
+        self.upload(data=self.data)
+        path = DatasetBlob.objects.get().columnar.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(HISTORY_LIMIT):
+                self.upload(f"r{i}.csv", make_csv(5, seed=i + 1))
+
+        self.assertFalse(os.path.exists(path))
+
+
+class RowQueryTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = make_csv(400, seed=3, missing=0.05)
+        self.frame = pd.read_csv(io.BytesIO(self.data))
+
+    def store(self, columnar):
+        with override_settings(COLUMNAR_STORAGE=columnar, COLUMNAR_ROW_GROUP_ROWS=50):
+            response = self.upload(data=self.data)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["id"]
+
+    def walk(self, dataset_id, params):
+        """Follow the cursor to the end and return all rows."""
+        rows, params = [], dict(params, limit=37)
+        while True:
+            page = self.client.get(f"/api/datasets/{dataset_id}/rows/", params).json()
+            rows.extend(page["rows"])
+            if page["next_cursor"] is None:
+                return rows
+            params["cursor"] = page["next_cursor"]
+
+    def assert_walk_matches_pandas(self, columnar):
+        dataset_id = self.store(columnar)
+        with override_settings(COLUMNAR_STORAGE=columnar):
+            rows = self.walk(dataset_id, {
+                "columns": "equipment name,flowrate",
+                "type": "Pump,Reactor",
+                "flowrate_min": "80",
+                "pressure_max": "6.5",
+            })
+
+        df = self.frame
+        expected = df[
+            df["Type"].isin(["Pump", "Reactor"])
+            & (df["Flowrate"] >= 80)
+            & (df["Pressure"] <= 6.5)
+        ]
+        self.assertTrue(rows)
+        self.assertEqual({tuple(r) for r in rows}, {("Equipment Name", "Flowrate")})
+        self.assertEqual([r["Equipment Name"] for r in rows], list(expected["Equipment Name"]))
+        for row, value in zip(rows, expected["Flowrate"]):
+            self.assertAlmostEqual(row["Flowrate"], value)
+
+    @unittest.skipIf(pq is None, "pyarrow is not installed")
+    def test_parquet_cursor_walk_matches_pandas(self):
+        self.assert_walk_matches_pandas(columnar=True)
+
+    def test_csv_cursor_walk_matches_pandas(self):
+        self.assert_walk_matches_pandas(columnar=False)
+
+    def test_missing_values_come_back_as_null(self):
+        dataset_id = self.store(columnar=False)
+        rows = self.walk(dataset_id, {})
+
+        self.assertEqual(len(rows), len(self.frame))
+        self.assertEqual(
+            sum(r["Temperature"] is None for r in rows),
+            int(self.frame["Temperature"].isna().sum()),
+        )
+
+    @unittest.skipIf(pq is None, "pyarrow is not installed")
+    def test_range_filter_skips_row_groups_by_statistics(self):
+        lines = [HEADER] + [f"E-{i},Pump,{i},5,100\n".encode() for i in range(400)]
+        self.data = b"".join(lines)
+        dataset_id = self.store(columnar=True)
+
+        read = pq.ParquetFile.read_row_group
+        with override_settings(COLUMNAR_STORAGE=True), \
+                mock.patch.object(pq.ParquetFile, "read_row_group", autospec=True,
+                                  side_effect=read) as spy:
+            rows = self.walk(dataset_id, {"flowrate_min": "360", "columns": "flowrate"})
+
+        self.assertEqual([r["Flowrate"] for r in rows], list(range(360, 400)))
+        groups = {call.args[1] for call in spy.call_args_list}
+        self.assertEqual(groups, {7})
+
+    def test_cursor_round_trip_and_tampering(self):
+        self.assertEqual(decode_cursor(encode_cursor(1234)), 1234)
+        for cursor in ("not-base64!", encode_cursor(-1), encode_cursor("5"),
+                       base64.urlsafe_b64encode(b'{"page": 2}').decode()):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+        dataset_id = self.store(columnar=False)
+        response = self.client.get(f"/api/datasets/{dataset_id}/rows/", {"cursor": "x" * 8})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({"columns": "Flowrate,Color"}, {"limit": "0"},
+                       {"limit": "ten"}, {"pressure_min": "high"}):
+            with self.assertRaises(ValueError):
+                RowQuery.from_params(params)
+
+        query = RowQuery.from_params({"columns": "type, TYPE ,flowrate", "type": "Pump,"})
+        self.assertEqual(query.columns, ["Type", "Flowrate"])
+        self.assertEqual(query.types, {"Pump"})
+
+    def test_missing_file_is_gone(self):
+        dataset_id = self.store(columnar=False)
+        os.remove(DatasetBlob.objects.get().file.path)
+
+        response = self.client.get(f"/api/datasets/{dataset_id}/rows/")
+        self.assertEqual(response.status_code, 410)
+
+    @unittest.skipIf(pq is None, "pyarrow is not installed")
+    def test_missing_parquet_file_is_gone(self):
+        dataset_id = self.store(columnar=True)
+        os.remove(DatasetBlob.objects.get().columnar.path)
+
+        with override_settings(COLUMNAR_STORAGE=True):
+            response = self.client.get(f"/api/datasets/{dataset_id}/rows/")
+        self.assertEqual(response.status_code, 410)
+
+
+class CompareTests(ApiTestCase):
+    def test_parse_ids(self):
+        self.assertEqual(parse_ids("4, 2,4,,7"), [4, 2, 7])
+        too_many = ",".join(str(i) for i in range(HISTORY_LIMIT + 1))
+        for raw in (None, "", "3", "3,3", too_many, "1,two"):
+            with self.assertRaises(ValueError):
+                parse_ids(raw)
+
+    def test_deltas_and_combined_summary(self):
+        second = make_csv(50, seed=1)
+        first_id = self.upload("a.csv", CSV).json()["id"]
+        second_id = self.upload("b.csv", second).json()["id"]
+
+        response = self.client.get("/api/compare/", {"ids": f"{second_id},{first_id}"})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["baseline_id"], second_id)
+        self.assertEqual([d["id"] for d in data["datasets"]], [second_id, first_id])
+        base, other = data["datasets"]
+        (delta,) = data["deltas"]
+        self.assertEqual(delta["id"], first_id)
+        self.assertEqual(delta["total_count"], 2 - 50)
+        for param, fields in delta["statistics"].items():
+            for field in ("avg", "min", "max", "p50"):
+                self.assertAlmostEqual(
+                    fields[field],
+                    other["statistics"][param][field] - base["statistics"][param][field],
+                )
+
+        frame = pd.concat([pd.read_csv(io.BytesIO(CSV)), pd.read_csv(io.BytesIO(second))])
+        combined = data["combined"]
+        self.assertEqual(combined["total_count"], 52)
+        self.assertAlmostEqual(combined["statistics"]["flowrate"]["avg"], frame["Flowrate"].mean())
+        self.assertEqual(combined["statistics"]["pressure"]["max"], frame["Pressure"].max())
+
+    def test_missing_values_give_null_deltas(self):
+        empty_column = HEADER + b"Pump-1,Pump,120,5.2,\n"
+        first_id = self.upload("a.csv", CSV).json()["id"]
+        second_id = self.upload("b.csv", empty_column).json()["id"]
+
+        data = self.client.get("/api/compare/", {"ids": f"{first_id},{second_id}"}).json()
+
+        fields = data["deltas"][0]["statistics"]["temperature"]
+        self.assertEqual(set(fields.values()), {None})
+        self.assertEqual(data["deltas"][0]["statistics"]["flowrate"]["max"], 0)
+
+    def test_bad_and_foreign_ids_are_rejected(self):
+        own_id = self.upload().json()["id"]
+        bob = User.objects.create_user("bob", password="secret")
+        other = APIClient()
+        other.force_authenticate(bob)
+        foreign_id = other.post(
+            "/api/upload/", {"file": SimpleUploadedFile("b.csv", CSV)}, format="multipart",
+        ).json()["id"]
+
+        for ids, status in ((f"{own_id},{foreign_id}", 404), (f"{own_id},{own_id + 99}", 404),
+                            (f"{own_id},{own_id}", 400), ("x", 400)):
+            with self.subTest(ids=ids):
+                response = self.client.get("/api/compare/", {"ids": ids})
+                self.assertEqual(response.status_code, status)
+
+
+class SummaryStorageTests(ApiTestCase):
+    def test_summary_view_reads_only_the_summary_table(self):
+        self.make_datasets(1)
+        dataset = Dataset.objects.get()
+        DatasetSummary.objects.filter(dataset=dataset).update(summary_json={"total_count": 2})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"/api/summary/{dataset.id}/")
+
+        self.assertEqual(response.json(), {"total_count": 2})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('"api_dataset"."name"', ctx.captured_queries[0]["sql"])
+
+    def test_resummarize_rewrites_the_blob_and_dataset_summaries(self):
+        uploaded = self.upload().json()
+        self.upload("again.csv")
+        DatasetBlob.objects.update(summary_json={"stale": True})
+        DatasetSummary.objects.update(summary_json={"stale": True})
+        self.assertEqual(self.upload("third.csv").json()["summary"], {"stale": True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("resummarize", stdout=io.StringIO())
+
+        self.assertEqual(DatasetBlob.objects.get().summary_json, uploaded["summary"])
+        self.assertEqual(
+            list(DatasetSummary.objects.values_list("summary_json", flat=True)),
+            [uploaded["summary"]] * 3,
+        )
+        summary = self.client.get(f"/api/summary/{uploaded['id']}/")
+        self.assertEqual(summary.json(), uploaded["summary"])
+
+
+class ResponseCacheTests(ApiTestCase):
+    def test_history_is_cached_and_revalidated(self):
+        self.make_datasets(2)
+        first = self.client.get("/api/history/")
+        etag = first["ETag"]
+
+        with self.assertNumQueries(0):
+            again = self.client.get("/api/history/")
+            not_modified = self.client.get("/api/history/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload("new.csv")
+        changed = self.client.get("/api/history/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()[0]["name"], "new.csv")
+
+    def test_summary_is_private_to_its_owner(self):
+        self.make_datasets(1)
+        dataset = Dataset.objects.get()
+        self.assertEqual(self.client.get(f"/api/summary/{dataset.id}/").status_code, 200)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user("bob"))
+        self.assertEqual(other.get(f"/api/summary/{dataset.id}/").status_code, 404)
+
+
+class ResponseEncodingTests(ApiTestCase):
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_summary_negotiates_msgpack_and_compression(self):
+        self.make_datasets(1)
+        dataset = Dataset.objects.get()
+        summary = {"type_distribution": {f"Type-{i}": i for i in range(200)}}
+        DatasetSummary.objects.filter(dataset=dataset).update(summary_json=summary)
+        url = f"/api/summary/{dataset.id}/"
+
+        as_json = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(as_json["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(as_json.content)), summary)
+
+        packed = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(packed["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(packed.content), summary)
+        self.assertNotEqual(packed["ETag"], as_json["ETag"].removeprefix("W/"))
+
+        # Small bodies are left alone.
+        small = self.client.get("/api/history/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(small.has_header("Content-Encoding"))
+
+
+def make_zip(members, encrypted=()):
+    """Return a ZIP archive of ``{name: data}``, with the ``encrypted``
+    members flagged as encrypted (zipfile cannot write real ones)."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    archive = bytearray(buf.getvalue())
+    for name in encrypted:
+        encoded = name.encode()
+        # Local file header and central directory entry of the member.
+        for signature, flags_at, name_at in ((b"PK\x03\x04", 6, 30), (b"PK\x01\x02", 8, 46)):
+            start = archive.find(signature)
+            while archive[start + name_at:start + name_at + len(encoded)] != encoded:
+                start = archive.find(signature, start + 1)
+            archive[start + flags_at] |= 0x1
+    return bytes(archive)
+
+
+class BatchUploadTests(ApiTestCase):
+    def upload_archive(self, data):
+        return self.client.post(
+            "/api/upload/batch/",
+            {"archive": SimpleUploadedFile("batch.zip", data)},
+            format="multipart",
+        )
+
+    def test_archive_members_are_stored_and_deduplicated(self):
+        other = CSV + b"Reactor-1,Reactor,80,9.5,300\n"
+        response = self.upload_archive(make_zip({
+            "a.csv": CSV, "dir/b.csv": CSV, "c.csv": other, "notes.txt": b"hi",
+        }))
+
+        self.assertEqual(response.status_code, 200)
+        results = {r["name"]: r for r in response.json()["results"]}
+        self.assertEqual(results["notes.txt"]["error"], "Only CSV files allowed")
+        self.assertEqual(results["c.csv"]["summary"]["total_count"], 3)
+        self.assertEqual(
+            sorted(DatasetBlob.objects.values_list("ref_count", flat=True)), [1, 2],
+        )
+
+    @override_settings(BATCH_UPLOAD_MAX_MEMBER_BYTES=len(CSV) + 10)
+    def test_oversized_member_is_a_per_file_error(self):
+        big = CSV + b"Reactor-1,Reactor,80,9.5,300\n" * 10
+        response = self.upload_archive(make_zip({"big.csv": big, "ok.csv": CSV}))
+
+        self.assertEqual(response.status_code, 200)
+        results = {r["name"]: r for r in response.json()["results"]}
+        self.assertIn("exceeds", results["big.csv"]["error"])
+        self.assertIn("id", results["ok.csv"])
+
+    @override_settings(BATCH_UPLOAD_MAX_TOTAL_BYTES=2 * len(CSV) + 10)
+    def test_oversized_archive_is_rejected(self):
+        other = CSV.replace(b"Pump-1", b"Pump-2")
+        response = self.upload_archive(make_zip({"a.csv": CSV, "b.csv": other, "c.csv": CSV}))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Archive exceeds", response.json()["error"])
+        self.assertFalse(Dataset.objects.exists())
+
+    def test_encrypted_and_corrupt_members_are_per_file_errors(self):
+        archive = make_zip({"secret.csv": CSV, "broken.csv": CSV * 50, "ok.csv": CSV},
+                           encrypted=["secret.csv"])
+        # Flip a byte of broken.csv's compressed data: CRC or inflate fails.
+        data_at = archive.find(b"broken.csv") + len(b"broken.csv") + 5
+        archive = archive[:data_at] + bytes([archive[data_at] ^ 0xFF]) + archive[data_at + 1:]
+
+        response = self.upload_archive(archive)
+
+        self.assertEqual(response.status_code, 200)
+        results = {r["name"]: r for r in response.json()["results"]}
+        self.assertEqual(results["secret.csv"]["error"], "Encrypted files are not supported")
+        self.assertTrue(results["broken.csv"]["error"].startswith("Unreadable file"))
+        self.assertIn("id", results["ok.csv"])
+
+    def test_member_files_are_closed(self):
+        from .batch import process_batch
+
+        archive = make_zip({"a.csv": CSV, "b.csv": CSV})
+        with mock.patch("api.views.process_batch", wraps=process_batch) as batch:
+            self.assertEqual(self.upload_archive(archive).status_code, 200)
+        members = batch.call_args.args[1]
+        self.assertTrue(all(m.file.closed for m in members))
+
+        with mock.patch("api.views.process_batch", side_effect=OSError) as batch:
+            with self.assertRaises(OSError):
+                self.upload_archive(archive)
+        members = batch.call_args.args[1]
+        self.assertTrue(all(m.file.closed for m in members))
+
+
+class ChunkedUploadTests(ApiTestCase):
+    @override_settings(CHUNKED_UPLOAD_MIN_CHUNK_BYTES=1)
+    def test_chunked_upload_matches_single_upload(self):
+        start = self.client.post(
+            "/api/upload/chunked/",
+            {"name": "big.csv", "size": len(CSV), "chunk_size": 20},
+            format="json",
+        )
+        self.assertEqual(start.status_code, 201)
+        url = f"/api/upload/chunked/{start.json()['upload_id']}"
+        chunks = [CSV[i:i + 20] for i in range(0, len(CSV), 20)]
+
+        def put(index):
+            return self.client.put(
+                f"{url}/chunks/{index}/", chunks[index],
+                content_type="application/octet-stream",
+            )
+
+        self.assertEqual(put(1).status_code, 409)
+        self.assertEqual(put(0).json()["next_chunk"], 1)
+        self.assertEqual(put(0).json()["next_chunk"], 1)  # retry is a no-op
+        self.assertEqual(self.client.post(f"{url}/finalize/").status_code, 400)
+        for index in range(1, len(chunks)):
+            status = put(index).json()
+        self.assertTrue(status["complete"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            chunked = self.client.post(f"{url}/finalize/").json()
+        self.assertEqual(self.client.get(url + "/").status_code, 404)
+
+        single = self.upload("same.csv").json()
+        # Same bytes: the single upload reuses the chunked upload's blob.
+        self.assertEqual(chunked["summary"], single["summary"])
+        self.assertEqual(chunked["summary"]["total_count"], 2)
+        self.assertEqual(DatasetBlob.objects.count(), 1)
+
+    @override_settings(CHUNKED_UPLOAD_MIN_CHUNK_BYTES=1)
+    def test_failed_chunk_keeps_the_session_for_a_retry(self):
+        start = self.client.post(
+            "/api/upload/chunked/",
+            {"name": "big.csv", "size": len(CSV), "chunk_size": len(CSV)},
+            format="json",
+        ).json()
+        url = f"/api/upload/chunked/{start['upload_id']}"
+
+        def put():
+            return self.client.put(
+                f"{url}/chunks/0/", CSV, content_type="application/octet-stream",
+            )
+
+        self.client.raise_request_exception = False
+        with mock.patch("api.chunked._write_atomic", side_effect=OSError("disk full")):
+            self.assertEqual(put().status_code, 500)
+        self.assertEqual(self.client.get(url + "/").json()["next_chunk"], 0)
+
+        self.assertTrue(put().json()["complete"])
+        with self.captureOnCommitCallbacks(execute=True):
+            dataset = self.client.post(f"{url}/finalize/").json()
+        self.assertEqual(dataset["summary"]["total_count"], 2)
+
+    def test_invalid_chunk_discards_the_session(self):
+        data = b"Equipment Name,Type,Flowrate,Pressure,Temperature\nP1,Pump,x,1,1\n"
+        start = self.client.post(
+            "/api/upload/chunked/", {"name": "bad.csv", "size": len(data)}, format="json",
+        ).json()
+        url = f"/api/upload/chunked/{start['upload_id']}"
+
+        res = self.client.put(f"{url}/chunks/0/", data, content_type="application/octet-stream")
+        self.assertEqual(res.status_code, 400)
+        self.assertNotIn("next_chunk", res.json())
+        self.assertEqual(self.client.get(url + "/").status_code, 404)
+
+
+class ReportDownloadTests(ApiTestCase):
+    def test_report_download_supports_ranges(self):
+        dataset_id = self.upload().json()["id"]
+        url = f"/api/report/{dataset_id}/?charts=vector"
+
+        full = self.client.get(url)
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full["Accept-Ranges"], "bytes")
+        pdf = b"".join(full.streaming_content)
+        self.assertEqual(int(full["Content-Length"]), len(pdf))
+
+        part = self.client.get(url, HTTP_RANGE="bytes=100-", HTTP_IF_RANGE=full["ETag"])
+        self.assertEqual(part.status_code, 206)
+        self.assertEqual(part["Content-Range"], f"bytes 100-{len(pdf) - 1}/{len(pdf)}")
+        self.assertEqual(b"".join(part.streaming_content), pdf[100:])
+
+        stale = self.client.get(url, HTTP_RANGE="bytes=100-", HTTP_IF_RANGE='"old"')
+        self.assertEqual(stale.status_code, 200)
+        stale.close()
+        beyond = self.client.get(url, HTTP_RANGE=f"bytes={len(pdf)}-")
+        self.assertEqual(beyond.status_code, 416)
+
+
+class ReportCacheTests(ApiTestCase):
+    def cached_reports(self):
+        return sorted(os.listdir(f"{self.media}/report_cache"))
+
+    def test_report_is_rendered_once_and_revalidated(self):
+        dataset_id = self.upload().json()["id"]
+        url = f"/api/report/{dataset_id}/?charts=vector"
+
+        with mock.patch("api.services._build_report", return_value=b"%PDF-cached") as build:
+            first = self.client.get(url)
+            second = self.client.get(url)
+            other_backend = self.client.get(f"/api/report/{dataset_id}/?charts=matplotlib")
+
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(b"".join(second.streaming_content), b"%PDF-cached")
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertNotEqual(first["ETag"], other_backend["ETag"])
+        self.assertEqual(len(self.cached_reports()), 2)
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_key_follows_summary_and_template_version(self):
+        key = report_cache.report_key(1, {"total_count": 2}, "vector")
+        self.assertNotEqual(key, report_cache.report_key(1, {"total_count": 3}, "vector"))
+        self.assertNotEqual(key, report_cache.report_key(2, {"total_count": 2}, "vector"))
+        with mock.patch("api.pdf_utils.REPORT_TEMPLATE_VERSION", 999):
+            self.assertNotEqual(key, report_cache.report_key(1, {"total_count": 2}, "vector"))
+
+    def test_least_recently_used_reports_are_evicted(self):
+        with override_settings(REPORT_CACHE_MAX_BYTES=25):
+            for i, key in enumerate(("a", "b", "c")):
+                report_cache.put(key, b"x" * 10)
+                path = f"{self.media}/report_cache/{key}.pdf"
+                os.utime(path, (1000 + i, 1000 + i))
+                if key == "b":
+                    # A hit makes "a" the most recently used entry.
+                    self.assertEqual(report_cache.get("a"), b"x" * 10)
+                    os.utime(f"{self.media}/report_cache/a.pdf", (2000, 2000))
+
+        self.assertEqual(self.cached_reports(), ["a.pdf", "c.pdf"])
+        self.assertIsNone(report_cache.get("b"))
+
+    def test_evicted_dataset_drops_its_reports(self):
+        dataset_id = self.upload().json()["id"]
+        self.client.get(f"/api/report/{dataset_id}/?charts=vector").close()
+        self.assertEqual(len(self.cached_reports()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(HISTORY_LIMIT):
+                self.upload(f"r{i}.csv", make_csv(5, seed=i))
+
+        self.assertFalse(Dataset.objects.filter(id=dataset_id).exists())
+        self.assertEqual(self.cached_reports(), [])
+
+
+class AsyncViewTests(ApiTestCase):
+    @unittest.skipIf(async_views is None, "adrf is not installed")
+    def test_async_views_match_sync_views(self):
+        dataset_id = self.upload().json()["id"]
+        factory = APIRequestFactory()
+
+        def get(view, **kwargs):
+            request = factory.get("/")
+            force_authenticate(request, self.user)
+            return view(request, **kwargs)
+
+        async def read(response):
+            return b"".join([part async for part in response.streaming_content])
+
+        for sync_view, async_view, kwargs in [
+            (DatasetHistoryView, async_views.AsyncDatasetHistoryView, {}),
+            (DatasetSummaryView, async_views.AsyncDatasetSummaryView, {"pk": dataset_id}),
+        ]:
+            expected = get(sync_view.as_view(), **kwargs)
+            actual = get(async_to_sync(async_view.as_view()), **kwargs)
+            self.assertEqual(actual.status_code, 200)
+            self.assertEqual(actual.data, expected.data)
+            self.assertEqual(actual["ETag"], expected["ETag"])
+
+        async_report = async_to_sync(async_views.AsyncDatasetReportView.as_view())
+        expected = get(DatasetReportView.as_view(), pk=dataset_id)
+        actual = get(async_report, pk=dataset_id)
+        self.assertEqual(actual["ETag"], expected["ETag"])
+        self.assertEqual(
+            async_to_sync(read)(actual), b"".join(expected.streaming_content)
+        )
+        self.assertEqual(get(async_report, pk=dataset_id + 1).status_code, 404)
+
+
+class StreamingAnalysisTests(TestCase):
+    def assertMatchesPandas(self, summary, data):
+        df = pd.read_csv(io.BytesIO(data))
+        self.assertEqual(summary["total_count"], len(df))
+        self.assertEqual(summary["type_distribution"], df["Type"].value_counts().to_dict())
+        for column in ("Flowrate", "Pressure", "Temperature"):
+            stats = summary["statistics"][column.lower()]
+            self.assertAlmostEqual(stats["avg"], df[column].mean(), places=9)
+            self.assertAlmostEqual(stats["std"], df[column].std(), places=9)
+            self.assertEqual(stats["min"], df[column].min())
+            self.assertEqual(stats["max"], df[column].max())
+        for kind, group in df.groupby("Type"):
+            stats = summary["type_statistics"][kind]
+            self.assertEqual(stats["count"], len(group))
+            self.assertAlmostEqual(stats["flowrate"]["avg"], group["Flowrate"].mean(), places=9)
+            self.assertAlmostEqual(stats["pressure"]["std"], group["Pressure"].std(), places=9)
+
+    def test_chunked_result_matches_pandas(self):
+        data = make_csv(1000, missing=0.05)
+        # 97 rows and 4000 bytes never line up with the data, so chunk
+        # boundaries fall in the middle of rows and type groups.
+        for engine, kwargs in (
+            ("pandas", {"chunk_rows": 97}),
+            ("auto", {"chunk_bytes": 4000}),
+        ):
+            with self.subTest(engine=engine), override_settings(ANALYSIS_CSV_ENGINE=engine):
+                acc = accumulate_csv(io.BytesIO(data), **kwargs)
+                self.assertMatchesPandas(acc.result(), data)
+
+    def test_header_only_upload_is_rejected(self):
+        user = User.objects.create_user("alice")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.post(
+            "/api/upload/",
+            {"file": SimpleUploadedFile("empty.csv", HEADER)},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("no data rows", response.json()["error"])
+        self.assertFalse(Dataset.objects.exists())
+
+    def test_infinite_values_are_rejected(self):
+        user = User.objects.create_user("alice")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        for engine in ("pandas", "auto"):
+            for value in (b"inf", b"-inf"):
+                data = CSV + b"Pump-2,Pump," + value + b",5.2,110\n"
+                with self.subTest(engine=engine, value=value), \
+                        override_settings(ANALYSIS_CSV_ENGINE=engine):
+                    response = client.post(
+                        "/api/upload/",
+                        {"file": SimpleUploadedFile("inf.csv", data)},
+                        format="multipart",
+                    )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn("must be finite numbers", response.json()["error"])
+        self.assertFalse(DatasetBlob.objects.exists())
+
+    def test_report_renders_a_column_without_values(self):
+        data = HEADER + b"P-1,Pump,,5.2,110\nP-2,Pump,,4.1,105\n"
+        summary = accumulate_csv(io.BytesIO(data)).result()
+        self.assertIsNone(summary["statistics"]["flowrate"]["avg"])
+        for charts in ("matplotlib", "vector"):
+            with self.subTest(charts=charts):
+                output = io.BytesIO()
+                build_pdf_report(output, summary, User(username="alice"), charts=charts)
+                self.assertTrue(output.getvalue().startswith(b"%PDF"))
+
+
+class CsvParserTests(SimpleTestCase):
+    ENGINES = ["pandas"] + (["auto"] if pq is not None else [])
+
+    def read(self, data, engine, **kwargs):
+        with override_settings(ANALYSIS_CSV_ENGINE=engine):
+            return list(read_csv_chunks(io.BytesIO(data), **kwargs))
+
+    def test_columns_are_pruned_typed_and_renamed(self):
+        data = (
+            b"\xef\xbb\xbf temperature ,Notes,FLOWRATE,type,Pressure,Equipment Name\n"
+            b"110,first,120,Pump,5.2,P-1\n"
+            b"105,,60,Valve,,V-1\n"
+        )
+        for engine in self.ENGINES:
+            with self.subTest(engine=engine):
+                (df,) = self.read(data, engine)
+                self.assertEqual(sorted(df.columns), sorted(ANALYSIS_COLUMNS))
+                self.assertEqual(df["Type"].dtype, "category")
+                for column in ("Flowrate", "Pressure", "Temperature"):
+                    self.assertEqual(df[column].dtype, np.float64)
+                self.assertEqual(df["Flowrate"].tolist(), [120.0, 60.0])
+                self.assertTrue(np.isnan(df["Pressure"].iloc[1]))
+
+                (df,) = self.read(data, engine, columns=ALL_COLUMNS)
+                self.assertEqual(df["Equipment Name"].tolist(), ["P-1", "V-1"])
+
+    def test_float_dtype_setting(self):
+        for engine in self.ENGINES:
+            with self.subTest(engine=engine), override_settings(ANALYSIS_FLOAT_DTYPE="float32"):
+                (df,) = self.read(CSV, engine)
+                self.assertEqual(df["Pressure"].dtype, np.float32)
+
+    def test_chunk_rows_bounds_each_chunk(self):
+        frames = self.read(make_csv(250), "pandas", chunk_rows=100)
+        self.assertEqual([len(df) for df in frames], [100, 100, 50])
+
+    def test_invalid_files_are_rejected(self):
+        cases = (
+            (b"", "CSV file is empty"),
+            (b"Equipment Name,Type,Flowrate,Pressure\nP-1,Pump,1,2\n", "Temperature"),
+            (CSV + b"X-1,Pump,fast,5,100\n", "must be numeric"),
+        )
+        for engine in self.ENGINES:
+            for data, message in cases:
+                with self.subTest(engine=engine, message=message):
+                    with self.assertRaisesRegex(ValueError, message):
+                        self.read(data, engine)
+
+    def test_malformed_rows_are_not_reported_as_non_numeric(self):
+        cases = [("pandas", CSV + b'P-2,"Pump,1,2,3\n')]
+        if "auto" in self.ENGINES:
+            cases += [("auto", CSV + b"P-2,Pump,5\n"), ("auto", CSV + b"P-2,Pump,5,6,7,8\n")]
+        for engine, data in cases:
+            with self.subTest(engine=engine, data=data):
+                with self.assertRaisesRegex(ValueError, "^Malformed CSV"):
+                    self.read(data, engine)
+
+
+class ChartRenderingTests(SimpleTestCase):
+    def setUp(self):
+        self.summary = accumulate_csv(io.BytesIO(make_csv(200))).result()
+        self.user = User(username="alice")
+
+    def build(self, charts="matplotlib"):
+        output = io.BytesIO()
+        build_pdf_report(output, self.summary, self.user, charts=charts)
+        return output.getvalue()
+
+    def test_figures_are_reused_and_cleared(self):
+        fig, ax = pdf_utils._figure_template("average")
+        ax.bar(["a"], [1])
+        again, again_ax = pdf_utils._figure_template("average")
+
+        self.assertIs(again, fig)
+        self.assertIs(again_ax, ax)
+        self.assertEqual(len(ax.patches), 0)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(pdf_utils._figure_template("average")))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0][0], fig)
+
+    def test_charts_render_to_memory(self):
+        png = pdf_utils._generate_average_chart(self.summary["statistics"]).getvalue()
+        self.assertTrue(png.startswith(b"\x89PNG"))
+
+        with mock.patch("builtins.open", side_effect=AssertionError("no file I/O")):
+            first, second = self.build(), self.build()
+        self.assertTrue(first.startswith(b"%PDF"))
+        self.assertEqual(len(first), len(second))
+        self.assertIn(b"/Subtype /Image", first)
+
+
+def fresh_interpreter(code, stdin=""):
+    """Run ``code`` in a new Python process with Django set up; return stdout."""
+    setup = "import django, json, sys; django.setup()\n"
+    return subprocess.run(
+        [sys.executable, "-c", setup + code], input=stdin,
+        cwd=settings.BASE_DIR, check=True, capture_output=True, text=True,
+        env={**os.environ, "DJANGO_SETTINGS_MODULE": "backend.settings"},
+    ).stdout
+
+
+class VectorChartTests(SimpleTestCase):
+    def setUp(self):
+        self.summary = accumulate_csv(io.BytesIO(make_csv(200))).result()
+
+    def test_vector_report_has_no_images(self):
+        for charts, has_images in (("vector", False), ("matplotlib", True)):
+            with self.subTest(charts=charts):
+                output = io.BytesIO()
+                build_pdf_report(output, self.summary, User(username="alice"), charts=charts)
+                self.assertTrue(output.getvalue().startswith(b"%PDF"))
+                self.assertEqual(b"/Subtype /Image" in output.getvalue(), has_images)
+
+        with self.assertRaises(ValueError):
+            build_pdf_report(io.BytesIO(), self.summary, User(username="alice"), charts="svg")
+
+    def test_vector_reports_never_load_matplotlib(self):
+        entry = dict(self.summary, id=1, name="a.csv", created_at="2026-01-01 00:00")
+        comparison = {
+            "datasets": [entry, dict(entry, id=2)],
+            "deltas": [{"id": 2, "total_count": 0, "statistics": _stat_deltas(
+                self.summary["statistics"], self.summary["statistics"],
+            )}],
+            "combined": self.summary,
+        }
+        out = fresh_interpreter(
+            "from io import BytesIO\n"
+            "from django.contrib.auth.models import User\n"
+            "from api.pdf_utils import build_comparison_report, build_pdf_report\n"
+            "comparison = json.load(sys.stdin)\n"
+            "user = User(username='alice')\n"
+            "build_pdf_report(BytesIO(), comparison['combined'], user, charts='vector')\n"
+            "build_comparison_report(BytesIO(), comparison, user, charts='vector')\n"
+            "print('matplotlib' in sys.modules)\n",
+            stdin=json.dumps(comparison),
+        )
+        self.assertEqual(out.strip(), "False")
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_startup_does_not_load_the_analysis_or_pdf_stack(self):
+        out = fresh_interpreter(
+            "from django.urls import resolve\n"
+            "import api.jobs, api.management.commands.run_report_worker\n"
+            "for path in ('/api/history/', '/api/upload/', '/api/report/1/'):\n"
+            "    resolve(path)\n"
+            "heavy = ('pandas', 'numpy', 'pyarrow', 'matplotlib', 'reportlab')\n"
+            "print(json.dumps([name for name in heavy if name in sys.modules]))\n"
+        )
+        self.assertEqual(json.loads(out), [])
+
+
+class SummaryKernelTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.block = np.ascontiguousarray(rng.normal(50, 10, (3, 1000)))
+
+    def assertMatchesNumpy(self, block):
+        count, mean, m2, lo, hi = summarize_block(block)
+        np.testing.assert_array_equal(count, (~np.isnan(block)).sum(axis=1))
+        np.testing.assert_allclose(mean, np.nanmean(block, axis=1))
+        np.testing.assert_allclose(m2, np.nanvar(block, axis=1) * count)
+        np.testing.assert_array_equal(lo, np.nanmin(block, axis=1))
+        np.testing.assert_array_equal(hi, np.nanmax(block, axis=1))
+
+    def test_block_without_missing_values(self):
+        self.assertMatchesNumpy(self.block)
+
+    def test_block_with_missing_values(self):
+        self.block[0, ::7] = np.nan
+        self.block[2, 500] = np.nan
+        self.assertMatchesNumpy(self.block)
+
+    def test_empty_and_all_missing_columns(self):
+        count, mean, m2, lo, hi = summarize_block(np.empty((3, 0)))
+        self.assertEqual(count.tolist(), [0, 0, 0])
+        self.assertTrue(np.isinf(lo).all() and np.isinf(hi).all())
+
+        self.block[1] = np.nan
+        stats = RunningStats()
+        stats.update_block(self.block)
+        result = stats.to_dict()
+        self.assertEqual(set(result["pressure"].values()), {None})
+        self.assertIsNotNone(result["flowrate"]["avg"])
+
+    def test_merged_chunks_match_the_whole_block(self):
+        # A large offset checks the merge keeps the variance stable.
+        self.block += 1e9
+        self.block[2, ::3] = np.nan
+        whole = RunningStats()
+        whole.update_block(self.block)
+
+        merged = RunningStats()
+        for start in range(0, 1000, 128):
+            part = RunningStats()
+            part.update_block(np.ascontiguousarray(self.block[:, start:start + 128]))
+            merged.merge(RunningStats.from_state(json.loads(json.dumps(part.to_state()))))
+
+        expected, actual = whole.to_dict(), merged.to_dict()
+        for column, stats in expected.items():
+            for field, value in stats.items():
+                self.assertAlmostEqual(actual[column][field], value, delta=1e-6 * abs(value))
+        self.assertAlmostEqual(
+            expected["temperature"]["std"], np.nanstd(self.block[2], ddof=1), places=6,
+        )
+
+    def test_single_row_has_no_std(self):
+        stats = RunningStats()
+        stats.update_block(np.array([[1.0], [2.0], [3.0]]))
+        self.assertEqual(stats.to_dict()["flowrate"], {"avg": 1.0, "min": 1.0, "max": 1.0, "std": None})
+
+
+class GroupedStatisticsTests(SimpleTestCase):
+    def frame(self, rows):
+        df = pd.DataFrame(rows, columns=["Type", "Flowrate", "Pressure", "Temperature"])
+        df["Type"] = df["Type"].astype(pd.CategoricalDtype(["Pump", "Valve", "Mixer"]))
+        return df
+
+    def test_groups_match_pandas(self):
+        df = self.frame([
+            ["Pump", 10.0, 1.0, np.nan],
+            ["Valve", 20.0, np.nan, np.nan],
+            ["Pump", 30.0, 3.0, 100.0],
+            ["Pump", np.nan, 5.0, 120.0],
+        ])
+        sizes, groups = summarize_groups(df)
+
+        # Categories without rows are not reported.
+        self.assertEqual(dict(sizes), {"Pump": 3, "Valve": 1})
+        count, mean, m2, lo, hi = groups["Pump"]
+        pump = df[df["Type"] == "Pump"][NUMERIC_COLUMNS]
+        self.assertEqual(count.tolist(), pump.count().tolist())
+        np.testing.assert_allclose(mean, pump.mean())
+        np.testing.assert_allclose(m2, pump.var() * (pump.count() - 1))
+        self.assertEqual(lo.tolist(), pump.min().tolist())
+        self.assertEqual(hi.tolist(), pump.max().tolist())
+
+        count, _, _, lo, hi = groups["Valve"]
+        self.assertEqual(count.tolist(), [1, 0, 0])
+        self.assertEqual((lo[1], hi[1]), (np.inf, -np.inf))
+
+    def test_types_are_merged_across_chunks(self):
+        acc = SummaryAccumulator()
+        acc.update(self.frame([["Pump", 10.0, 1.0, 100.0], ["Pump", 20.0, 2.0, 110.0]]))
+        acc.update(self.frame([["Valve", 5.0, np.nan, 90.0], ["Pump", 30.0, 3.0, 120.0]]))
+        result = acc.result()
+
+        self.assertEqual(list(result["type_statistics"]), ["Pump", "Valve"])
+        pump = result["type_statistics"]["Pump"]
+        self.assertEqual(pump["count"], 3)
+        self.assertEqual(pump["flowrate"], {"avg": 20.0, "min": 10.0, "max": 30.0, "std": 10.0})
+        valve = result["type_statistics"]["Valve"]
+        self.assertEqual(valve["pressure"], {"avg": None, "min": None, "max": None, "std": None})
+        self.assertIsNone(valve["flowrate"]["std"])
+
+
+class SketchTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.values = np.concatenate([rng.normal(100, 15, 60_000), rng.exponential(30, 40_000)])
+
+    def build(self, sketch, values, chunk=4096):
+        for i in range(0, len(values), chunk):
+            sketch.update(values[i:i + chunk])
+        return sketch
+
+    def assertRankError(self, sketch, values, bound):
+        values = np.sort(values)
+        qs = np.linspace(0.01, 0.99, 99)
+        ranks = np.searchsorted(values, sketch.quantiles(qs)) / len(values)
+        self.assertLess(np.abs(ranks - qs).max(), bound)
+
+    def assertExactBins(self, hist, values):
+        """Every value is counted in the bin that contains it."""
+        result = hist.to_dict()
+        expected, _ = np.histogram(values, bins=result["edges"])
+        self.assertEqual(result["counts"], expected.tolist())
+        self.assertEqual(sum(result["counts"]), len(values))
+
+    def test_kll_rank_error_is_bounded(self):
+        sketch = self.build(KLLSketch(), self.values)
+
+        self.assertEqual(sketch.count, len(self.values))
+        self.assertLess(sum(level.size for level in sketch.levels), 4 * sketch.k)
+        self.assertRankError(sketch, self.values, 0.01)
+
+    def test_merged_sketches_match_the_combined_stream(self):
+        left, right = self.values[:30_000], self.values[30_000:]
+        combined = self.build(KLLSketch(), self.values)
+        merged = self.build(KLLSketch(), left)
+        merged.merge(KLLSketch.from_state(self.build(KLLSketch(), right).to_state()))
+
+        self.assertEqual(merged.count, combined.count)
+        self.assertRankError(merged, self.values, 0.01)
+        np.testing.assert_allclose(
+            merged.quantiles([0.5, 0.9]), combined.quantiles([0.5, 0.9]), rtol=0.02,
+        )
+
+        hist = self.build(BinnedHistogram(), left)
+        hist.merge(self.build(BinnedHistogram(), right))
+        self.assertLessEqual(hist.counts.size, hist.max_bins)
+        self.assertExactBins(hist, self.values)
+
+    def test_empty_and_single_value_input(self):
+        empty = ColumnSketches(["Flowrate"])
+        empty.update_block(np.array([[np.nan, np.nan]]))
+        empty.merge(ColumnSketches(["Flowrate"]))
+        self.assertEqual(empty.percentiles(), {"flowrate": {"p50": None, "p90": None, "p99": None}})
+        self.assertEqual(empty.histogram_dict(), {"flowrate": {"edges": [], "counts": []}})
+
+        single = ColumnSketches.from_state(empty.to_state())
+        single.update_block(np.array([[42.5]]))
+        self.assertEqual(single.percentiles()["flowrate"], {"p50": 42.5, "p90": 42.5, "p99": 42.5})
+        hist = single.histogram_dict()["flowrate"]
+        self.assertEqual(hist["counts"], [1])
+        self.assertTrue(hist["edges"][0] <= 42.5 < hist["edges"][1])
+
+    def test_histogram_rebins_when_the_range_grows(self):
+        hist = BinnedHistogram()
+        narrow = np.linspace(0, 1, 500)
+        hist.update(narrow)
+        width = hist.width
+
+        wide = np.linspace(-5_000, 20_000, 1_000)
+        hist.update(wide)
+
+        self.assertGreater(hist.width, width)
+        self.assertLessEqual(hist.counts.size, 64)
+        self.assertExactBins(hist, np.concatenate([narrow, wide]))
+        restored = BinnedHistogram.from_state(hist.to_state())
+        self.assertEqual(restored.to_dict(), hist.to_dict())
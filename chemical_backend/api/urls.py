@@ -1,18 +1,59 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     RegisterView,
     LoginView,
     UploadCSVView,
+    BatchUploadView,
+    ChunkedUploadView,
+    ChunkedUploadDetailView,
+    ChunkedUploadChunkView,
+    ChunkedUploadFinalizeView,
     DatasetHistoryView,
+    DatasetCompareView,
+    DatasetCompareReportView,
     DatasetSummaryView,
+    DatasetRowsView,
     DatasetReportView,
+    ReportJobCreateView,
+    ReportJobStatusView,
+    ReportJobDownloadView,
 )
 
+if getattr(settings, "API_ASYNC_VIEWS", False):
+    try:
+        from .async_views import (
+            AsyncLoginView as LoginView,
+            AsyncDatasetHistoryView as DatasetHistoryView,
+            AsyncDatasetSummaryView as DatasetSummaryView,
+            AsyncDatasetReportView as DatasetReportView,
+            AsyncReportJobDownloadView as ReportJobDownloadView,
+        )
+    except ImportError:  # adrf not installed: keep the sync views
+        pass
+
 urlpatterns = [
     path("register/", RegisterView.as_view()),
     path("login/", LoginView.as_view()),
     path("upload/", UploadCSVView.as_view()),
+    path("upload/batch/", BatchUploadView.as_view()),
+    path("upload/chunked/", ChunkedUploadView.as_view()),
+    path("upload/chunked/<uuid:upload_id>/", ChunkedUploadDetailView.as_view()),
+    path(
+        "upload/chunked/<uuid:upload_id>/chunks/<int:index>/",
+        ChunkedUploadChunkView.as_view(),
+    ),
+    path(
+        "upload/chunked/<uuid:upload_id>/finalize/",
+        ChunkedUploadFinalizeView.as_view(),
+    ),
     path("history/", DatasetHistoryView.as_view()),
+    path("compare/", DatasetCompareView.as_view()),
+    path("compare/report/", DatasetCompareReportView.as_view()),
     path("summary/<int:pk>/", DatasetSummaryView.as_view()),
+    path("datasets/<int:pk>/rows/", DatasetRowsView.as_view()),
     path("report/<int:pk>/", DatasetReportView.as_view()),
+    path("report/<int:pk>/jobs/", ReportJobCreateView.as_view()),
+    path("report/jobs/<int:job_id>/", ReportJobStatusView.as_view()),
+    path("report/jobs/<int:job_id>/download/", ReportJobDownloadView.as_view()),
 ]
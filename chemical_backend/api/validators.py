@@ -1,4 +1,5 @@
 REQUIRED_COLUMNS = {"Equipment Name", "Type", "Flowrate", "Pressure", "Temperature"}
+NUMERIC_COLUMNS = ["Flowrate", "Pressure", "Temperature"]
 
 def validate_columns(df):
     missing = REQUIRED_COLUMNS - set(df.columns)
@@ -7,6 +8,6 @@ def validate_columns(df):
 
 
 def validate_numeric(df):
-    for col in ["Flowrate", "Pressure", "Temperature"]:
+    for col in NUMERIC_COLUMNS:
         if not df[col].dtype.kind in "fi":
             raise ValueError(f"Column '{col}' must be numeric")
@@ -2,51 +2,23 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.core.files.storage import default_storage
-from .models import Dataset
+from .models import Dataset, DatasetSummary
 from .serializers import DatasetSerializer
-from .utils import compute_summary
 from django.contrib.auth.models import User
 from rest_framework.permissions import AllowAny
 from rest_framework import permissions
-import pandas as pd
-
-import pandas as pd
-
-def analyze_csv(file_obj):
-    df = pd.read_csv(file_obj)
-
-    # Normalize column names (VERY IMPORTANT)
-    df.columns = [c.strip().lower() for c in df.columns]
-
-    required_columns = {"type", "flowrate", "pressure", "temperature"}
-    if not required_columns.issubset(df.columns):
-        raise ValueError(
-            f"CSV must contain columns: {required_columns}. Found: {df.columns.tolist()}"
-        )
-
-    summary = {
-        "total_count": len(df),
-        "type_distribution": df["type"].value_counts().to_dict(),
-        "statistics": {
-            "flowrate": {
-                "avg": float(df["flowrate"].mean()),
-                "min": float(df["flowrate"].min()),
-                "max": float(df["flowrate"].max()),
-            },
-            "pressure": {
-                "avg": float(df["pressure"].mean()),
-                "min": float(df["pressure"].min()),
-                "max": float(df["pressure"].max()),
-            },
-            "temperature": {
-                "avg": float(df["temperature"].mean()),
-                "min": float(df["temperature"].min()),
-                "max": float(df["temperature"].max()),
-            },
-        },
-    }
-
-    return summary
+from .batch import members_from_archive, members_from_files, process_batch
+from . import chunked, response_cache
+from .downloads import file_response
+from .models import UploadSession
+from .renderers import DATA_RENDERERS
+from .services import (
+    HISTORY_LIMIT,
+    open_report,
+    render_comparison_report,
+    resolve_chart_backend,
+    store_upload,
+)
 
 
 
@@ -62,116 +34,401 @@ class UploadCSVView(APIView):
         if not file_obj.name.lower().endswith(".csv"):
             return Response({"error": "Only CSV files allowed"}, status=400)
 
-        # ---- ANALYZE CSV ----
+        # ---- STORE / ANALYZE CSV (deduplicated by content hash) ----
+        # ---- AND SAVE DATASET, LIMIT HISTORY TO LAST 5 ----
         try:
-            summary = analyze_csv(file_obj)
+            dataset = store_upload(request.user, file_obj.name, file_obj)
         except Exception as e:
             return Response({"error": str(e)}, status=400)
 
-        # ---- LIMIT HISTORY TO LAST 5 ----
-        existing = Dataset.objects.filter(user=request.user).order_by("created_at")
+        return Response({
+            "id": dataset.id,
+            "summary": dataset.summary.summary_json
+        })
 
-        if existing.count() >= 5:
-            oldest = existing.first()
-            oldest.delete()
 
-        # ---- SAVE DATASET ----
-        dataset = Dataset.objects.create(
-            user=request.user,
-            name=file_obj.name,
-            file=file_obj,
-            summary_json=summary,
-        )
+class BatchUploadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        archive = request.FILES.get("archive")
+        files = request.FILES.getlist("files")
+
+        if not archive and not files:
+            return Response({"error": "Files or ZIP archive required"}, status=400)
+
+        try:
+            if archive:
+                if not archive.name.lower().endswith(".zip"):
+                    return Response({"error": "Archive must be a ZIP file"}, status=400)
+                members = members_from_archive(archive)
+            else:
+                members = members_from_files(files)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        try:
+            results = process_batch(request.user, members)
+        finally:
+            # Archive members are spooled to temporary files.
+            for member in members:
+                if member.file:
+                    member.file.close()
+        ok = any("id" in r for r in results)
+
+        return Response({"results": results}, status=200 if ok else 400)
+
+
+def _upload_session(request, upload_id):
+    return UploadSession.objects.filter(id=upload_id, user=request.user).first()
+
+
+class ChunkedUploadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            session = chunked.start_upload(
+                request.user,
+                request.data.get("name"),
+                request.data.get("size"),
+                request.data.get("chunk_size"),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response(chunked.status(session), status=201)
+
+
+class ChunkedUploadDetailView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, upload_id):
+        session = _upload_session(request, upload_id)
+        if session is None:
+            return Response({"error": "Upload not found"}, status=404)
+        return Response(chunked.status(session))
+
+    def delete(self, request, upload_id):
+        session = _upload_session(request, upload_id)
+        if session is None:
+            return Response({"error": "Upload not found"}, status=404)
+        chunked.discard_upload(session)
+        return Response(status=204)
+
+
+class ChunkedUploadChunkView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request, upload_id, index):
+        session = _upload_session(request, upload_id)
+        if session is None:
+            return Response({"error": "Upload not found"}, status=404)
+
+        # A retry of a chunk that was already applied.
+        if index < session.next_chunk:
+            return Response(chunked.status(session))
+        if index > session.next_chunk:
+            return Response({
+                "error": f"Expected chunk {session.next_chunk}",
+                **chunked.status(session),
+            }, status=409)
+
+        # Read the raw body; one more byte than allowed reveals oversized chunks.
+        stream = request.stream
+        expected = chunked.expected_length(session)
+        data = stream.read(expected + 1) if stream else b""
+        if len(data) != expected:
+            return Response({
+                "error": f"Chunk {index} must be {expected} bytes",
+                **chunked.status(session),
+            }, status=400)
+
+        try:
+            session = chunked.receive_chunk(session, data)
+        except ValueError as e:
+            # The file itself is invalid; resuming cannot fix it. Other
+            # errors leave the session as it was, so the chunk can be retried.
+            chunked.discard_upload(session)
+            return Response({"error": str(e)}, status=400)
+
+        return Response(chunked.status(session))
+
+
+class ChunkedUploadFinalizeView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, upload_id):
+        session = _upload_session(request, upload_id)
+        if session is None:
+            return Response({"error": "Upload not found"}, status=404)
+
+        try:
+            dataset = chunked.finalize_upload(session)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        if dataset is None:
+            return Response({"error": "Upload already finalized"}, status=409)
 
         return Response({
             "id": dataset.id,
-            "summary": summary
+            "summary": dataset.summary.summary_json
         })
 
 
 class DatasetSummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = DATA_RENDERERS
 
     def get(self, request, pk):
-        try:
-            dataset = Dataset.objects.get(
-                id=pk,
-                user=request.user
+        def build():
+            # Only the summary and its owner's id; no Dataset row is loaded.
+            return (
+                DatasetSummary.objects
+                .filter(dataset_id=pk)
+                .values_list("summary_json", "dataset__user_id")
+                .first()
             )
-        except Dataset.DoesNotExist:
+
+        entry = response_cache.get_or_build(response_cache.summary_key(pk), build)
+        if entry is None or entry["owner_id"] != request.user.id:
             return Response(
                 {"error": "Dataset not found"},
                 status=404
             )
 
-        return Response(dataset.summary_json)
+        return response_cache.respond(request, entry)
+
+
+
+
+class DatasetRowsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = DATA_RENDERERS
+
+    def get(self, request, pk):
+        # Imported here so pandas/pyarrow stay out of worker startup.
+        from .rows import RowQuery, query_rows
+
+        try:
+            dataset = (
+                Dataset.objects
+                .select_related("blob")
+                .defer("blob__summary_json", "blob__aggregates_json")
+                .get(id=pk, user=request.user)
+            )
+        except Dataset.DoesNotExist:
+            return Response({"error": "Dataset not found"}, status=404)
 
+        try:
+            query = RowQuery.from_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
 
+        columnar_file = dataset.blob.columnar if dataset.blob else None
+        try:
+            rows, next_cursor = query_rows(dataset.file, columnar_file, query)
+        except FileNotFoundError:
+            return Response({"error": "Dataset file is no longer available"}, status=410)
+
+        return Response({
+            "columns": query.columns,
+            "rows": rows,
+            "next_cursor": next_cursor,
+        })
+
+
+def history_item(row):
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "created_at": row["created_at"].strftime("%Y-%m-%d %H:%M")
+    }
 
 
 class DatasetHistoryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        datasets = (
-            Dataset.objects
-            .filter(user=request.user)
-            .order_by("-created_at")[:5]
-        )
+        user = request.user
+
+        def build():
+            # Only the listed columns, never the summary payloads.
+            datasets = (
+                Dataset.objects
+                .filter(user=user)
+                .order_by("-created_at", "-id")
+                .values("id", "name", "created_at")[:HISTORY_LIMIT]
+            )
 
-        data = [
-            {
-                "id": d.id,
-                "name": d.name,
-                "created_at": d.created_at.strftime("%Y-%m-%d %H:%M")
-            }
-            for d in datasets
-        ]
+            return [history_item(d) for d in datasets], user.id
 
-        return Response(data)
+        entry = response_cache.get_or_build(response_cache.history_key(user.id), build)
+        return response_cache.respond(request, entry)
 
 
+def _load_comparison(request):
+    """Return ``(comparison, None)`` or ``(None, error response)``."""
+    # Imported here so pandas/numpy stay out of worker startup.
+    from .compare import compare_datasets, parse_ids
 
-from django.http import HttpResponse
-import tempfile
-from .pdf_utils import build_pdf_report
-from .models import Dataset
-from rest_framework.views import APIView
-from rest_framework import permissions
+    try:
+        ids = parse_ids(request.query_params.get("ids"))
+    except ValueError as e:
+        return None, Response({"error": str(e)}, status=400)
 
+    found = (
+        Dataset.objects
+        .select_related("blob")
+        .filter(user=request.user, id__in=ids)
+        .in_bulk()
+    )
+    if len(found) != len(ids):
+        return None, Response({"error": "Dataset not found"}, status=404)
 
-from rest_framework.views import APIView
-from rest_framework import permissions
-from django.http import HttpResponse
-import tempfile
+    try:
+        return compare_datasets([found[i] for i in ids]), None
+    except ValueError as e:
+        return None, Response({"error": str(e)}, status=400)
 
-from .models import Dataset
-from .pdf_utils import build_pdf_report
 
+class DatasetCompareView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-class DatasetReportView(APIView):
+    def get(self, request):
+        comparison, error = _load_comparison(request)
+        if error:
+            return error
+        return Response(comparison)
+
+
+class DatasetCompareReportView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get(self, request, pk):
-        dataset = Dataset.objects.get(id=pk, user=request.user)
+    def get(self, request):
+        try:
+            charts = resolve_chart_backend(request.query_params.get("charts"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            build_pdf_report(
-                file_path=tmp.name,
-                summary=dataset.summary_json,
-                user=request.user,
-            )
-            tmp.seek(0)
-            pdf_data = tmp.read()
+        comparison, error = _load_comparison(request)
+        if error:
+            return error
+
+        pdf_data = render_comparison_report(comparison, request.user, charts=charts)
 
         response = HttpResponse(pdf_data, content_type="application/pdf")
         response["Content-Disposition"] = (
-            "attachment; filename=dataset_report.pdf"
+            "attachment; filename=comparison_report.pdf"
         )
         return response
 
 
 
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from . import report_cache
+from .models import Dataset
+from rest_framework.views import APIView
+from rest_framework import permissions
+
+
+class DatasetReportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            dataset = Dataset.objects.select_related("summary").get(id=pk, user=request.user)
+        except Dataset.DoesNotExist:
+            return Response({"error": "Dataset not found"}, status=404)
+
+        try:
+            charts = resolve_chart_backend(request.query_params.get("charts"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        etag = quote_etag(
+            report_cache.report_key(dataset.id, dataset.summary.summary_json, charts)
+        )
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        return file_response(
+            request, open_report(dataset, charts=charts),
+            "dataset_report.pdf", "application/pdf", etag=etag,
+        )
+
+
+from .jobs import enqueue_report, recover_stale_jobs
+from .models import ReportJob
+
+
+def _job_payload(job):
+    return {
+        "job_id": job.id,
+        "dataset_id": job.dataset_id,
+        "status": job.status,
+        "error": job.error,
+        "status_url": f"/api/report/jobs/{job.id}/",
+        "download_url": f"/api/report/jobs/{job.id}/download/",
+    }
+
+
+class ReportJobCreateView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            dataset = Dataset.objects.get(id=pk, user=request.user)
+        except Dataset.DoesNotExist:
+            return Response({"error": "Dataset not found"}, status=404)
+
+        charts = request.data.get("charts") or request.query_params.get("charts")
+        try:
+            charts = resolve_chart_backend(charts)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        job = enqueue_report(dataset, request.user, charts=charts)
+        return Response(_job_payload(job), status=202)
+
+
+class ReportJobStatusView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = ReportJob.objects.get(id=job_id, user=request.user)
+        except ReportJob.DoesNotExist:
+            return Response({"error": "Report job not found"}, status=404)
+
+        if job.status == ReportJob.RUNNING:
+            # Requeues (or fails) the job if its process died.
+            recover_stale_jobs([job.id])
+            job.refresh_from_db()
+        return Response(_job_payload(job))
+
+
+class ReportJobDownloadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = ReportJob.objects.get(id=job_id, user=request.user)
+        except ReportJob.DoesNotExist:
+            return Response({"error": "Report job not found"}, status=404)
+
+        if job.status != ReportJob.DONE:
+            return Response(_job_payload(job), status=409)
+
+        return file_response(
+            request, job.file.open("rb"), "dataset_report.pdf", "application/pdf",
+        )
+
+
+
 
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
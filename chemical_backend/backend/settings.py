@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 import os
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,6 +50,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.SelectiveCompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +89,33 @@ DATABASES = {
     }
 }
 
+# SQLite performance profile (see api/db.py): WAL, tuned pragmas and busy
+# timeouts on every connection, and connections kept open across requests.
+# Set SQLITE_PERFORMANCE_PROFILE=0 in the environment to turn it off.
+
+SQLITE_PERFORMANCE_PROFILE = os.environ.get("SQLITE_PERFORMANCE_PROFILE", "1") != "0"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64_000,  # negative = KiB, i.e. 64 MB
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 20_000,  # ms
+}
+
+if SQLITE_PERFORMANCE_PROFILE:
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # sqlite3.connect(timeout=...): seconds to wait for a lock.
+        'OPTIONS': {'timeout': 20},
+    })
+    if django.VERSION >= (5, 1):
+        # BEGIN IMMEDIATE takes the write lock when a transaction starts, so
+        # concurrent writers queue on the busy timeout instead of failing
+        # when a read lock can't be upgraded.
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -139,3 +169,99 @@ REST_FRAMEWORK = {
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+
+# CSV analysis
+# Uploads are analyzed in bounded chunks. Set ANALYSIS_CHUNK_BYTES (and
+# leave ANALYSIS_CHUNK_ROWS as None) to size chunks by bytes instead.
+# ANALYSIS_CSV_ENGINE is "auto" (pyarrow when installed) or "pandas".
+
+ANALYSIS_CHUNK_ROWS = 100_000
+ANALYSIS_CHUNK_BYTES = None
+ANALYSIS_CSV_ENGINE = "auto"
+ANALYSIS_FLOAT_DTYPE = "float64"
+
+# Columnar storage: uploads are also kept as zstd-compressed Parquet for
+# fast re-analysis and row queries (needs pyarrow).
+
+COLUMNAR_STORAGE = True
+COLUMNAR_COMPRESSION = "zstd"
+COLUMNAR_ROW_GROUP_ROWS = 16_384
+
+# Bulk uploads (/api/upload/batch/)
+
+BATCH_UPLOAD_MAX_FILES = 100
+BATCH_UPLOAD_WORKERS = 4
+# Uncompressed size limits for ZIP archives, counted while extracting.
+BATCH_UPLOAD_MAX_MEMBER_BYTES = 200 * 1024 * 1024
+BATCH_UPLOAD_MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+
+
+
+# Chunked uploads (/api/upload/chunked/)
+# Chunks are kept under CHUNKED_UPLOAD_DIR (default MEDIA_ROOT/uploads)
+# until the upload is finalized; idle uploads expire after the given hours.
+
+CHUNKED_UPLOAD_CHUNK_BYTES = 4 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_BYTES = 2 * 1024 ** 3
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
+
+
+# Response compression (api.middleware.SelectiveCompressionMiddleware)
+# Only these content types, and only bodies of at least the minimum size,
+# are compressed; PDFs are already compressed. Brotli is used for clients
+# that accept it when the `brotli` package is installed.
+
+RESPONSE_COMPRESSION_TYPES = ("application/json", "application/msgpack", "text/")
+RESPONSE_COMPRESSION_MIN_BYTES = 1024
+RESPONSE_BROTLI_QUALITY = 5
+
+
+
+# Background PDF reports
+# "process" runs jobs on a local process pool; "worker" leaves them for
+# `python manage.py run_report_worker`.
+
+REPORT_JOB_BACKEND = "process"
+REPORT_JOB_WORKERS = 2
+# A job still running this many seconds after it started is assumed lost
+# (its process died) and requeued, up to REPORT_JOB_MAX_ATTEMPTS runs.
+REPORT_JOB_TIMEOUT = 10 * 60
+REPORT_JOB_MAX_ATTEMPTS = 2
+
+
+# Async views (api/async_views.py, needs adrf)
+# backend/asgi.py turns these on, so under an ASGI server the history,
+# summary, report download and login endpoints are async. CPU-bound work in
+# them (PDF rendering, password hashing) runs on ASYNC_CPU_WORKERS threads.
+
+API_ASYNC_VIEWS = os.environ.get("API_ASYNC_VIEWS", "0") == "1"
+ASYNC_CPU_WORKERS = 4
+
+if API_ASYNC_VIEWS:
+    # Under ASGI each request runs its sync code on a thread of its own, so
+    # a connection kept open after the request would never be reused.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+
+# Response cache for the summary and history endpoints (api/response_cache.py).
+# File-based so all worker processes see the same entries and invalidations.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "api_cache",
+    }
+}
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+
+# Rendered PDF report cache (LRU, bounded by total size on disk)
+
+REPORT_CACHE_DIR = BASE_DIR / "report_cache"
+REPORT_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+# Chart backend for reports: "matplotlib" (raster PNG) or "vector"
+# (reportlab.graphics). Can be overridden per request with ?charts=.
+
+REPORT_CHART_BACKEND = "matplotlib"
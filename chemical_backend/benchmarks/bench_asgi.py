@@ -0,0 +1,189 @@
+"""
+Benchmark: sync WSGI vs async ASGI throughput with slow clients attached.
+
+Runs the same workload against each server given: ``--slow-clients``
+connections request the PDF report over a slow link, sending the request
+a few bytes at a time with a pause after each, for as long as the run
+lasts, while ``--concurrency`` threads fire ``--requests`` requests at the
+history, summary, report and login endpoints. Under WSGI each slow client
+keeps a worker thread waiting for its request; under ASGI it only holds an
+open socket on the event loop. Reports throughput, latency percentiles and
+failures per endpoint.
+
+Serve the project both ways with the same worker count, e.g.
+
+    gunicorn backend.wsgi -w 1 --threads 8 -b 127.0.0.1:8000
+    uvicorn backend.asgi:application --workers 1 --port 8001
+
+    python benchmarks/bench_asgi.py --wsgi http://127.0.0.1:8000/api \\
+        --asgi http://127.0.0.1:8001/api --slow-clients 16
+"""
+import argparse
+import random
+import socket
+import statistics
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from bench_concurrency import make_csv, percentile
+
+KINDS = ("history", "summary", "report", "login")
+PASSWORD = "bench-password"
+
+
+def prepare(api):
+    """Register a user, upload a dataset and warm the report cache."""
+    username = "bench-" + "".join(random.choices(string.ascii_lowercase, k=10))
+    res = requests.post(f"{api}/register/", json={
+        "username": username,
+        "password": PASSWORD,
+    })
+    res.raise_for_status()
+    headers = {"Authorization": f"Token {res.json()['token']}"}
+
+    res = requests.post(
+        f"{api}/upload/", headers=headers,
+        files={"file": ("bench.csv", make_csv(500, seed=0), "text/csv")},
+    )
+    res.raise_for_status()
+    dataset_id = res.json()["id"]
+    requests.get(f"{api}/report/{dataset_id}/", headers=headers).raise_for_status()
+    return username, headers, dataset_id
+
+
+def run_one(session, api, headers, username, dataset_id, kind):
+    start = time.perf_counter()
+    try:
+        if kind == "history":
+            res = session.get(f"{api}/history/", headers=headers)
+        elif kind == "summary":
+            res = session.get(f"{api}/summary/{dataset_id}/", headers=headers)
+        elif kind == "report":
+            res = session.get(f"{api}/report/{dataset_id}/", headers=headers)
+        else:
+            res = session.post(f"{api}/login/", json={
+                "username": username,
+                "password": PASSWORD,
+            })
+        ok = res.status_code == 200
+        error = None if ok else f"HTTP {res.status_code}: {res.text[:80]}"
+    except requests.RequestException as exc:
+        ok, error = False, type(exc).__name__
+    return kind, time.perf_counter() - start, ok, error
+
+
+def slow_client(api, path, headers, block, delay, stop):
+    """Send a GET request over and over, trickling it out ``block`` bytes
+    at a time, then read the response."""
+    url = urlsplit(api)
+    request = (
+        f"GET {url.path}{path} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+        + "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        + "Connection: close\r\n\r\n"
+    ).encode()
+    while not stop.is_set():
+        try:
+            with socket.create_connection((url.hostname, url.port), timeout=30) as sock:
+                for i in range(0, len(request), block):
+                    sock.sendall(request[i:i + block])
+                    if stop.wait(delay):
+                        break
+                else:
+                    while sock.recv(65536):
+                        pass
+        except OSError:
+            stop.wait(delay)
+
+
+def bench(name, api, args):
+    username, headers, dataset_id = prepare(api)
+
+    rng = random.Random(0)
+    weights = [args.history, args.summary, args.report, args.login]
+    tasks = rng.choices(KINDS, weights=weights, k=args.requests)
+
+    stop = threading.Event()
+    clients = [
+        threading.Thread(
+            target=slow_client, daemon=True,
+            args=(api, f"/report/{dataset_id}/", headers,
+                  args.slow_block, args.slow_delay, stop),
+        )
+        for _ in range(args.slow_clients)
+    ]
+    for client in clients:
+        client.start()
+    # Let the slow clients connect before measuring.
+    time.sleep(0.5)
+
+    # One session (keep-alive connection pool) per worker thread.
+    sessions = {}
+
+    def worker(kind):
+        session = sessions.setdefault(threading.get_ident(), requests.Session())
+        return run_one(session, api, headers, username, dataset_id, kind)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(worker, tasks))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for client in clients:
+        client.join()
+
+    print(f"{name}: {len(results)} requests, concurrency {args.concurrency}, "
+          f"{args.slow_clients} slow clients: "
+          f"{elapsed:.2f}s, {len(results) / elapsed:.1f} req/s")
+    print(f"  {'kind':<8} {'count':>6} {'failed':>7} {'p50 (ms)':>9} "
+          f"{'p95 (ms)':>9} {'max (ms)':>9}")
+    for kind in KINDS:
+        rows = [r for r in results if r[0] == kind]
+        if not rows:
+            continue
+        latencies = [r[1] * 1e3 for r in rows]
+        failed = [r for r in rows if not r[2]]
+        print(
+            f"  {kind:<8} {len(rows):>6} {len(failed):>7} "
+            f"{statistics.median(latencies):>9.1f} "
+            f"{percentile(latencies, 95):>9.1f} {max(latencies):>9.1f}"
+        )
+        for error in sorted({r[3] for r in failed})[:3]:
+            print(f"      {error}")
+    return len(results) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wsgi", help="API URL of the WSGI server")
+    parser.add_argument("--asgi", help="API URL of the ASGI server")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--slow-clients", type=int, default=16)
+    parser.add_argument("--slow-block", type=int, default=8,
+                        help="request bytes a slow client sends at a time")
+    parser.add_argument("--slow-delay", type=float, default=0.05,
+                        help="seconds a slow client waits between sends")
+    parser.add_argument("--history", type=float, default=4,
+                        help="relative share of history requests")
+    parser.add_argument("--summary", type=float, default=4)
+    parser.add_argument("--report", type=float, default=1)
+    parser.add_argument("--login", type=float, default=1)
+    args = parser.parse_args()
+    if not (args.wsgi or args.asgi):
+        parser.error("give --wsgi and/or --asgi")
+
+    rates = {}
+    for name, url in (("WSGI", args.wsgi), ("ASGI", args.asgi)):
+        if url:
+            rates[name] = bench(name, url.rstrip("/"), args)
+    if len(rates) == 2:
+        print(f"ASGI/WSGI throughput: {rates['ASGI'] / rates['WSGI']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
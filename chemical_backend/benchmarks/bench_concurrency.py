@@ -0,0 +1,130 @@
+"""
+Benchmark: concurrent uploads and history requests against a running server.
+
+Registers a throwaway user, then fires ``--requests`` requests from
+``--concurrency`` threads: a ``--upload-ratio`` share are CSV uploads (each
+with unique content, so none is deduplicated away) and the rest are
+history listings. Reports throughput, latency percentiles and failures per
+request kind; with the default SQLite settings, failures under load are
+mostly "database is locked" errors.
+
+Start the dev server, once with the SQLite performance profile and once
+without, and run the benchmark against each:
+
+    python manage.py runserver --noreload
+    SQLITE_PERFORMANCE_PROFILE=0 python manage.py runserver --noreload
+
+    python benchmarks/bench_concurrency.py --concurrency 16 --requests 400
+"""
+import argparse
+import io
+import random
+import statistics
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+TYPES = ["Pump", "Valve", "Compressor", "HeatExchanger", "Reactor", "Condenser"]
+
+
+def make_csv(rows, seed):
+    rng = random.Random(seed)
+    buf = io.StringIO()
+    buf.write("Equipment Name,Type,Flowrate,Pressure,Temperature\n")
+    for i in range(rows):
+        buf.write(
+            f"E-{seed}-{i},{rng.choice(TYPES)},{rng.uniform(50, 200):.2f},"
+            f"{rng.uniform(1, 10):.2f},{rng.uniform(80, 150):.2f}\n"
+        )
+    return buf.getvalue().encode()
+
+
+def register(api):
+    username = "bench-" + "".join(random.choices(string.ascii_lowercase, k=10))
+    res = requests.post(f"{api}/register/", json={
+        "username": username,
+        "password": "bench-password",
+    })
+    res.raise_for_status()
+    return res.json()["token"]
+
+
+def run_one(session, api, headers, kind, payload):
+    start = time.perf_counter()
+    try:
+        if kind == "upload":
+            res = session.post(
+                f"{api}/upload/", headers=headers,
+                files={"file": ("bench.csv", payload, "text/csv")},
+            )
+        else:
+            res = session.get(f"{api}/history/", headers=headers)
+        ok = res.status_code == 200
+        error = None if ok else f"HTTP {res.status_code}: {res.text[:80]}"
+    except requests.RequestException as exc:
+        ok, error = False, type(exc).__name__
+    return kind, time.perf_counter() - start, ok, error
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8000/api")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--upload-ratio", type=float, default=0.25)
+    parser.add_argument("--rows", type=int, default=200,
+                        help="rows per uploaded CSV")
+    args = parser.parse_args()
+
+    api = args.url.rstrip("/")
+    headers = {"Authorization": f"Token {register(api)}"}
+
+    rng = random.Random(0)
+    tasks = []
+    for i in range(args.requests):
+        if rng.random() < args.upload_ratio:
+            tasks.append(("upload", make_csv(args.rows, seed=i)))
+        else:
+            tasks.append(("history", None))
+
+    # One session (keep-alive connection pool) per worker thread.
+    sessions = {}
+
+    def worker(task):
+        session = sessions.setdefault(threading.get_ident(), requests.Session())
+        return run_one(session, api, headers, *task)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(worker, tasks))
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(results)} requests, concurrency {args.concurrency}: "
+          f"{elapsed:.2f}s, {len(results) / elapsed:.1f} req/s")
+    print(f"{'kind':<8} {'count':>6} {'failed':>7} {'p50 (ms)':>9} "
+          f"{'p95 (ms)':>9} {'max (ms)':>9}")
+    for kind in ("upload", "history"):
+        rows = [r for r in results if r[0] == kind]
+        if not rows:
+            continue
+        latencies = [r[1] * 1e3 for r in rows]
+        failed = [r for r in rows if not r[2]]
+        print(
+            f"{kind:<8} {len(rows):>6} {len(failed):>7} "
+            f"{statistics.median(latencies):>9.1f} "
+            f"{percentile(latencies, 95):>9.1f} {max(latencies):>9.1f}"
+        )
+        for error in sorted({r[3] for r in failed})[:3]:
+            print(f"    {error}")
+
+
+if __name__ == "__main__":
+    main()
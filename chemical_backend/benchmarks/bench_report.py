@@ -0,0 +1,122 @@
+"""
+Benchmark: per-report latency of the PDF pipeline.
+
+Compares the previous pipeline (pyplot figures created per chart, PNGs and
+the PDF written to temporary files and read back) with the in-memory
+pipeline that reuses figure templates and never touches the disk.
+
+Run from the chemical_backend directory:
+
+    python benchmarks/bench_report.py --reports 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib  # noqa: E402
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+from api import pdf_utils  # noqa: E402
+
+SUMMARY = {
+    "total_count": 15,
+    "statistics": {
+        "flowrate": {"avg": 119.8, "min": 58.0, "max": 165.0, "std": 36.7},
+        "pressure": {"avg": 6.1, "min": 4.0, "max": 8.4, "std": 1.39},
+        "temperature": {"avg": 117.5, "min": 95.0, "max": 140.0, "std": 14.4},
+    },
+    "type_distribution": {
+        "Pump": 4, "Valve": 3, "Compressor": 2,
+        "HeatExchanger": 2, "Reactor": 2, "Condenser": 2,
+    },
+}
+USER = SimpleNamespace(username="benchmark")
+
+
+def _legacy_chart(draw):
+    fig, ax = plt.subplots()
+    draw(ax)
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
+    plt.savefig(temp_file.name, bbox_inches="tight")
+    plt.close(fig)
+    return temp_file.name
+
+
+def _legacy_type_chart(type_distribution):
+    def draw(ax):
+        ax.pie(list(type_distribution.values()), labels=list(type_distribution),
+               autopct="%1.1f%%", startangle=140)
+        ax.set_title("Equipment Type Distribution")
+    return _legacy_chart(draw)
+
+
+def _legacy_average_chart(stats):
+    def draw(ax):
+        ax.bar(["Flowrate", "Pressure", "Temperature"],
+               [stats[k]["avg"] for k in ("flowrate", "pressure", "temperature")],
+               color=["#22c55e", "#f97316", "#a855f7"])
+        ax.set_title("Average Equipment Parameters")
+    return _legacy_chart(draw)
+
+
+def legacy_report():
+    charts = []
+
+    def track(fn):
+        def wrapper(*args):
+            charts.append(fn(*args))
+            return charts[-1]
+        return wrapper
+
+    with mock.patch.object(pdf_utils, "_generate_type_distribution_chart",
+                           track(_legacy_type_chart)), \
+         mock.patch.object(pdf_utils, "_generate_average_chart",
+                           track(_legacy_average_chart)):
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+            pdf_utils.build_pdf_report(tmp.name, SUMMARY, USER)
+            tmp.seek(0)
+            data = tmp.read()
+
+    for path in charts + [tmp.name]:
+        os.remove(path)
+    return data
+
+
+def in_memory_report():
+    buf = BytesIO()
+    pdf_utils.build_pdf_report(buf, SUMMARY, USER)
+    return buf.getvalue()
+
+
+def measure(fn, reports):
+    fn()  # warm-up: font loading, first figure creation
+    timings = []
+    for _ in range(reports):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e3)
+    return statistics.median(timings), min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reports", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'pipeline':<12} {'median (ms)':>12} {'best (ms)':>10}")
+    for name, fn in [("legacy", legacy_report), ("in-memory", in_memory_report)]:
+        median, best = measure(fn, args.reports)
+        print(f"{name:<12} {median:>12.1f} {best:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: backend startup cost.
+
+Each sample runs in a fresh interpreter and measures ``django.setup()``
+plus resolving the API URLs (which imports ``api.views``), together with
+the RSS growth caused by those imports and the peak RSS of the process.
+
+"lazy" is the current import graph. "eager" additionally imports the
+analysis and PDF modules up front, which is what every worker paid before
+pandas, pyarrow, reportlab and matplotlib were loaded on demand.
+
+Run from the chemical_backend directory:
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, os, resource, sys, time
+sys.path.insert(0, {backend_dir!r})
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+rss_before = rss_mb()
+start = time.perf_counter()
+
+import django
+django.setup()
+from django.urls import get_resolver
+resolver = get_resolver()
+for path in ["/api/login/", "/api/history/", "/api/summary/1/", "/api/report/1/"]:
+    resolver.resolve(path)
+if {eager}:
+    import api.analysis, api.pdf_utils
+    api.pdf_utils._figure_template("warmup")
+
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "import_mb": rss_mb() - rss_before,
+    "rss_mb": rss_mb(),
+    "heavy": sorted(m for m in ("pandas", "pyarrow", "reportlab", "matplotlib")
+                    if m in sys.modules),
+}}))
+"""
+
+
+def sample(eager):
+    code = CHILD.format(backend_dir=BACKEND_DIR, eager=eager)
+    out = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'setup+urls (ms)':>16} {'import RSS (MB)':>16} "
+          f"{'peak RSS (MB)':>14}  heavy modules loaded")
+    for mode, eager in [("eager", True), ("lazy", False)]:
+        runs = [sample(eager) for _ in range(args.runs)]
+        print(
+            f"{mode:<6} "
+            f"{statistics.median(r['seconds'] for r in runs) * 1e3:>16.0f} "
+            f"{statistics.median(r['import_mb'] for r in runs):>16.1f} "
+            f"{statistics.median(r['rss_mb'] for r in runs):>14.1f}  "
+            f"{', '.join(runs[0]['heavy']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark: per-column pandas statistics vs. the block summary kernel.
+
+Run from the chemical_backend directory:
+
+    python benchmarks/bench_summary_kernel.py
+    python benchmarks/bench_summary_kernel.py --rows 10000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.analysis import RunningStats  # noqa: E402
+from api.validators import NUMERIC_COLUMNS  # noqa: E402
+
+TYPES = ["Pump", "Compressor", "Valve", "HeatExchanger", "Reactor", "Condenser"]
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Type": rng.choice(TYPES, size=rows),
+        "Flowrate": rng.normal(120, 35, size=rows),
+        "Pressure": rng.normal(6, 1.4, size=rows),
+        "Temperature": rng.normal(117, 14, size=rows),
+    })
+
+
+def legacy_statistics(df):
+    """The original per-column, per-statistic implementation."""
+    return {
+        col.lower(): {
+            "avg": float(df[col].mean()),
+            "min": float(df[col].min()),
+            "max": float(df[col].max()),
+            "std": float(df[col].std()),
+        }
+        for col in NUMERIC_COLUMNS
+    }
+
+
+def kernel_statistics(df):
+    stats = RunningStats()
+    stats.update(df)
+    return stats.to_dict()
+
+
+def best_of(fn, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+",
+                        default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'legacy (ms)':>14} {'kernel (ms)':>14} {'speedup':>9}")
+    for rows in args.rows:
+        df = make_frame(rows)
+
+        legacy, kernel = legacy_statistics(df), kernel_statistics(df)
+        for col, values in legacy.items():
+            for key, expected in values.items():
+                assert np.isclose(kernel[col][key], expected), (col, key)
+
+        t_legacy = best_of(legacy_statistics, df, args.repeat)
+        t_kernel = best_of(kernel_statistics, df, args.repeat)
+        print(f"{rows:>12,} {t_legacy * 1e3:>14.2f} {t_kernel * 1e3:>14.2f} "
+              f"{t_legacy / t_kernel:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,550 @@
+import hashlib
+import json
+import math
+import os
 import sys
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QPushButton,
     QVBoxLayout, QHBoxLayout, QFileDialog, QListWidget,
-    QMessageBox, QFrame
+    QMessageBox, QFrame, QAbstractItemView, QProgressBar
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
 import matplotlib
 matplotlib.use("Qt5Agg")
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+
+try:
+    import msgpack
+except ImportError:  # optional: fall back to JSON
+    msgpack = None
 
 API = "http://127.0.0.1:8000/api"
 
+# Summaries are requested as MessagePack when available (smaller and faster
+# to decode); requests already asks for and decodes gzip/deflate.
+DATA_ACCEPT = (
+    "application/msgpack, application/json;q=0.9" if msgpack else "application/json"
+)
+
+# (connect, read) timeouts in seconds; uploads of large CSVs read slowly.
+TIMEOUT = (5, 300)
+
+CACHE_DIR = os.environ.get(
+    "CEPV_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cepv", "summaries")
+)
+SUMMARY_CACHE_ENTRIES = 200
+
+# Unfinished chunked uploads, so they resume after a failure or a restart.
+UPLOADS_FILE = os.environ.get(
+    "CEPV_UPLOADS_FILE", os.path.join(os.path.expanduser("~"), ".cepv", "uploads.json")
+)
+TRANSFER_RETRIES = 5
+
+
+def decode(res):
+    """Decode a JSON or MessagePack response body."""
+    content_type = res.headers.get("Content-Type", "")
+    if msgpack and content_type.startswith("application/msgpack"):
+        return msgpack.unpackb(res.content, raw=False)
+    return res.json()
+
+
+def check(res, fallback):
+    """Raise with the server's error message unless ``res`` is a 2xx."""
+    if 200 <= res.status_code < 300:
+        return res
+    try:
+        message = decode(res).get("error", fallback)
+    except ValueError:
+        message = fallback
+    raise Exception(message)
+
+
+# ================= NETWORKING =================
+class ApiClient:
+    """One pooled keep-alive session shared by every request of the app."""
+
+    def __init__(self, base=API):
+        self.base = base
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=QThreadPool.globalInstance().maxThreadCount())
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def set_token(self, token):
+        self.session.headers["Authorization"] = f"Token {token}"
+
+    def get(self, path, **kwargs):
+        return self.session.get(self.base + path, timeout=TIMEOUT, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.session.post(self.base + path, timeout=TIMEOUT, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.session.put(self.base + path, timeout=TIMEOUT, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class WorkerSignals(QObject):
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+    progress = pyqtSignal(object, object)
+
+
+class Worker(QRunnable):
+    """
+    Runs ``fn`` on the thread pool; results come back as queued signals.
+    With ``reports_progress``, ``fn`` is passed a ``report(done, total)``
+    callable that emits ``progress``.
+    """
+
+    def __init__(self, fn, reports_progress=False):
+        super().__init__()
+        self.fn = fn
+        self.reports_progress = reports_progress
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            if self.reports_progress:
+                result = self.fn(self.signals.progress.emit)
+            else:
+                result = self.fn()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.done.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+# Running workers are kept alive here until their signals are delivered.
+_workers = set()
+
+
+def run_in_background(fn, on_done, on_error, on_progress=None):
+    """
+    Call ``fn`` on a pool thread, then ``on_done(result)`` or
+    ``on_error(message)`` on the GUI thread. ``fn`` must not touch widgets.
+    If ``on_progress`` is given, ``fn`` receives a ``report(done, total)``
+    callable whose calls reach ``on_progress`` on the GUI thread.
+    """
+    worker = Worker(fn, reports_progress=on_progress is not None)
+    if on_progress is not None:
+        worker.signals.progress.connect(on_progress)
+    worker.signals.done.connect(on_done)
+    worker.signals.failed.connect(on_error)
+    worker.signals.finished.connect(lambda: _workers.discard(worker))
+    _workers.add(worker)
+    QThreadPool.globalInstance().start(worker)
+
+
+class SummaryCache:
+    """
+    On-disk LRU cache of dataset summaries and their ETags.
+
+    A hit is shown at once and then revalidated with ``If-None-Match``, so
+    an unchanged summary costs only a bodiless 304. Each server/user pair
+    gets its own directory with one JSON file per dataset; beyond
+    ``max_entries`` the least recently used files are removed (mtime is
+    bumped on every hit). Only used from the GUI thread.
+    """
+
+    def __init__(self, namespace, directory=CACHE_DIR,
+                 max_entries=SUMMARY_CACHE_ENTRIES):
+        digest = hashlib.sha256(namespace.encode()).hexdigest()[:16]
+        self.directory = os.path.join(directory, digest)
+        self.max_entries = max_entries
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, dataset_id):
+        return os.path.join(self.directory, f"{int(dataset_id)}.json")
+
+    def get(self, dataset_id):
+        """Return ``(summary, etag)``, or ``(None, None)`` on a miss."""
+        path = self._path(dataset_id)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            summary, etag = entry["summary"], entry["etag"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, None
+        return summary, etag
+
+    def put(self, dataset_id, summary, etag=None):
+        path = self._path(dataset_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"summary": summary, "etag": etag}, f)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        self._evict()
+
+    def retain(self, dataset_ids):
+        """Drop entries for datasets the server no longer lists."""
+        keep = {f"{int(i)}.json" for i in dataset_ids}
+        for entry in self._entries():
+            if entry.name not in keep:
+                self._remove(entry.path)
+
+    def _entries(self):
+        try:
+            return [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except OSError:
+            return []
+
+    def _evict(self):
+        entries = self._entries()
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class UploadResumeStore:
+    """
+    Maps a local file (path, size and mtime) to the id of its unfinished
+    chunked upload, in a small JSON file. Thread-safe enough for its use:
+    one upload worker at a time writes it.
+    """
+
+    def __init__(self, namespace, path=UPLOADS_FILE):
+        self.namespace = namespace
+        self.path = path
+
+    def _key(self, file_path):
+        stat = os.stat(file_path)
+        return f"{self.namespace}|{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
+
+    def get(self, file_path):
+        return self._load().get(self._key(file_path))
+
+    def set(self, file_path, upload_id):
+        entries = self._load()
+        entries[self._key(file_path)] = upload_id
+        self._save(entries)
+
+    def discard(self, file_path):
+        entries = self._load()
+        if entries.pop(self._key(file_path), None) is not None:
+            self._save(entries)
+
+
+class ChunkedUploader:
+    """
+    Uploads a CSV through /upload/chunked/ in numbered chunks.
+
+    Connection errors and timeouts are retried with exponential backoff,
+    resuming from the chunk the server reports next. If the upload still
+    fails, its id is kept in the resume store, and uploading the same
+    unchanged file again continues where it stopped.
+    """
+
+    def __init__(self, api, resume_store):
+        self.api = api
+        self.resume = resume_store
+
+    def _retrying(self, send):
+        for attempt in range(TRANSFER_RETRIES):
+            try:
+                return send()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == TRANSFER_RETRIES - 1:
+                    raise Exception("Connection lost; upload again to resume")
+                time.sleep(2 ** attempt)
+
+    def _status(self, path):
+        upload_id = self.resume.get(path)
+        if upload_id:
+            res = self._retrying(lambda: self.api.get(f"/upload/chunked/{upload_id}/"))
+            if res.status_code == 200:
+                return res.json()
+
+        res = self._retrying(lambda: self.api.post("/upload/chunked/", json={
+            "name": os.path.basename(path),
+            "size": os.path.getsize(path),
+        }))
+        status = check(res, "Upload failed").json()
+        self.resume.set(path, status["upload_id"])
+        return status
+
+    def upload(self, path, report):
+        status = self._status(path)
+        upload_id, chunk_size = status["upload_id"], status["chunk_size"]
+        base = f"/upload/chunked/{upload_id}"
+        report(status["received_bytes"], status["size"])
+
+        with open(path, "rb") as f:
+            while not status["complete"]:
+                index = status["next_chunk"]
+                f.seek(index * chunk_size)
+                data = f.read(chunk_size)
+                res = self._retrying(lambda: self.api.put(
+                    f"{base}/chunks/{index}/", data=data,
+                    headers={"Content-Type": "application/octet-stream"}
+                ))
+                if res.status_code == 400 and "next_chunk" not in res.json():
+                    # Invalid CSV: the server has discarded the upload.
+                    self.resume.discard(path)
+                if res.status_code != 409:
+                    check(res, "Upload failed")
+                status = res.json()
+                report(status["received_bytes"], status["size"])
+
+        res = self._retrying(lambda: self.api.post(f"{base}/finalize/"))
+        result = check(res, "Upload failed").json()
+        self.resume.discard(path)
+        return result
+
+
+DOWNLOAD_BLOCK = 64 * 1024
+
+
+def download_to(api, path, dest, report, params=None):
+    """
+    Stream ``path`` into the file ``dest`` in constant memory.
+
+    Data goes to ``dest + ".part"``, renamed once complete. If the
+    connection drops, the download resumes with a Range request (guarded by
+    If-Range with the response's ETag). A server that answers with the
+    whole file instead makes it start over.
+    """
+    part = f"{dest}.part"
+    written, etag = 0, None
+    try:
+        with open(part, "wb") as out:
+            for attempt in range(TRANSFER_RETRIES):
+                headers = {}
+                if written:
+                    headers["Range"] = f"bytes={written}-"
+                    if etag:
+                        headers["If-Range"] = etag
+                try:
+                    with api.get(path, params=params, headers=headers, stream=True) as res:
+                        if res.status_code != 206:
+                            check(res, "Download failed")
+                            out.seek(0)
+                            out.truncate()
+                            written = 0
+                        etag = res.headers.get("ETag", etag)
+                        total = written + int(res.headers.get("Content-Length", 0))
+                        for block in res.iter_content(DOWNLOAD_BLOCK):
+                            out.write(block)
+                            written += len(block)
+                            report(written, total)
+                    break
+                except (requests.ConnectionError, requests.Timeout,
+                        requests.exceptions.ChunkedEncodingError):
+                    if attempt == TRANSFER_RETRIES - 1:
+                        raise Exception("Connection lost while downloading")
+                    time.sleep(2 ** attempt)
+        os.replace(part, dest)
+    except Exception:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+
+# ================= CHARTS =================
+PARAMETER_LABELS = ["Flowrate", "Pressure", "Temperature"]
+PARAMETER_COLORS = ["#2563eb", "#16a34a", "#dc2626"]
+
+
+def nice_limit(value):
+    """Smallest 1/2/2.5/5 x 10^n at least 5% above ``value``."""
+    if value <= 0:
+        return 1
+    step = 10 ** math.floor(math.log10(value))
+    for m in (1, 2, 2.5, 5, 10):
+        if m * step >= value * 1.05:
+            return m * step
+    return 10 * step
+
+
+class BlitCanvas(FigureCanvasQTAgg):
+    """
+    Persistent chart whose data artists are marked animated, so selecting
+    another dataset only redraws those artists over a cached background
+    (blitting). A full redraw, which re-caches the background, is needed
+    only when axes, ticks or the artists themselves change.
+    """
+
+    def __init__(self):
+        super().__init__(Figure(figsize=(4, 3), tight_layout=True))
+        self.ax = self.figure.add_subplot()
+        self.background = None
+        self.mpl_connect("draw_event", self.on_draw)
+
+    def animated_artists(self):
+        return []
+
+    def on_draw(self, event):
+        self.background = self.copy_from_bbox(self.figure.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        for artist in self.animated_artists():
+            self.figure.draw_artist(artist)
+
+    def refresh(self, full):
+        if full or self.background is None:
+            self.draw_idle()
+            return
+        self.restore_region(self.background)
+        self.draw_animated()
+        self.blit(self.figure.bbox)
+
+
+class AverageChart(BlitCanvas):
+    def __init__(self):
+        super().__init__()
+        self.bars = self.ax.bar(
+            PARAMETER_LABELS, [0] * len(PARAMETER_LABELS),
+            color=PARAMETER_COLORS, animated=True
+        )
+        self.ax.set_title("Average Equipment Parameters")
+        self.ax.set_ylabel("Value")
+        self.ax.grid(axis="y", alpha=0.3)
+
+    def animated_artists(self):
+        return list(self.bars)
+
+    def update_summary(self, summary):
+        heights = [
+            summary["statistics"][label.lower()]["avg"] or 0
+            for label in PARAMETER_LABELS
+        ]
+        for bar, height in zip(self.bars, heights):
+            bar.set_height(height)
+
+        # Limits are rounded so similar datasets share them and can blit.
+        low = -nice_limit(-min(heights)) if min(heights) < 0 else 0
+        limits = (low, nice_limit(max(heights)))
+        full = tuple(self.ax.get_ylim()) != limits
+        if full:
+            self.ax.set_ylim(*limits)
+        self.refresh(full)
+
+
+class TypeChart(BlitCanvas):
+    START_ANGLE = 140
+
+    def __init__(self):
+        super().__init__()
+        self.labels = []
+        self.wedges, self.texts, self.autotexts = [], [], []
+        self.ax.set_title("Equipment Type Distribution")
+        self.ax.set_axis_off()
+
+    def animated_artists(self):
+        return self.wedges + self.texts + self.autotexts
+
+    def update_summary(self, summary):
+        distribution = summary["type_distribution"]
+        # Sorted, so datasets with the same types reuse the same wedges.
+        labels = sorted(distribution)
+        counts = [distribution[label] for label in labels]
+        if not sum(counts):
+            return
+
+        if labels == self.labels:
+            self.move_wedges(counts)
+            self.refresh(full=False)
+            return
+
+        for artist in self.animated_artists():
+            artist.remove()
+        self.wedges, self.texts, self.autotexts = self.ax.pie(
+            counts, labels=labels, autopct="%1.1f%%",
+            startangle=self.START_ANGLE
+        )
+        for artist in self.animated_artists():
+            artist.set_animated(True)
+        self.labels = labels
+        self.refresh(full=True)
+
+    def move_wedges(self, counts):
+        # Same geometry as Axes.pie (labeldistance 1.1, pctdistance 0.6).
+        total = sum(counts)
+        theta1 = self.START_ANGLE / 360
+        for wedge, text, autotext, count in zip(
+            self.wedges, self.texts, self.autotexts, counts
+        ):
+            frac = count / total
+            theta2 = theta1 + frac
+            wedge.set_theta1(360 * theta1)
+            wedge.set_theta2(360 * theta2)
+            mid = math.pi * (theta1 + theta2)
+            x, y = math.cos(mid), math.sin(mid)
+            text.set_position((1.1 * x, 1.1 * y))
+            text.set_horizontalalignment("left" if x > 0 else "right")
+            autotext.set_position((0.6 * x, 0.6 * y))
+            autotext.set_text(f"{100 * frac:.1f}%")
+            theta1 = theta2
+
+
+class ComparisonChart(FigureCanvasQTAgg):
+    """Grouped bars of each compared dataset's parameter averages."""
+
+    def __init__(self):
+        super().__init__(Figure(figsize=(8, 3), tight_layout=True))
+        self.ax = self.figure.add_subplot()
+
+    def update_comparison(self, data):
+        datasets = data["datasets"]
+        width = 0.8 / len(datasets)
+        self.ax.clear()
+        for i, d in enumerate(datasets):
+            self.ax.bar(
+                [x + (i - (len(datasets) - 1) / 2) * width
+                 for x in range(len(PARAMETER_LABELS))],
+                [d["statistics"][label.lower()]["avg"] or 0 for label in PARAMETER_LABELS],
+                width,
+                label=d["name"]
+            )
+        self.ax.set_xticks(range(len(PARAMETER_LABELS)), PARAMETER_LABELS)
+        self.ax.set_title("Average Parameters by Dataset")
+        self.ax.legend()
+        self.ax.grid(axis="y", alpha=0.3)
+        self.draw_idle()
+
+
+def format_value(value, spec=".2f"):
+    """Format a statistic, which is None for a column without values."""
+    return "n/a" if value is None else format(value, spec)
+
 
 # ================= AUTH WINDOW =================
 class AuthWindow(QWidget):
@@ -21,6 +554,7 @@ class AuthWindow(QWidget):
         self.setFixedSize(400, 420)
 
         self.mode = "login"
+        self.api = ApiClient()
 
         layout = QVBoxLayout()
 
@@ -72,31 +606,43 @@ class AuthWindow(QWidget):
 
         endpoint = "/login/" if self.mode == "login" else "/register/"
 
-        try:
-            res = requests.post(API + endpoint, json={
+        def authenticate():
+            res = self.api.post(endpoint, json={
                 "username": username,
                 "password": password
             })
-            data = res.json()
-
+            try:
+                data = res.json()
+            except ValueError:
+                data = {}
             if res.status_code != 200:
                 raise Exception(data.get("error", "Authentication failed"))
+            return data["token"]
 
+        def done(token):
+            self.api.set_token(token)
             self.close()
-            self.dashboard = DashboardWindow(data["token"], username)
+            self.dashboard = DashboardWindow(self.api, username)
             self.dashboard.show()
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+        def failed(message):
+            self.action_btn.setEnabled(True)
+            QMessageBox.critical(self, "Error", message)
+
+        self.action_btn.setEnabled(False)
+        run_in_background(authenticate, done, failed)
 
 
 # ================= DASHBOARD =================
 class DashboardWindow(QWidget):
-    def __init__(self, token, username):
+    def __init__(self, api, username):
         super().__init__()
-        self.token = token
+        self.api = api
         self.username = username
-        self.headers = {"Authorization": f"Token {token}"}
+        self.summary_cache = SummaryCache(f"{api.base}|{username}")
+        self.uploader = ChunkedUploader(
+            api, UploadResumeStore(f"{api.base}|{username}")
+        )
         self.current_dataset_id = None
 
         self.setWindowTitle("Dashboard")
@@ -118,6 +664,8 @@ class DashboardWindow(QWidget):
         history_label.setStyleSheet("font-weight:bold;")
 
         self.history_list = QListWidget()
+        # Ctrl/Shift-click selects several datasets to compare.
+        self.history_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.history_list.itemClicked.connect(self.load_history_summary)
 
         logout_btn = QPushButton(" Logout")
@@ -138,27 +686,57 @@ class DashboardWindow(QWidget):
         welcome = QLabel(f" Welcome back, {username}")
         welcome.setStyleSheet("font-size:20px;font-weight:bold;")
 
-        upload_btn = QPushButton(" Upload CSV")
-        upload_btn.clicked.connect(self.upload_csv)
+        self.upload_btn = QPushButton(" Upload CSV")
+        self.upload_btn.clicked.connect(self.upload_csv)
+
+        # Shared by uploads and downloads; only one transfer runs at a time.
+        self.transfer_progress = QProgressBar()
+        self.transfer_progress.hide()
 
         self.summary_label = QLabel("Upload a CSV file to begin analysis")
         self.summary_label.setStyleSheet("margin-top:10px;")
 
+        # Charts stay embedded and are updated in place on selection; the
+        # buttons only show or hide them.
+        self.avg_chart = AverageChart()
+        self.type_chart = TypeChart()
+        charts = QHBoxLayout()
+        charts.addWidget(self.avg_chart)
+        charts.addWidget(self.type_chart)
+        # Shown below them once datasets are compared.
+        self.comparison_chart = ComparisonChart()
+        self.comparison_chart.hide()
+
         avg_chart_btn = QPushButton(" Average Parameters")
-        avg_chart_btn.clicked.connect(self.show_avg_chart)
+        avg_chart_btn.setCheckable(True)
+        avg_chart_btn.setChecked(True)
+        avg_chart_btn.toggled.connect(self.avg_chart.setVisible)
 
         type_chart_btn = QPushButton(" Type Distribution")
-        type_chart_btn.clicked.connect(self.show_type_chart)
+        type_chart_btn.setCheckable(True)
+        type_chart_btn.setChecked(True)
+        type_chart_btn.toggled.connect(self.type_chart.setVisible)
+
+        self.pdf_btn = QPushButton(" Download PDF Report")
+        self.pdf_btn.clicked.connect(self.download_pdf)
+
+        compare_btn = QPushButton(" Compare Selected Datasets")
+        compare_btn.clicked.connect(self.show_comparison)
 
-        pdf_btn = QPushButton(" Download PDF Report")
-        pdf_btn.clicked.connect(self.download_pdf)
+        self.compare_pdf_btn = QPushButton(" Download Comparison PDF")
+        self.compare_pdf_btn.clicked.connect(self.download_comparison_pdf)
 
         content.addWidget(welcome)
-        content.addWidget(upload_btn)
+        content.addWidget(self.upload_btn)
+        content.addWidget(self.transfer_progress)
         content.addWidget(self.summary_label)
+        content.addLayout(charts)
+        content.addWidget(self.comparison_chart)
         content.addWidget(avg_chart_btn)
         content.addWidget(type_chart_btn)
-        content.addWidget(pdf_btn)
+        content.addWidget(self.pdf_btn)
+        content.addWidget(compare_btn)
+        content.addWidget(self.compare_pdf_btn)
         content.addStretch()
 
         main_layout.addWidget(sidebar_frame)
@@ -171,8 +749,54 @@ class DashboardWindow(QWidget):
     def toast(self, msg):
         QMessageBox.information(self, "Info", msg)
 
+    def run(self, fn, on_done, button=None, on_progress=None, on_finished=None):
+        """
+        Run ``fn`` off the GUI thread; ``button`` is disabled meanwhile and
+        ``on_finished()`` is called whether it succeeds or fails.
+        """
+        def finish():
+            if button:
+                button.setEnabled(True)
+            if on_finished:
+                on_finished()
+
+        def done(result):
+            finish()
+            on_done(result)
+
+        def failed(message):
+            finish()
+            self.toast(message)
+
+        if button:
+            button.setEnabled(False)
+        run_in_background(fn, done, failed, on_progress)
+
+    def run_transfer(self, label, fn, on_done, button):
+        """``run`` for uploads/downloads: ``fn(report)`` drives the progress bar."""
+        def progress(sent, total):
+            # Scaled to permille: QProgressBar values are 32-bit ints.
+            self.transfer_progress.setValue(int(1000 * sent / total) if total else 0)
+
+        self.transfer_progress.setFormat(label)
+        self.transfer_progress.setRange(0, 1000)
+        self.transfer_progress.setValue(0)
+        self.transfer_progress.show()
+        self.run(
+            fn, on_done, button,
+            on_progress=progress,
+            on_finished=self.transfer_progress.hide
+        )
+
+    def save_path(self, title, default_name):
+        path, _ = QFileDialog.getSaveFileName(
+            self, title, default_name, "PDF Files (*.pdf)"
+        )
+        return path
+
     def logout(self):
         self.close()
+        self.api.close()
         self.auth = AuthWindow()
         self.auth.show()
 
@@ -184,37 +808,74 @@ class DashboardWindow(QWidget):
         if not path:
             return
 
-        with open(path, "rb") as f:
-            res = requests.post(
-                API + "/upload/",
-                headers=self.headers,
-                files={"file": f}
-            )
-
-        if res.status_code == 200:
+        def done(_):
             self.toast("Dataset uploaded successfully")
             self.load_history()
-        else:
-            self.toast("Invalid CSV file")
+
+        self.run_transfer(
+            "Uploading… %p%",
+            lambda report: self.uploader.upload(path, report),
+            done,
+            self.upload_btn
+        )
 
     # -------- HISTORY --------
     def load_history(self):
-        res = requests.get(API + "/history/", headers=self.headers)
-        data = res.json()
+        def fetch():
+            return check(self.api.get("/history/"), "Could not load history").json()
+
+        self.run(fetch, self.show_history)
 
+    def show_history(self, data):
         self.history_list.clear()
         for d in data:
             self.history_list.addItem(f"{d['id']} - {d['name']}")
+        self.summary_cache.retain(d["id"] for d in data)
+
+    def with_summary(self, dataset_id, callback):
+        """
+        Call ``callback(summary)`` with the cached summary at once, if any,
+        and again if revalidating it with the server finds it changed.
+        """
+        cached, etag = self.summary_cache.get(dataset_id)
+        if cached is not None:
+            callback(cached)
+
+        def fetch():
+            headers = {"Accept": DATA_ACCEPT}
+            if etag:
+                headers["If-None-Match"] = etag
+            res = self.api.get(f"/summary/{dataset_id}/", headers=headers)
+            if res.status_code == 304:
+                return None
+            return decode(check(res, "Dataset not found")), res.headers.get("ETag")
+
+        def done(result):
+            if result is None:
+                return
+            summary, new_etag = result
+            self.summary_cache.put(dataset_id, summary, new_etag)
+            if summary != cached:
+                callback(summary)
+
+        if cached is None:
+            self.run(fetch, done)
+        else:
+            # The cached copy stays in use while the server is unreachable.
+            run_in_background(fetch, done, lambda message: None)
 
     def load_history_summary(self, item):
         dataset_id = int(item.text().split(" - ")[0])
         self.current_dataset_id = dataset_id
 
-        res = requests.get(
-            f"{API}/summary/{dataset_id}/",
-            headers=self.headers
-        )
-        summary = res.json()
+        def show(summary):
+            # A late revalidation must not replace a newer selection.
+            if self.current_dataset_id == dataset_id:
+                self.show_summary(summary)
+
+        self.with_summary(dataset_id, show)
+
+    def show_summary(self, summary):
         stats = summary["statistics"]
 
         text = (
@@ -232,73 +893,90 @@ class DashboardWindow(QWidget):
         )
 
         self.summary_label.setText(text)
+        self.avg_chart.update_summary(summary)
+        self.type_chart.update_summary(summary)
 
-    # -------- CHARTS --------
-    def show_type_chart(self):
+    # -------- PDF --------
+    def download_pdf(self):
         if not self.current_dataset_id:
             self.toast("Select a dataset first")
             return
 
-        res = requests.get(
-            f"{API}/summary/{self.current_dataset_id}/",
-            headers=self.headers
-        )
-        s = res.json()
-
-        plt.figure()
-        plt.pie(
-            s["type_distribution"].values(),
-            labels=s["type_distribution"].keys(),
-            autopct="%1.1f%%",
-            startangle=140
+        path = self.save_path("Save PDF Report", "dataset_report.pdf")
+        if not path:
+            return
+
+        url = f"/report/{self.current_dataset_id}/"
+        self.run_transfer(
+            "Downloading… %p%",
+            lambda report: download_to(self.api, url, path, report),
+            lambda _: self.toast("PDF downloaded"),
+            self.pdf_btn
         )
-        plt.title("Equipment Type Distribution")
-        plt.axis("equal")
-        plt.show()
 
 
-    def show_avg_chart(self):
-        if not self.current_dataset_id:
-            self.toast("Select a dataset first")
+    # -------- COMPARISON --------
+    def selected_dataset_ids(self):
+        ids = [
+            item.text().split(" - ")[0]
+            for item in self.history_list.selectedItems()
+        ]
+        if len(ids) < 2:
+            self.toast("Select at least two datasets (Ctrl+click) to compare")
+            return None
+        return ",".join(ids)
+
+    def show_comparison(self):
+        ids = self.selected_dataset_ids()
+        if not ids:
             return
 
-        res = requests.get(
-            f"{API}/summary/{self.current_dataset_id}/",
-            headers=self.headers
-        )
-        s = res.json()
-
-        plt.figure()
-        plt.bar(
-            ["Flowrate", "Pressure", "Temperature"],
-            [
-                s["statistics"]["flowrate"]["avg"],
-                s["statistics"]["pressure"]["avg"],
-                s["statistics"]["temperature"]["avg"],
-            ],
-            color=["#2563eb", "#16a34a", "#dc2626"]
-        )
-        plt.title("Average Equipment Parameters")
-        plt.ylabel("Value")
-        plt.grid(axis="y", alpha=0.3)
-        plt.show()
+        def fetch():
+            res = self.api.get("/compare/", params={"ids": ids})
+            return check(res, "Comparison failed").json()
+
+        self.run(fetch, self.plot_comparison)
+
+    def plot_comparison(self, data):
+        params = ["flowrate", "pressure", "temperature"]
+        deltas = {d["id"]: d for d in data["deltas"]}
+
+        lines = ["📊 Dataset Comparison\n"]
+        for d in data["datasets"]:
+            lines.append(f"{d['name']} ({d['total_count']} records)")
+            for p in params:
+                s = d["statistics"][p]
+                line = (
+                    f"   {p.title()} → Avg: {format_value(s['avg'])} | "
+                    f"P99: {format_value(s['p99'])}"
+                )
+                if d["id"] in deltas:
+                    change = deltas[d["id"]]["statistics"][p]["avg"]
+                    line += f" | Δ Avg: {format_value(change, '+.2f')}"
+                lines.append(line)
+        self.summary_label.setText("\n".join(lines))
+
+        self.comparison_chart.update_comparison(data)
+        self.comparison_chart.show()
+
+    def download_comparison_pdf(self):
+        ids = self.selected_dataset_ids()
+        if not ids:
+            return
 
-    # -------- PDF --------
-    def download_pdf(self):
-        if not self.current_dataset_id:
-            self.toast("Select a dataset first")
+        path = self.save_path("Save Comparison Report", "comparison_report.pdf")
+        if not path:
             return
 
-        res = requests.get(
-            f"{API}/report/{self.current_dataset_id}/",
-            headers=self.headers
+        self.run_transfer(
+            "Downloading… %p%",
+            lambda report: download_to(
+                self.api, "/compare/report/", path, report, params={"ids": ids}
+            ),
+            lambda _: self.toast("Comparison PDF downloaded"),
+            self.compare_pdf_btn
         )
 
-        with open("dataset_report.pdf", "wb") as f:
-            f.write(res.content)
-
-        self.toast("PDF downloaded")
-
 
 # ================= RUN APP =================
 if __name__ == "__main__":
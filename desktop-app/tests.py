@@ -0,0 +1,321 @@
+"""
+Tests for the desktop client's non-GUI logic.
+
+Run from this directory with ``python -m unittest tests``; skipped where
+PyQt5 is not installed. Qt is started offscreen.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    import desktop_app
+except ImportError:  # PyQt5 is only needed by the desktop app
+    desktop_app = None
+
+
+def run_now(fn, on_done, on_error, on_progress=None):
+    """``run_in_background`` that runs ``fn`` on the calling thread."""
+    try:
+        result = fn()
+    except Exception as e:
+        on_error(str(e))
+    else:
+        on_done(result)
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, etag=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = {"Content-Type": "application/json"}
+        if etag:
+            self.headers["ETag"] = etag
+
+    def json(self):
+        return self.data
+
+
+@unittest.skipIf(desktop_app is None, "PyQt5 is not installed")
+class SummaryCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = desktop_app.SummaryCache("server|alice", self.directory, max_entries=2)
+
+    def window(self, *responses):
+        """A stand-in for ``DashboardWindow`` whose API answers ``responses``."""
+        api = SimpleNamespace(get=mock.Mock(side_effect=list(responses)))
+
+        def run(fn, on_done):
+            run_now(fn, on_done, self.fail)
+
+        return SimpleNamespace(summary_cache=self.cache, api=api, run=run)
+
+    def with_summary(self, window, dataset_id=1):
+        shown = []
+        with mock.patch.object(desktop_app, "run_in_background", run_now):
+            desktop_app.DashboardWindow.with_summary(window, dataset_id, shown.append)
+        return shown
+
+    def test_round_trip_and_eviction(self):
+        self.assertEqual(self.cache.get(1), (None, None))
+        for dataset_id in (1, 2, 3):
+            self.cache.put(dataset_id, {"id": dataset_id}, f'"e{dataset_id}"')
+            os.utime(self.cache._path(dataset_id), (dataset_id, dataset_id))
+
+        self.assertEqual(self.cache.get(1), (None, None))
+        self.assertEqual(self.cache.get(3), ({"id": 3}, '"e3"'))
+        self.cache.retain([3])
+        self.assertEqual(self.cache.get(2), (None, None))
+
+    def test_entries_without_an_etag_wrapper_are_misses(self):
+        with open(self.cache._path(1), "w", encoding="utf-8") as f:
+            f.write('{"total_count": 2}')
+        self.assertEqual(self.cache.get(1), (None, None))
+
+    def test_miss_fetches_and_stores_the_etag(self):
+        window = self.window(FakeResponse(200, {"total_count": 2}, '"v1"'))
+
+        self.assertEqual(self.with_summary(window), [{"total_count": 2}])
+        self.assertEqual(self.cache.get(1), ({"total_count": 2}, '"v1"'))
+        self.assertNotIn("If-None-Match", window.api.get.call_args.kwargs["headers"])
+
+    def test_hit_is_revalidated_with_if_none_match(self):
+        self.cache.put(1, {"total_count": 2}, '"v1"')
+        window = self.window(FakeResponse(304))
+
+        self.assertEqual(self.with_summary(window), [{"total_count": 2}])
+        self.assertEqual(window.api.get.call_args.kwargs["headers"]["If-None-Match"], '"v1"')
+
+    def test_changed_summary_replaces_the_cached_one(self):
+        self.cache.put(1, {"total_count": 2}, '"v1"')
+        window = self.window(FakeResponse(200, {"total_count": 3}, '"v2"'))
+
+        shown = self.with_summary(window)
+
+        self.assertEqual(shown, [{"total_count": 2}, {"total_count": 3}])
+        self.assertEqual(self.cache.get(1), ({"total_count": 3}, '"v2"'))
+
+    def test_cached_summary_is_kept_when_offline(self):
+        self.cache.put(1, {"total_count": 2}, '"v1"')
+        window = self.window(ConnectionError("offline"))
+
+        self.assertEqual(self.with_summary(window), [{"total_count": 2}])
+        self.assertEqual(self.cache.get(1), ({"total_count": 2}, '"v1"'))
+
+
+def summary(averages, types):
+    return {
+        "statistics": {
+            label.lower(): {"avg": avg}
+            for label, avg in zip(["Flowrate", "Pressure", "Temperature"], averages)
+        },
+        "type_distribution": types,
+    }
+
+
+@unittest.skipIf(desktop_app is None, "PyQt5 is not installed")
+class DashboardChartTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = desktop_app.QApplication.instance() or desktop_app.QApplication([])
+
+    def test_nice_limit(self):
+        cases = {0: 1, 9: 10, 10: 20, 95: 100, 120: 200, 4.7: 5, 4.9: 10, 230: 250}
+        for value, limit in cases.items():
+            self.assertEqual(desktop_app.nice_limit(value), limit, value)
+
+    def test_average_chart_updates_bars_in_place(self):
+        chart = desktop_app.AverageChart()
+        bars = list(chart.bars)
+
+        with mock.patch.object(chart, "refresh") as refresh:
+            chart.update_summary(summary([120, 5, None], {}))
+            refresh.assert_called_once_with(True)
+            # Similar values keep the limits, so only the bars are redrawn.
+            chart.update_summary(summary([130, 6, 90], {}))
+            refresh.assert_called_with(False)
+
+        self.assertEqual(list(chart.bars), bars)
+        self.assertEqual([bar.get_height() for bar in bars], [130, 6, 90])
+        self.assertEqual(chart.ax.get_ylim(), (0, 200))
+
+    def test_type_chart_reuses_wedges_for_the_same_types(self):
+        chart = desktop_app.TypeChart()
+        chart.update_summary(summary([1, 1, 1], {"Valve": 1, "Pump": 3}))
+        wedges = list(chart.wedges)
+        self.assertEqual(chart.labels, ["Pump", "Valve"])
+
+        chart.update_summary(summary([1, 1, 1], {"Pump": 1, "Valve": 1}))
+        self.assertEqual(chart.wedges, wedges)
+        self.assertAlmostEqual(wedges[0].theta2 - wedges[0].theta1, 180)
+        self.assertEqual(chart.autotexts[1].get_text(), "50.0%")
+
+        chart.update_summary(summary([1, 1, 1], {"Pump": 1, "Mixer": 2, "Valve": 1}))
+        self.assertEqual(len(chart.wedges), 3)
+        self.assertEqual(len(chart.ax.patches), 3)
+
+
+def upload_status(next_chunk, received_bytes, size=10):
+    return {
+        "upload_id": "u1", "size": size, "chunk_size": 4,
+        "received_bytes": received_bytes, "next_chunk": next_chunk,
+        "complete": received_bytes == size,
+    }
+
+
+@unittest.skipIf(desktop_app is None, "PyQt5 is not installed")
+class ChunkedUploaderTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, "data.csv")
+        with open(self.path, "wb") as f:
+            f.write(b"abcdefghij")
+        self.store = desktop_app.UploadResumeStore(
+            "server|alice", os.path.join(directory, "uploads.json")
+        )
+        sleep = mock.patch.object(desktop_app.time, "sleep")
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def upload(self, **responses):
+        api = SimpleNamespace(**{
+            method: mock.Mock(side_effect=side_effect)
+            for method, side_effect in responses.items()
+        })
+        uploader = desktop_app.ChunkedUploader(api, self.store)
+        return api, lambda: uploader.upload(self.path, lambda done, total: None)
+
+    def test_resumes_from_the_servers_next_chunk_and_retries(self):
+        self.store.set(self.path, "u1")
+        api, upload = self.upload(
+            get=[FakeResponse(200, upload_status(1, 4))],
+            put=[
+                desktop_app.requests.ConnectionError(),
+                FakeResponse(200, upload_status(2, 8)),
+                FakeResponse(200, upload_status(3, 10)),
+            ],
+            post=[FakeResponse(200, {"id": 7})],
+        )
+
+        self.assertEqual(upload(), {"id": 7})
+        api.get.assert_called_once_with("/upload/chunked/u1/")
+        sent = [(c.args[0], c.kwargs["data"]) for c in api.put.call_args_list]
+        self.assertEqual(sent, [
+            ("/upload/chunked/u1/chunks/1/", b"efgh"),
+            ("/upload/chunked/u1/chunks/1/", b"efgh"),
+            ("/upload/chunked/u1/chunks/2/", b"ij"),
+        ])
+        self.assertIsNone(self.store.get(self.path))
+
+    def test_lost_connection_keeps_the_upload_to_resume(self):
+        api, upload = self.upload(
+            post=[FakeResponse(201, upload_status(0, 0))],
+            put=desktop_app.requests.ConnectionError(),
+        )
+
+        with self.assertRaisesRegex(Exception, "upload again to resume"):
+            upload()
+        self.assertEqual(api.put.call_count, desktop_app.TRANSFER_RETRIES)
+        self.assertEqual(self.store.get(self.path), "u1")
+
+    def test_invalid_csv_forgets_the_upload(self):
+        self.store.set(self.path, "u1")
+        _, upload = self.upload(
+            get=[FakeResponse(200, upload_status(0, 0))],
+            put=[FakeResponse(400, {"error": "Columns must be numeric"})],
+        )
+
+        with self.assertRaisesRegex(Exception, "must be numeric"):
+            upload()
+        self.assertIsNone(self.store.get(self.path))
+
+    def test_server_error_keeps_the_upload_to_resume(self):
+        self.store.set(self.path, "u1")
+        _, upload = self.upload(
+            get=[FakeResponse(200, upload_status(0, 0))],
+            put=[FakeResponse(500, {})],
+        )
+
+        with self.assertRaisesRegex(Exception, "Upload failed"):
+            upload()
+        self.assertEqual(self.store.get(self.path), "u1")
+
+
+class FakeDownload(FakeResponse):
+    """A streamed response sending ``blocks``, then dropping if ``drop``."""
+
+    def __init__(self, status_code, blocks=(), etag=None, drop=False, data=None):
+        super().__init__(status_code, data, etag)
+        self.blocks, self.drop = blocks, drop
+        self.headers["Content-Length"] = str(sum(map(len, blocks)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, size):
+        yield from self.blocks
+        if self.drop:
+            raise desktop_app.requests.exceptions.ChunkedEncodingError()
+
+
+@unittest.skipIf(desktop_app is None, "PyQt5 is not installed")
+class DownloadTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.dest = os.path.join(directory, "report.pdf")
+        sleep = mock.patch.object(desktop_app.time, "sleep")
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def download(self, *responses):
+        api = SimpleNamespace(get=mock.Mock(side_effect=list(responses)))
+        desktop_app.download_to(api, "/report/1/", self.dest, lambda done, total: None)
+        return [c.kwargs["headers"] for c in api.get.call_args_list]
+
+    def read(self):
+        with open(self.dest, "rb") as f:
+            return f.read()
+
+    def test_partial_content_is_appended_to_the_part_file(self):
+        headers = self.download(
+            FakeDownload(200, [b"%PDF", b"-1"], etag='"v1"', drop=True),
+            FakeDownload(206, [b"234"], etag='"v1"'),
+        )
+
+        self.assertEqual(self.read(), b"%PDF-1234")
+        self.assertEqual(headers, [{}, {"Range": "bytes=6-", "If-Range": '"v1"'}])
+        self.assertFalse(os.path.exists(f"{self.dest}.part"))
+
+    def test_full_response_to_a_range_restarts_the_file(self):
+        self.download(
+            FakeDownload(200, [b"%PDF-1"], etag='"v1"', drop=True),
+            FakeDownload(200, [b"%PDF-2", b"567"], etag='"v2"'),
+        )
+
+        self.assertEqual(self.read(), b"%PDF-2567")
+
+    def test_unsatisfiable_range_fails_and_removes_the_part_file(self):
+        with self.assertRaisesRegex(Exception, "Range not satisfiable"):
+            self.download(
+                FakeDownload(200, [b"%PDF-1"], etag='"v1"', drop=True),
+                FakeDownload(416, data={"error": "Range not satisfiable"}),
+            )
+
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertFalse(os.path.exists(f"{self.dest}.part"))
+
+
+if __name__ == "__main__":
+    unittest.main()